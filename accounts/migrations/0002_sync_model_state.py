@@ -0,0 +1,46 @@
+# Generated by Django 4.2.25 on 2026-10-19 15:27
+
+import accounts.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Stands in for the migrations that existing databases already applied
+    # but that are not in the repository (see room 0023_sync_model_state).
+    replaces = [
+        ("accounts", "0002_alter_user_managers_alter_user_email"),
+        ("accounts", "0003_alter_emailsettings_email_host_password_and_more"),
+        ("accounts", "0004_remove_user_username"),
+    ]
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name="user",
+            managers=[
+                ("objects", accounts.models.UserManager()),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name="user",
+            name="username",
+        ),
+        migrations.AlterField(
+            model_name="emailsettings",
+            name="EMAIL_HOST_PASSWORD",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name="emailsettings",
+            name="EMAIL_HOST_USER",
+            field=models.EmailField(blank=True, max_length=254),
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="email",
+            field=models.EmailField(max_length=254, unique=True),
+        ),
+    ]
@@ -0,0 +1,106 @@
+"""
+Primary/replica database routing.
+
+Reads go to `settings.DATABASE_READ_REPLICA` only while serving a safe
+request that has not written anything, and only for clients that have not
+written recently. Everything else -- writes, reads after a write, unsafe
+requests, management commands and background jobs -- uses the primary.
+"""
+
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DEFAULT_DB_ALIAS
+
+# Set on responses to a request that wrote, so the follow-up requests (e.g.
+# the redirect after a POST) read their own writes from the primary.
+PIN_COOKIE = "db_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class RoutingState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = ContextVar("db_routing_state", default=None)
+
+
+def begin_request(pinned=False):
+    state = RoutingState(pinned=pinned)
+    _state.set(state)
+    return state
+
+
+def end_request(**kwargs):
+    _state.set(None)
+
+
+# Streaming responses (exports) are read after the middleware has returned,
+# so routing ends with the response rather than with the middleware.
+request_finished.connect(end_request, dispatch_uid="core.db_router.end_request")
+
+
+def read_alias():
+    """
+    The database that reads go to at this point of the current request.
+
+    Values cached from those reads are keyed with it, so results read from
+    a lagging replica are never served to clients pinned to the primary.
+    """
+    state = _state.get()
+    replica = settings.DATABASE_READ_REPLICA
+    if replica and state is not None and not state.pinned:
+        return replica
+    return DEFAULT_DB_ALIAS
+
+
+def pin_to_primary():
+    """
+    Send the rest of the current request's reads to the primary.
+    """
+    state = _state.get()
+    if state is not None:
+        state.pinned = True
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.pinned = True
+            state.wrote = True
+        # Always name the primary; otherwise Django would write an instance
+        # back to the database it was read from.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, settings.DATABASE_READ_REPLICA}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaPinningMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = begin_request(
+            pinned=request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES
+        )
+        response = self.get_response(request)
+        if state.wrote and settings.DATABASE_READ_REPLICA:
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=settings.DATABASE_REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -5,7 +5,9 @@ from room.api_views import (
     TenantViewSet,
     PaymentHistoryViewSet,
     TenantDocumentViewSet,
- 
+    DeletionJobViewSet,
+    ReportViewSet,
+    ImportViewSet,
 )
 
 router = routers.DefaultRouter()
@@ -15,3 +17,6 @@ router.register("rooms", RoomViewSet, basename="room")
 router.register("tenants", TenantViewSet, basename="tenant")
 router.register("payment-histories", PaymentHistoryViewSet, basename="paymenthistory")
 router.register("tenant-documents", TenantDocumentViewSet, basename="tenantdocument")
+router.register("deletions", DeletionJobViewSet, basename="deletion")
+router.register("reports", ReportViewSet, basename="report")
+router.register("imports", ImportViewSet, basename="import")
@@ -1,4 +1,5 @@
 import os
+import sys
 
 from pathlib import Path
 
@@ -30,7 +31,9 @@ SECRET_KEY = config('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
 
-DEBUG = config('DEBUG')
+DEBUG = config('DEBUG', default=False, cast=bool)
+
+TESTING = len(sys.argv) > 1 and sys.argv[1] == "test"
 
 
 
@@ -92,6 +95,7 @@ AUTHENTICATION_BACKENDS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "core.db_router.ReplicaPinningMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -104,17 +108,26 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "core.urls"
 
+TEMPLATE_LOADERS = [
+    "django.template.loaders.filesystem.Loader",
+    "django.template.loaders.app_directories.Loader",
+]
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
-        "APP_DIRS": True,
         "OPTIONS": {
             "context_processors": [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
             ],
+            # Compile each template once per process in production; in
+            # development templates are re-read so edits show up right away.
+            "loaders": TEMPLATE_LOADERS
+            if DEBUG
+            else [("django.template.loaders.cached.Loader", TEMPLATE_LOADERS)],
         },
     },
 ]
@@ -126,17 +139,38 @@ WSGI_APPLICATION = "core.wsgi.application"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 DB_ENGINE = config("DB_ENGINE")
+# Default DB_CONN_MAX_AGE without and with DB_POOLER (see below); the
+# benchmark_db_connections command measures these same values.
+DEFAULT_CONN_MAX_AGE = 60
+POOLER_CONN_MAX_AGE = 0
 
 if DB_ENGINE == "django.db.backends.sqlite3":
-    # Local development database
+    # Development database, and the single-box deployment profile: the
+    # core.sqlite3 backend runs in WAL mode with the pragmas below and
+    # starts transactions with BEGIN IMMEDIATE, so gunicorn workers queue
+    # for the write lock instead of failing with "database is locked".
     DATABASES = {
         "default": {
-            "ENGINE": DB_ENGINE,
-            "NAME": BASE_DIR / "db.sqlite3",
+            "ENGINE": "core.sqlite3",
+            "NAME": config("SQLITE_PATH", default=str(BASE_DIR / "db.sqlite3")),
+            # Seconds a connection waits for the write lock (busy_timeout).
+            "OPTIONS": {"timeout": config("SQLITE_BUSY_TIMEOUT", default=20, cast=int)},
+            # Test runs use a real file, so threaded tests see WAL locking.
+            "TEST": {"NAME": str(BASE_DIR / "test-db.sqlite3")},
         }
     }
 else:
     # Production database (from .env)
+    #
+    # Connections are kept open for DB_CONN_MAX_AGE seconds and checked
+    # before reuse, so a request does not pay for TCP setup and auth.
+    # DB_POOLER=True is for a transaction-level pooler (e.g. PgBouncer with
+    # pool_mode=transaction) in front of Postgres: consecutive transactions
+    # may land on different server connections, so server-side cursors are
+    # off and connections are not kept unless DB_CONN_MAX_AGE says so. The
+    # database role should default to UTC so Django never needs a
+    # session-level SET TIME ZONE.
+    DB_POOLER = config("DB_POOLER", default=False, cast=bool)
     DATABASES = {
         "default": {
             "ENGINE": DB_ENGINE,
@@ -145,12 +179,101 @@ else:
             "PASSWORD": config("DB_PASSWORD"),
             "HOST": config("DB_HOST"),
             "PORT": config("DB_PORT"),
+            "CONN_MAX_AGE": config(
+                "DB_CONN_MAX_AGE",
+                default=POOLER_CONN_MAX_AGE if DB_POOLER else DEFAULT_CONN_MAX_AGE,
+                cast=int,
+            ),
+            "CONN_HEALTH_CHECKS": config("DB_CONN_HEALTH_CHECKS", default=True, cast=bool),
+            "DISABLE_SERVER_SIDE_CURSORS": DB_POOLER,
         }
     }
 
+# Applied to every SQLite connection by core.sqlite3 (see that module).
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": config("SQLITE_MMAP_SIZE", default=128 * 1024 * 1024, cast=int),
+    # Negative values are KiB, so this is a 32 MiB page cache.
+    "cache_size": config("SQLITE_CACHE_SIZE", default=-32 * 1024, cast=int),
+    "temp_store": "MEMORY",
+}
+
+# Convert PaymentHistory to yearly partitions when migrating (PostgreSQL
+# only; see room/partitioning.py).
+PAYMENT_HISTORY_PARTITIONING = config("PAYMENT_HISTORY_PARTITIONING", default=False, cast=bool)
+
+# Read replica
+#
+# With DB_REPLICA_HOST set, reads made while serving a GET go to the replica
+# (see core/db_router.py). Anything else -- writes, unsafe requests,
+# management commands -- uses the primary, and a client that just wrote
+# keeps reading from the primary for DATABASE_REPLICA_STICKY_SECONDS so it
+# sees its own changes despite replication lag.
+DB_REPLICA_HOST = config("DB_REPLICA_HOST", default="")
+DATABASE_READ_REPLICA = None
+if DB_REPLICA_HOST and DB_ENGINE != "django.db.backends.sqlite3":
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": DB_REPLICA_HOST,
+        "PORT": config("DB_REPLICA_PORT", default=DATABASES["default"]["PORT"]),
+        "USER": config("DB_REPLICA_USER", default=DATABASES["default"]["USER"]),
+        "PASSWORD": config("DB_REPLICA_PASSWORD", default=DATABASES["default"]["PASSWORD"]),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_READ_REPLICA = "replica"
+elif TESTING:
+    # A separate database so routing tests can tell the two apart; it is
+    # only read from where a test enables DATABASE_READ_REPLICA.
+    DATABASES["replica"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db-replica.sqlite3",
+    }
+
+DATABASE_REPLICA_STICKY_SECONDS = config("DB_REPLICA_STICKY_SECONDS", default=15, cast=int)
+DATABASE_ROUTERS = ["core.db_router.PrimaryReplicaRouter"]
+
 
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# CACHE_BACKEND selects the tier:
+#   locmem - per-process memory, the default for development;
+#   file   - shared between gunicorn workers through CACHE_LOCATION (a directory);
+#   redis  - any Redis-compatible server at CACHE_LOCATION (needs the `redis` package);
+#   dummy  - caches nothing.
+# Test runs always use a private locmem cache so they never touch a shared tier.
+# Per-owner keys are built with `room.cache.owner_key()`; see that module.
+
+CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "redis": "django.core.cache.backends.redis.RedisCache",
+    "dummy": "django.core.cache.backends.dummy.DummyCache",
+}
+CACHE_BACKEND = config("CACHE_BACKEND", default="locmem")
+if TESTING:
+    CACHE_BACKEND = "locmem"
+
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[CACHE_BACKEND],
+        "LOCATION": config(
+            "CACHE_LOCATION",
+            default=str(BASE_DIR / "cache") if CACHE_BACKEND == "file" else "ghar-hisab",
+        ),
+        "KEY_PREFIX": config("CACHE_KEY_PREFIX", default="gh"),
+        "TIMEOUT": config("CACHE_TIMEOUT", default=300, cast=int),
+    }
+}
+
+# Sessions are read from the cache and written through to the database, so
+# a cache flush does not log anyone out.
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -223,9 +346,26 @@ STATIC_URL = config("STATIC_URL", default="/static/")
 STATICFILES_DIRS = [BASE_DIR / "static"] if DEBUG else []
 STATIC_ROOT = BASE_DIR / "staticfiles"  # Optional: define a static root for production
 
+# Production static files get content-hashed names plus pre-compressed
+# .gz/.br siblings, written once by collectstatic and served by nginx.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+        if DEBUG
+        else "core.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+
 MEDIA_URL = config("MEDIA_URL", default="/media/")
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Tenant documents are only served after an ownership check. In production
+# nginx performs the transfer from its internal location (see nginx.conf).
+DOCUMENT_ACCEL_REDIRECT = config("DOCUMENT_ACCEL_REDIRECT", default=False, cast=bool)
+DOCUMENT_ACCEL_PREFIX = config("DOCUMENT_ACCEL_PREFIX", default="/protected-media/")
+DOCUMENT_SIGNED_URL_MAX_AGE = config("DOCUMENT_SIGNED_URL_MAX_AGE", default=300, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
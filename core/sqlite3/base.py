@@ -0,0 +1,32 @@
+"""
+SQLite backend tuned for several gunicorn workers sharing one database file.
+
+Connections are switched to WAL with the pragmas in `settings.SQLITE_PRAGMAS`
+(see `apply_pragmas`), so readers never block the writer.
+
+Transactions start with BEGIN IMMEDIATE. A plain BEGIN takes the write
+lock only at the first write, and a transaction that read first cannot
+wait for that lock: SQLite fails it with "database is locked" straight
+away instead of applying busy_timeout. Taking the lock up front makes
+concurrent writers queue on busy_timeout instead.
+"""
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE")
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, "SQLITE_PRAGMAS", {}).items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+connection_created.connect(apply_pragmas, dispatch_uid="core.sqlite3.apply_pragmas")
@@ -0,0 +1,74 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # optional; only gzip siblings are written without it
+    brotli = None
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage that also writes `.gz` (and `.br`) siblings.
+
+    Files get content-hashed names so nginx can serve them as immutable, and
+    the compressed copies are made once by `collectstatic` so nginx only
+    picks them with `gzip_static` instead of compressing per request.
+    """
+
+    compress_extensions = (
+        ".css",
+        ".js",
+        ".mjs",
+        ".map",
+        ".json",
+        ".svg",
+        ".txt",
+        ".xml",
+        ".html",
+        ".ico",
+        ".ttf",
+        ".otf",
+        ".eot",
+    )
+    # Below this the headers cost more than compression saves.
+    compress_min_size = 256
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            # Third-party CSS (e.g. dashub's login.css) points at images it
+            # does not ship; leave such references as they are rather than
+            # failing the whole deploy.
+            if content is not None:
+                raise
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if not dry_run:
+            self.compress_files()
+
+    def compress_files(self):
+        for root, _, files in os.walk(self.location):
+            for filename in files:
+                if filename.endswith(self.compress_extensions):
+                    self.compress_file(os.path.join(root, filename))
+
+    def compress_file(self, path):
+        with open(path, "rb") as handle:
+            data = handle.read()
+        if len(data) < self.compress_min_size:
+            return
+        # mtime=0 keeps the output identical across deploys.
+        self._write_smaller(path + ".gz", gzip.compress(data, compresslevel=9, mtime=0), data)
+        if brotli is not None:
+            self._write_smaller(path + ".br", brotli.compress(data), data)
+
+    def _write_smaller(self, path, compressed, original):
+        if len(compressed) < len(original):
+            with open(path, "wb") as handle:
+                handle.write(compressed)
@@ -15,7 +15,8 @@ echo "PostgreSQL is up - executing command"
 echo "Running database migrations..."
 python manage.py migrate --noinput
 
-# Collect static files
+# Collect static files. With DEBUG off this also fingerprints them and
+# writes the .gz/.br copies that nginx serves via gzip_static.
 echo "Collecting static files..."
 python manage.py collectstatic --noinput --clear
 
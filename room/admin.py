@@ -1,5 +1,17 @@
 from django.contrib import admin
-from .models import House, Room, Tenant, PaymentHistory, TenantDocument
+from .models import (
+    ArchivedPaymentHistory,
+    DeletionJob,
+    DocumentBlob,
+    House,
+    Occupancy,
+    PaymentHistory,
+    PaymentTransaction,
+    Room,
+    RoomBalance,
+    Tenant,
+    TenantDocument,
+)
 
 
 class HouseAdmin(admin.ModelAdmin):
@@ -111,10 +123,77 @@ class PaymentHistoryAdmin(admin.ModelAdmin):
     )
 
 
+class PaymentTransactionAdmin(admin.ModelAdmin):
+    # `bill_id` rather than `bill`: the bill may have been archived.
+    list_display = ("bill_id", "room", "amount", "paid_on", "method", "created_at")
+    list_filter = ("method", "paid_on", "room__house")
+    search_fields = ("room__room_number", "reference")
+    fields = ("bill_id", "room", "amount", "paid_on", "method", "reference", "created_at")
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+
+class ArchivedPaymentHistoryAdmin(admin.ModelAdmin):
+    list_display = ("room", "billing_month", "total", "total_paid", "archived_at")
+    list_filter = ("billing_month", "room__house")
+    search_fields = ("room__room_number", "billing_month")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class DeletionJobAdmin(admin.ModelAdmin):
+    list_display = ("kind", "label", "owner", "status", "deleted", "total", "created_at", "finished_at")
+    list_filter = ("status", "kind")
+    search_fields = ("label", "owner__email")
+    readonly_fields = (
+        "owner",
+        "kind",
+        "object_id",
+        "label",
+        "room_ids",
+        "total",
+        "deleted",
+        "created_at",
+        "updated_at",
+        "finished_at",
+    )
+
+
+class DocumentBlobAdmin(admin.ModelAdmin):
+    list_display = ("name", "ref_count", "updated_at")
+    list_filter = ("ref_count",)
+    search_fields = ("name",)
+    readonly_fields = ("name", "ref_count", "created_at", "updated_at")
+
+
+class OccupancyAdmin(admin.ModelAdmin):
+    list_display = ("room", "tenant", "start", "end")
+    list_filter = ("room__house",)
+    search_fields = ("room__room_number", "tenant__name")
+
+
+class RoomBalanceAdmin(admin.ModelAdmin):
+    list_display = ("room", "balance", "last_payment_date", "updated_at")
+    list_filter = ("room__house",)
+    readonly_fields = ("room", "balance", "last_payment_date", "updated_at")
+
+
 # Register your models here.
 admin.site.register(House, HouseAdmin)
 admin.site.register(Room, RoomAdmin)
 admin.site.register(Tenant, TenantAdmin)
 admin.site.register(PaymentHistory, PaymentHistoryAdmin)
+admin.site.register(PaymentTransaction, PaymentTransactionAdmin)
+admin.site.register(ArchivedPaymentHistory, ArchivedPaymentHistoryAdmin)
 # TenantDocument is managed via TenantInline, but can also be registered directly if needed
-admin.site.register(TenantDocument)
\ No newline at end of file
+admin.site.register(TenantDocument)
+admin.site.register(DocumentBlob, DocumentBlobAdmin)
+admin.site.register(DeletionJob, DeletionJobAdmin)
+admin.site.register(Occupancy, OccupancyAdmin)
+admin.site.register(RoomBalance, RoomBalanceAdmin)
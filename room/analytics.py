@@ -0,0 +1,174 @@
+import numpy as np
+
+from .archive import bill_history
+
+# Standard scores above which a reading counts as a spike.
+SPIKE_THRESHOLD = 3.0
+
+
+def load_readings(owner, room_id=None):
+    """
+    Fetch an owner's meter readings as parallel NumPy arrays.
+
+    Returns `(room_ids, month_index, consumption)` where `month_index` is
+    `year * 12 + month - 1`. Rows whose `billing_month` is not `YYYY-MM` are
+    dropped.
+    """
+    bills = bill_history(room__house__owner=owner)
+    if room_id is not None:
+        bills = bills.filter(room_id=room_id)
+    rows = list(
+        bills.order_by("room_id", "billing_month").values_list(
+            "room_id", "billing_month", "previous_units", "current_units"
+        )
+    )
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+
+    room_ids, months, previous, current = zip(*rows)
+    month_index, valid = parse_months(np.array(months, dtype=str))
+    consumption = np.array(current, dtype=np.int64) - np.array(previous, dtype=np.int64)
+    return (
+        np.array(room_ids, dtype=np.int64)[valid],
+        month_index[valid],
+        consumption[valid],
+    )
+
+
+def parse_months(months):
+    """
+    Convert an array of `YYYY-MM` strings to month indexes without a Python loop.
+
+    Returns the indexes and a mask of the values that are exactly `YYYY-MM`;
+    anything else, including a longer date such as `2024-01-15`, is invalid.
+    """
+    months = np.asarray(months)
+    if months.dtype.kind != "U":
+        raise ValueError(f"Expected an array of strings, got dtype {months.dtype}.")
+    # Checked before the cast to seven characters, which would cut a longer
+    # value down to something that looks like a month.
+    exact = np.char.str_len(months) == 7
+    codes = np.frombuffer(
+        np.ascontiguousarray(months.astype("U7")).tobytes(), dtype=np.uint32
+    ).reshape(-1, 7)
+    digits = codes.astype(np.int32) - ord("0")
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 5] * 10 + digits[:, 6]
+    valid = (
+        exact
+        & (codes[:, 4] == ord("-"))
+        & ((codes[:, [0, 1, 2, 3, 5, 6]] - ord("0")) <= 9).all(axis=1)
+        & (month >= 1)
+        & (month <= 12)
+    )
+    return (year * 12 + month - 1).astype(np.int64), valid
+
+
+def analyze_readings(room_ids, month_index, consumption, threshold=SPIKE_THRESHOLD):
+    """
+    Per-room consumption statistics computed in vectorized form.
+
+    For every room this yields the mean monthly consumption, a least-squares
+    trend (units per month), a 12-slot seasonal baseline and the readings
+    that look anomalous. A reading is anomalous when it is negative (meter
+    rolled back or replaced) or when it sits more than `threshold` standard
+    deviations above the room's leave-one-out seasonal baseline.
+    """
+    if room_ids.size == 0:
+        return []
+
+    if np.any(room_ids[1:] < room_ids[:-1]):
+        order = np.argsort(room_ids, kind="stable")
+        room_ids, month_index, consumption = room_ids[order], month_index[order], consumption[order]
+
+    # Rows arrive grouped by room, so group ids fall out of a running count of
+    # room changes instead of a sort.
+    changes = np.flatnonzero(room_ids[1:] != room_ids[:-1]) + 1
+    rooms = room_ids[np.concatenate(([0], changes))]
+    inverse = np.zeros(room_ids.size, dtype=np.int64)
+    inverse[changes] = 1
+    np.cumsum(inverse, out=inverse)
+    n_rooms = rooms.size
+
+    # Every statistic below is assembled from per-room sums, so each costs one
+    # bincount pass over the readings.
+    def room_sum(weights):
+        return np.bincount(inverse, weights=weights, minlength=n_rooms)
+
+    values = consumption.astype(np.float64)
+    counts = np.bincount(inverse, minlength=n_rooms).astype(np.float64)
+    sum_v = room_sum(values)
+    mean = sum_v / counts
+    std = np.sqrt(np.maximum(room_sum(values * values) / counts - mean * mean, 0.0))
+
+    x = (month_index - month_index.min()).astype(np.float64)
+    sum_x = room_sum(x)
+    sxx = room_sum(x * x) - sum_x * sum_x / counts
+    sxy = room_sum(x * values) - sum_x * sum_v / counts
+    trend = np.divide(sxy, sxx, out=np.zeros(n_rooms), where=sxx > 1e-9)
+
+    slot = inverse * 12 + month_index % 12
+    slot_sum = np.bincount(slot, weights=values, minlength=n_rooms * 12)
+    slot_count = np.bincount(slot, minlength=n_rooms * 12).astype(np.float64)
+    seasonal = np.divide(
+        slot_sum, slot_count, out=np.full(n_rooms * 12, np.nan), where=slot_count > 0
+    ).reshape(n_rooms, 12)
+
+    # Compare each reading with the same calendar month in other years, or
+    # with the room mean when there is no other year to compare with.
+    others = slot_count[slot] - 1
+    expected = np.divide(
+        slot_sum[slot] - values, others, out=mean[inverse].copy(), where=others > 0
+    )
+    score = (values - expected) / np.maximum(std, 1.0)[inverse]
+    anomalous = np.flatnonzero((consumption < 0) | (score > threshold))
+
+    anomalies_by_room = {}
+    for position, room_index, month, units, baseline, z in zip(
+        anomalous.tolist(),
+        inverse[anomalous].tolist(),
+        month_index[anomalous].tolist(),
+        consumption[anomalous].tolist(),
+        np.round(expected[anomalous], 2).tolist(),
+        np.round(score[anomalous], 2).tolist(),
+    ):
+        anomalies_by_room.setdefault(room_index, []).append(
+            {
+                "billing_month": _format_month(month),
+                "consumption": units,
+                "expected": baseline,
+                "score": z,
+                "kind": "rollback" if units < 0 else "spike",
+            }
+        )
+
+    baselines = np.round(seasonal, 2).astype(object)
+    baselines[np.isnan(seasonal)] = None
+    return [
+        {
+            "room_id": room_id,
+            "readings": readings,
+            "mean_consumption": room_mean,
+            "trend_per_month": room_trend,
+            "seasonal_baseline": baseline,
+            "anomalies": anomalies_by_room.get(index, []),
+        }
+        for index, (room_id, readings, room_mean, room_trend, baseline) in enumerate(
+            zip(
+                rooms.tolist(),
+                counts.astype(np.int64).tolist(),
+                np.round(mean, 2).tolist(),
+                np.round(trend, 2).tolist(),
+                baselines.tolist(),
+            )
+        )
+    ]
+
+
+def _format_month(index):
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def consumption_analytics(owner, room_id=None, threshold=SPIKE_THRESHOLD):
+    return analyze_readings(*load_readings(owner, room_id=room_id), threshold=threshold)
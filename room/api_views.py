@@ -1,47 +1,179 @@
+import hashlib
+import io
+
 from rest_framework import viewsets, mixins, status, serializers
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
+from django.db.models import BooleanField, F, IntegerField, Value
 from django.shortcuts import render
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
-from .models import House, Room, Tenant, PaymentHistory, TenantDocument
+from .models import (
+    ArchivedPaymentHistory,
+    DeletionJob,
+    House,
+    PaymentHistory,
+    Room,
+    Tenant,
+    TenantDocument,
+    VersionConflict,
+)
+from .archive import BILL_FIELDS, BillHistory
+from .downloads import document_response, signed_document_url
+from .exports import payment_export_response, tenant_archive_response
+from .reports import (
+    MONTH_RE,
+    arrears_aging,
+    daily_collections,
+    occupancy_report,
+    parse_date_range,
+    parse_month_range,
+    revenue_report,
+)
+from .analytics import SPIKE_THRESHOLD, consumption_analytics
+from .cache import versioned_key
+from .deletion import pending_house_ids, schedule_deletion
+from .payments import record_payment
+from .imports import ImportFileError, import_csv
 from .serializers import (
     HouseSerializer,
     RoomSerializer,
     TenantSerializer,
     PaymentHistorySerializer,
+    BillHistorySerializer,
     TenantDocumentSerializer,
-    
+    DeletionJobSerializer,
+    PaymentTransactionSerializer,
+    RecordPaymentSerializer,
 )
 
 
-class HouseViewSet(viewsets.ModelViewSet):
+API_CACHE_TIMEOUT = 10 * 60
+
+
+class BillHistoryPagination(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+class OwnerCachedListMixin:
+    """
+    Cache `list` responses per owner and URL under the owner's versions of
+    `cache_resources`, so any write to those resources, from any worker,
+    moves readers to a fresh key.
+    """
+
+    cache_resources = ()
+
+    def list(self, request, *args, **kwargs):
+        url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        key = versioned_key(request.user.pk, "api", self.cache_resources, self.basename, url)
+        data = cache.get(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            # Drop DRF's serializer back-reference before pickling.
+            data = list(data) if isinstance(data, list) else dict(data)
+            cache.set(key, data, API_CACHE_TIMEOUT)
+        return Response(data)
+
+
+def version_etag(version):
+    return f'"{version}"'
+
+
+class OptimisticUpdateMixin:
+    """
+    Optimistic concurrency for updates of versioned models.
+
+    `retrieve` and `update` send the row's version as the ETag. An update
+    names the version it was based on with `If-Match: "<version>"` (or a
+    `version` field in the body) and gets 409 Conflict, with the current
+    version, if the row has changed since. `If-Match: *` or neither only
+    guards against a change between this request's read and its write.
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        response["ETag"] = version_etag(response.data["version"])
+        return response
+
+    def update(self, request, *args, **kwargs):
+        try:
+            self.expected_version = self.get_expected_version(request)
+        except ValueError:
+            return Response(
+                {"error": 'Send the version as If-Match: "<version>" or an integer `version`.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            response = super().update(request, *args, **kwargs)
+        except VersionConflict:
+            current = self.get_queryset().filter(pk=kwargs[self.lookup_field]).values_list(
+                "version", flat=True
+            ).first()
+            return Response(
+                {"error": "This record was changed by someone else.", "version": current},
+                status=status.HTTP_409_CONFLICT,
+            )
+        response["ETag"] = version_etag(response.data["version"])
+        return response
+
+    def get_expected_version(self, request):
+        if_match = request.headers.get("If-Match", "").strip()
+        if if_match == "*":
+            return None
+        if if_match:
+            return int(if_match.removeprefix("W/").strip('"'))
+        version = request.data.get("version")
+        if version in (None, ""):
+            return None
+        return int(version)
+
+    def perform_update(self, serializer):
+        if self.expected_version is not None:
+            serializer.instance.version = self.expected_version
+        super().perform_update(serializer)
+
+
+class HouseViewSet(OwnerCachedListMixin, viewsets.ModelViewSet):
     queryset = House.objects.all()
     serializer_class = HouseSerializer
     permission_classes = [IsAuthenticated]
+    cache_resources = ("house",)
 
     def get_queryset(self):
-        return self.queryset.filter(owner=self.request.user)
+        return self.queryset.filter(owner=self.request.user).exclude(
+            pk__in=pending_house_ids(self.request.user)
+        )
 
     def perform__create(self, serializer):
         serializer.save(owner=self.request.user)
 
     def destroy(self, request, *args, **kwargs):
-        instance = self.get_object()
-        self.perform_destroy(instance)
+        """
+        Hide the house and its rooms now; everything under it is deleted in
+        the background. Poll `job.status_url` for progress.
+        """
+        job = schedule_deletion(request.user, house=self.get_object())
         return Response(
             {
-                "message": "House and all associated rooms, tenants, and payment history have been deleted."
+                "message": "House and all associated rooms, tenants, and payment history are being deleted.",
+                "job": DeletionJobSerializer(job, context={"request": request}).data,
             },
-            status=status.HTTP_200_OK,
+            status=status.HTTP_202_ACCEPTED,
         )
 
 
-class RoomViewSet(viewsets.ModelViewSet):
+class RoomViewSet(OwnerCachedListMixin, viewsets.ModelViewSet):
     queryset = Room.objects.all()
     serializer_class = RoomSerializer
     permission_classes = [IsAuthenticated]
+    cache_resources = ("room", "tenant")
 
     def get_queryset(self):
         queryset = self.queryset.filter(house__owner=self.request.user)
@@ -51,11 +183,17 @@ class RoomViewSet(viewsets.ModelViewSet):
         return queryset
 
     def destroy(self, request, *args, **kwargs):
-        instance = self.get_object()
-        self.perform_destroy(instance)
+        """
+        Hide the room now and delete it with its tenant and bills in the
+        background. Poll `job.status_url` for progress.
+        """
+        job = schedule_deletion(request.user, room=self.get_object())
         return Response(
-            {"message": "Room and associated tenant deleted successfully."},
-            status=status.HTTP_200_OK,
+            {
+                "message": "Room and associated tenant are being deleted.",
+                "job": DeletionJobSerializer(job, context={"request": request}).data,
+            },
+            status=status.HTTP_202_ACCEPTED,
         )
 
     @action(detail=True, methods=["get"])
@@ -137,10 +275,11 @@ class RoomViewSet(viewsets.ModelViewSet):
         )
 
 
-class TenantViewSet(viewsets.ModelViewSet):
+class TenantViewSet(OptimisticUpdateMixin, OwnerCachedListMixin, viewsets.ModelViewSet):
     queryset = Tenant.objects.all()
     serializer_class = TenantSerializer
     permission_classes = [IsAuthenticated]
+    cache_resources = ("tenant", "room", "document")
     # parser_classes = [MultiPartParser, FormParser]
 
     def get_queryset(self):
@@ -150,18 +289,106 @@ class TenantViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(room__id=room_id)
         return queryset
 
+    @action(detail=True, methods=["get"])
+    def export(self, request, pk=None):
+        """
+        Stream a ZIP of the tenant's documents and payment history.
+        """
+        return tenant_archive_response(self.get_object())
+
 
-class PaymentHistoryViewSet(viewsets.ModelViewSet):
+class PaymentHistoryViewSet(OptimisticUpdateMixin, OwnerCachedListMixin, viewsets.ModelViewSet):
     queryset = PaymentHistory.objects.all()
     serializer_class = PaymentHistorySerializer
     permission_classes = [IsAuthenticated]
+    cache_resources = ("payment", "room")
+
+    pagination_class = BillHistoryPagination
 
     def get_queryset(self):
-        queryset = self.queryset.filter(room__house__owner=self.request.user)
-        room_id = self.request.query_params.get("room_id")
+        if self.action == "list":
+            return self.bill_history()
+        return self.filter_bills(self.queryset).order_by("-created_at", "id")
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return BillHistorySerializer
+        return super().get_serializer_class()
+
+    def bill_history(self):
+        """
+        Live and archived bills, newest first, for the list: one UNION ALL
+        that the paginator limits in SQL. Archived bills are read-only, so
+        the detail routes only see live ones.
+        """
+        live = self.filter_bills(PaymentHistory.objects.all()).annotate(
+            room_name=F("room__room_name"),
+            archived=Value(False, output_field=BooleanField()),
+        )
+        # Annotated in the same order as the live columns they line up with.
+        archived = self.filter_bills(ArchivedPaymentHistory.objects.all()).annotate(
+            version=Value(None, output_field=IntegerField()),
+            room_name=F("room__room_name"),
+            archived=Value(True, output_field=BooleanField()),
+        )
+        return (
+            BillHistory(live, archived)
+            .order_by("-created_at", "id")
+            .values(*BILL_FIELDS, "version", "room_name", "archived")
+        )
+
+    def filter_bills(self, queryset):
+        params = self.request.query_params
+        queryset = queryset.filter(room__house__owner=self.request.user)
+        room_id = params.get("room_id")
         if room_id:
             queryset = queryset.filter(room__id=room_id)
-        return queryset.order_by("-created_at", "id")
+        house_id = params.get("house_id")
+        if house_id:
+            queryset = queryset.filter(room__house__id=house_id)
+        payment_status = params.get("status")
+        if payment_status:
+            queryset = queryset.filter(status=payment_status)
+        for param, lookup in (("start", "billing_month__gte"), ("end", "billing_month__lte")):
+            month = params.get(param)
+            if month:
+                if not MONTH_RE.match(month):
+                    raise serializers.ValidationError({param: "Use YYYY-MM."})
+                queryset = queryset.filter(**{lookup: month})
+        return queryset
+
+    @action(detail=False, methods=["get"], url_path="export/(?P<file_type>csv|xlsx)")
+    def export(self, request, file_type=None):
+        """
+        Stream every matching bill as CSV or XLSX.
+        Accepts the same filters as the list: room_id, house_id, status, start, end.
+        Archived bills are included.
+        """
+        bills = BillHistory(
+            self.filter_bills(PaymentHistory.objects.all()),
+            self.filter_bills(ArchivedPaymentHistory.objects.all()),
+        ).order_by("billing_month", "id")
+        return payment_export_response(bills, file_type=file_type)
+
+    @action(detail=True, methods=["post"], url_path="record-payment")
+    def record_payment(self, request, pk=None):
+        """
+        Add a payment of `amount` (received on `paid_on`, default today) to the bill.
+        Concurrent payments for one bill all count; see `room.payments`.
+        """
+        serializer = RecordPaymentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        payment = record_payment(pk, owner=request.user, **serializer.validated_data)
+        if payment is None:
+            return Response({"error": "Bill not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(
+            {
+                "transaction": PaymentTransactionSerializer(payment).data,
+                "total_paid": payment.total_paid,
+                "status": payment.status,
+            },
+            status=status.HTTP_201_CREATED,
+        )
 
 
 class TenantDocumentViewSet(viewsets.ModelViewSet):
@@ -211,4 +438,131 @@ class TenantDocumentViewSet(viewsets.ModelViewSet):
         super().destroy(request, *args, **kwargs)
         return Response({"message": "File deleted successfully"}, status=200)
 
+    @action(detail=True, methods=["get"])
+    def download(self, request, pk=None):
+        """
+        Stream the document after the ownership check in `get_queryset`.
+        """
+        document = self.get_object()
+        return document_response(document, as_attachment="download" in request.query_params)
+
+    @action(detail=True, methods=["post"], url_path="signed-url")
+    def signed_url(self, request, pk=None):
+        """
+        Return a short-lived link that works without authentication.
+        """
+        document = self.get_object()
+        return Response(
+            {
+                "url": request.build_absolute_uri(signed_document_url(document)),
+                "expires_in": settings.DOCUMENT_SIGNED_URL_MAX_AGE,
+            }
+        )
+
+
+class DeletionJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Progress of the owner's house and room deletions.
+    """
+
+    queryset = DeletionJob.objects.all()
+    serializer_class = DeletionJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return self.queryset.filter(owner=self.request.user).order_by("-created_at")
+
+
+class ReportViewSet(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+
+    @action(detail=False, methods=["get"])
+    def revenue(self, request):
+        """
+        Billed, collected and outstanding amounts per month and house.
+        Accepts `start` and `end` as YYYY-MM (defaults to the last 12 months).
+        """
+        try:
+            start, end = parse_month_range(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(revenue_report(request.user, start, end))
+
+    @action(detail=False, methods=["get"])
+    def aging(self, request):
+        """
+        Outstanding amounts per tenant and house, bucketed by bill age
+        (under 30, 30-59, 60-89 and 90+ days).
+        """
+        return Response(arrears_aging(request.user))
+
+    @action(detail=False, methods=["get"])
+    def occupancy(self, request):
+        """
+        Occupancy rate and vacancy days per house.
+        Accepts `start` and `end` as YYYY-MM-DD (defaults to the last 365 days).
+        """
+        try:
+            start, end = parse_date_range(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(occupancy_report(request.user, start, end))
+
+    @action(detail=False, methods=["get"])
+    def collections(self, request):
+        """
+        Payments received per day and method.
+        Accepts `start` and `end` as YYYY-MM-DD (defaults to the last 31 days).
+        """
+        try:
+            start, end = parse_date_range(request.query_params, default_days=31)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(daily_collections(request.user, start, end))
 
+    @action(detail=False, methods=["get"])
+    def consumption(self, request):
+        """
+        Electricity consumption trend, seasonal baseline and anomalies per room.
+        Accepts optional `room_id` and `threshold` (standard deviations).
+        """
+        room_id = request.query_params.get("room_id")
+        try:
+            room_id = int(room_id) if room_id else None
+            threshold = float(request.query_params.get("threshold", SPIKE_THRESHOLD))
+        except ValueError:
+            return Response(
+                {"error": "room_id and threshold must be numbers."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(
+            {"rooms": consumption_analytics(request.user, room_id=room_id, threshold=threshold)}
+        )
+
+
+class ImportViewSet(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+
+    @action(detail=False, methods=["post"], url_path="(?P<kind>rooms|tenants|readings)")
+    def upload(self, request, kind=None):
+        """
+        Import rooms, tenants or meter readings from an uploaded CSV `file`.
+        Pass `dry_run=true` to validate without saving. Row-level problems are
+        listed in `errors`; valid rows are imported either way.
+        """
+        upload = request.FILES.get("file")
+        if not upload:
+            return Response({"error": "A CSV file is required."}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get("dry_run", "")).lower() in ("1", "true", "yes", "on")
+        stream = io.TextIOWrapper(upload.open("rb"), encoding="utf-8-sig", newline="")
+        try:
+            report = import_csv(kind, stream, request.user, dry_run=dry_run)
+        except ImportFileError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            stream.detach()
+        return Response(
+            report.as_dict(),
+            status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED,
+        )
@@ -0,0 +1,161 @@
+"""
+Archival of settled bills and queries over live plus archived bills.
+
+`archive_paid_bills()` moves bills that are paid exactly in full and older
+than a cutoff from PaymentHistory into ArchivedPaymentHistory, so the hot
+table and its indexes only hold recent or open bills. Each room's latest
+bill always stays live, because the next bill's `previous_units` is read
+from it.
+
+History views, exports and reports read through `bill_history()`, which
+applies the same filters to both tables and returns their UNION ALL.
+"""
+
+from django.db import transaction
+from django.db.models import BooleanField, F, OuterRef, Subquery, Value
+from django.utils import timezone
+
+from .cache import bump_version_on_commit
+from .models import ArchivedPaymentHistory, PaymentHistory
+
+ARCHIVE_AFTER_MONTHS = 24
+ARCHIVE_BATCH_SIZE = 1000
+
+BILL_FIELDS = [
+    "id",
+    "room_id",
+    "billing_month",
+    "previous_units",
+    "current_units",
+    "electricity",
+    "water",
+    "rent",
+    "waste",
+    "total",
+    "payment_received_date",
+    "total_paid",
+    "remarks",
+    "status",
+    "created_at",
+    "updated_at",
+]
+
+
+class BillHistory:
+    """
+    Live and archived bills filtered alike and read as one result.
+
+    `filter()`, `exclude()` and `order_by()` return a new BillHistory;
+    `values()` and `values_list()` return the UNION ALL queryset, which can
+    be sliced, counted and iterated but not filtered. Lookups must exist on
+    both models (they share every bill column and the `room` relation), and
+    ordering fields must be among the selected ones.
+    """
+
+    def __init__(self, live=None, archived=None, ordering=()):
+        self.live = PaymentHistory.objects.all() if live is None else live
+        self.archived = ArchivedPaymentHistory.objects.all() if archived is None else archived
+        self.ordering = ordering
+
+    def filter(self, *args, **kwargs):
+        return BillHistory(
+            self.live.filter(*args, **kwargs), self.archived.filter(*args, **kwargs), self.ordering
+        )
+
+    def exclude(self, *args, **kwargs):
+        return BillHistory(
+            self.live.exclude(*args, **kwargs), self.archived.exclude(*args, **kwargs), self.ordering
+        )
+
+    def order_by(self, *fields):
+        return BillHistory(self.live, self.archived, fields)
+
+    def values(self, *fields, with_flag=False):
+        """
+        Dicts of `fields`; `with_flag` adds `archived` to tell the rows apart.
+        """
+        live, archived = self.live.order_by(), self.archived.order_by()
+        if with_flag:
+            live = live.annotate(archived=Value(False, output_field=BooleanField()))
+            archived = archived.annotate(archived=Value(True, output_field=BooleanField()))
+            fields = (*fields, "archived")
+        union = live.values(*fields).union(archived.values(*fields), all=True)
+        return union.order_by(*self.ordering)
+
+    def values_list(self, *fields):
+        union = self.live.order_by().values_list(*fields).union(
+            self.archived.order_by().values_list(*fields), all=True
+        )
+        return union.order_by(*self.ordering)
+
+
+def bill_history(**filters):
+    return BillHistory().filter(**filters)
+
+
+def archive_cutoff(months=ARCHIVE_AFTER_MONTHS, today=None):
+    """
+    The first billing month (`YYYY-MM`) that is too recent to archive.
+    """
+    today = today or timezone.localdate()
+    index = today.year * 12 + today.month - 1 - months
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def archivable_bills(cutoff):
+    latest = (
+        PaymentHistory.objects.filter(room=OuterRef("room"))
+        .order_by("-billing_month", "-id")
+        .values("id")[:1]
+    )
+    return (
+        PaymentHistory.objects.filter(
+            status="Paid",
+            total_paid=F("total"),
+            billing_month__regex=r"^[0-9]{4}-[0-9]{2}$",
+            billing_month__lt=cutoff,
+        )
+        .exclude(id=Subquery(latest))
+        .order_by("id")
+    )
+
+
+def archive_paid_bills(months=ARCHIVE_AFTER_MONTHS, batch_size=ARCHIVE_BATCH_SIZE, dry_run=False):
+    """
+    Move settled bills older than `months` to the archive; returns how many.
+
+    Each batch is copied and deleted in one transaction with the bills
+    locked, so a payment edited meanwhile is either archived as edited or
+    left alone. The delete bypasses the PaymentHistory signals: archived
+    bills owe nothing, so balances do not change, and the owners' payment
+    versions are bumped once at the end instead.
+    """
+    bills = archivable_bills(archive_cutoff(months))
+    if dry_run:
+        return bills.count()
+
+    archived = 0
+    owners = set()
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                bills.filter(id__gt=last_id)
+                .select_for_update(of=("self",))
+                .values(*BILL_FIELDS, "room__house__owner_id")[:batch_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            ArchivedPaymentHistory.objects.bulk_create(
+                [ArchivedPaymentHistory(**{field: row[field] for field in BILL_FIELDS}) for row in rows]
+            )
+            PaymentHistory.objects.filter(id__in=[row["id"] for row in rows])._raw_delete(
+                PaymentHistory.objects.db
+            )
+        archived += len(rows)
+        owners.update(row["room__house__owner_id"] for row in rows)
+
+    for owner_id in owners:
+        bump_version_on_commit(owner_id, "payment")
+    return archived
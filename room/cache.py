@@ -0,0 +1,121 @@
+"""
+Cache key namespace for owner data.
+
+Everything cached on behalf of an owner lives under
+
+    owner:<owner_id>:<name>[:<part>...]
+
+so keys from different owners can never collide, and a feature only has to
+pick a `name` that no other feature uses (e.g. "reports"). Keys are built
+with `owner_key()`; the backend adds `CACHE_KEY_PREFIX` (see settings) in
+front of them.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from core.db_router import pin_to_primary, read_alias
+
+OWNER_KEY_PREFIX = "owner"
+
+
+def owner_key(owner_id, name, *parts):
+    return ":".join([OWNER_KEY_PREFIX, str(owner_id), name, *(str(part) for part in parts)])
+
+
+# Owner data that cached values can depend on. Each has its own version
+# counter, bumped by the model signals once a save or delete commits.
+VERSIONED_RESOURCES = ("house", "room", "tenant", "document", "payment")
+
+
+def _version_key(owner_id, resource):
+    return owner_key(owner_id, "version", resource)
+
+
+def _bumped_key(owner_id, resource):
+    return owner_key(owner_id, "bumped", resource)
+
+
+def _fresh_version():
+    # Start from the clock rather than 1, so a counter that was evicted never
+    # comes back with a number some stale entry was stored under.
+    return time.time_ns()
+
+
+def bump_version(owner_id, resource):
+    """
+    Make everything cached against the owner's `resource` stale.
+
+    The counter lives in the shared cache, so a bump in one worker is seen by
+    all of them on their next lookup.
+    """
+    key = _version_key(owner_id, resource)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_version(), None)
+    if settings.DATABASE_READ_REPLICA:
+        # Expires with the replica's lag window (see `version_token()`).
+        cache.set(_bumped_key(owner_id, resource), True, settings.DATABASE_REPLICA_STICKY_SECONDS)
+
+
+def bump_version_on_commit(owner_id, resource, using=None):
+    """
+    `bump_version()` once the current transaction commits (at once outside
+    one).
+
+    Bumping earlier would let another worker read the new version while it
+    still sees the old rows, and cache the old result under the new key for
+    the whole timeout.
+    """
+    transaction.on_commit(lambda: bump_version(owner_id, resource), using=using)
+
+
+def owner_versions(owner_id, resources):
+    keys = [_version_key(owner_id, resource) for resource in resources]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            # `add` loses to a concurrent writer, so read back the winner.
+            cache.add(key, _fresh_version(), None)
+            found[key] = cache.get(key)
+        versions.append(found[key])
+    return versions
+
+
+def version_token(owner_id, resources):
+    """
+    The current versions of `resources` joined into one string.
+
+    Templates pass it to `{% cache %}` as a vary-on argument, so a fragment
+    is re-rendered as soon as any of the resources changes. Requests reading
+    from the replica get a token of their own (see `read_alias()`).
+
+    Within the replica's lag window after a bump, the replica may not have
+    the change yet, and whatever it returns would be cached under the new
+    version for the whole timeout. Such requests read from the primary.
+    """
+    token = ".".join(str(value) for value in owner_versions(owner_id, resources))
+    alias = read_alias()
+    if alias != DEFAULT_DB_ALIAS and cache.get_many(
+        [_bumped_key(owner_id, resource) for resource in resources]
+    ):
+        pin_to_primary()
+        alias = read_alias()
+    if alias != DEFAULT_DB_ALIAS:
+        token = f"{token}@{alias}"
+    return token
+
+
+def versioned_key(owner_id, name, resources, *parts):
+    """
+    An `owner_key()` that embeds the current versions of `resources`.
+
+    Values stored under it never need deleting: once one of the resources
+    changes, readers compute a different key and the old entry just expires.
+    """
+    return owner_key(owner_id, name, version_token(owner_id, resources), *parts)
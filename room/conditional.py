@@ -0,0 +1,66 @@
+"""
+Conditional GET support for the owner's HTML pages.
+
+A page's ETag is derived from the owner's data versions (see `room.cache`),
+which every save, delete and bulk path bumps, so revalidating a page costs
+a couple of cache lookups instead of the queries and the render.
+"""
+
+import hashlib
+from functools import wraps
+
+from django.contrib import messages
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from .cache import version_token
+
+
+def owner_etag(request, resources, *parts):
+    """
+    ETag for a page built from the owner's `resources`, or None to skip it.
+
+    The URL (page numbers, filters), the CSRF cookie embedded in the forms
+    and any extra `parts` are folded in. Pages with pending flash messages
+    get no ETag, since a 304 would swallow the message.
+    """
+    if not request.user.is_authenticated:
+        return None
+    if len(messages.get_messages(request)):
+        return None
+    raw = ":".join(
+        [
+            str(request.user.pk),
+            version_token(request.user.pk, resources),
+            request.get_full_path(),
+            request.META.get("CSRF_COOKIE", ""),
+            *(str(part) for part in parts),
+        ]
+    )
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+
+def private_page(etag_func=None, last_modified_func=None):
+    """
+    Answer conditional GETs for a per-user page with 304 when nothing changed.
+
+    Responses are marked `private` so shared caches never store them, and
+    `no-cache` so the browser revalidates on every visit, including back
+    navigation. `Vary: Cookie` keeps pages of different sessions apart.
+    """
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(
+            view
+        )
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ["Cookie"])
+            return response
+
+        return wrapper
+
+    return decorator
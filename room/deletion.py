@@ -0,0 +1,185 @@
+"""
+Background deletion of houses and rooms.
+
+Deleting a house through the ORM collects every room, tenant, document and
+bill into memory and deletes them one at a time with signals, which can
+outlast the worker timeout for a house with years of history. Instead,
+`schedule_deletion()` hides the house or room at once and records a
+`DeletionJob`, and `run_deletion()` removes the dependents in chunks of raw
+DELETEs, each in its own short transaction, counting progress on the job.
+
+Hiding works by detaching the rooms from their house (`Room.house` is
+nullable): every owner-facing query goes through `house__owner`, so the
+rooms and everything under them disappear in one UPDATE. A house being
+deleted is also marked inactive and left out of the house API.
+
+Jobs run in a thread started once the scheduling transaction commits. The
+`run_deletions` command (cron) picks up jobs that never started or whose
+worker died; each chunk can be repeated safely, so a job resumes where it
+stopped.
+"""
+
+import threading
+from datetime import timedelta
+
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cache import VERSIONED_RESOURCES, bump_version_on_commit
+from .models import (
+    ArchivedPaymentHistory,
+    DeletionJob,
+    DocumentBlob,
+    House,
+    Occupancy,
+    PaymentHistory,
+    PaymentTransaction,
+    Room,
+    RoomBalance,
+    Tenant,
+    TenantDocument,
+)
+
+DELETE_CHUNK_SIZE = 1000
+# A running job that has not finished a chunk for this long is presumed
+# dead and may be taken over.
+STALE_AFTER = timedelta(minutes=10)
+
+# Children before parents, so no chunk leaves a dangling foreign key behind.
+DEPENDENTS = [
+    (TenantDocument, "tenant__room_id__in"),
+    (Occupancy, "room_id__in"),
+    (PaymentTransaction, "room_id__in"),
+    (PaymentHistory, "room_id__in"),
+    (ArchivedPaymentHistory, "room_id__in"),
+    (RoomBalance, "room_id__in"),
+    (Tenant, "room_id__in"),
+    (Room, "id__in"),
+]
+
+
+def pending_house_ids(owner):
+    """
+    Ids of the owner's houses that are being deleted, for `exclude(pk__in=...)`.
+    """
+    return DeletionJob.objects.filter(owner=owner, kind="house").exclude(status="done").values(
+        "object_id"
+    )
+
+
+def schedule_deletion(owner, house=None, room=None):
+    """
+    Hide `house` (with its rooms) or `room` now and queue the deletion.
+    """
+    with transaction.atomic():
+        if house is not None:
+            room_ids = list(Room.objects.filter(house=house).values_list("id", flat=True))
+            House.objects.filter(pk=house.pk).update(is_active=False)
+            job = DeletionJob(kind="house", object_id=house.pk, label=house.name)
+        else:
+            room_ids = [room.pk]
+            job = DeletionJob(kind="room", object_id=room.pk, label=str(room))
+        Room.objects.filter(id__in=room_ids).update(house=None)
+        job.owner = owner
+        job.room_ids = room_ids
+        job.save()
+        transaction.on_commit(lambda: start_deletion(job.pk))
+    for resource in VERSIONED_RESOURCES:
+        bump_version_on_commit(owner.pk, resource)
+    return job
+
+
+def start_deletion(job_id):
+    threading.Thread(
+        target=_run_in_thread, args=(job_id,), name=f"deletion-{job_id}", daemon=True
+    ).start()
+
+
+def _run_in_thread(job_id):
+    try:
+        run_deletion(job_id)
+    finally:
+        connections.close_all()
+
+
+def claimable_jobs():
+    """
+    Jobs waiting to start, plus running or failed ones idle for `STALE_AFTER`.
+    """
+    stale = timezone.now() - STALE_AFTER
+    return DeletionJob.objects.filter(
+        Q(status="queued") | Q(status__in=["running", "failed"], updated_at__lt=stale)
+    )
+
+
+def run_deletion(job_id, chunk_size=DELETE_CHUNK_SIZE):
+    """
+    Run a queued (or stalled) job to completion; returns False if another
+    worker has it.
+    """
+    claimed = claimable_jobs().filter(pk=job_id).update(status="running", updated_at=timezone.now())
+    if not claimed:
+        return False
+    job = DeletionJob.objects.get(pk=job_id)
+    try:
+        _delete(job, chunk_size)
+    except Exception as e:
+        DeletionJob.objects.filter(pk=job.pk).update(
+            status="failed", error=str(e), updated_at=timezone.now()
+        )
+        raise
+    DeletionJob.objects.filter(pk=job.pk).update(
+        status="done", error="", finished_at=timezone.now(), updated_at=timezone.now()
+    )
+    bump_version_on_commit(job.owner_id, "house")
+    return True
+
+
+def _delete(job, chunk_size):
+    room_ids = set(job.room_ids)
+    if job.kind == "house":
+        # Rooms added to the house after it was scheduled go with it.
+        late = list(Room.objects.filter(house_id=job.object_id).values_list("id", flat=True))
+        if late:
+            Room.objects.filter(id__in=late).update(house=None)
+            room_ids.update(late)
+            DeletionJob.objects.filter(pk=job.pk).update(room_ids=sorted(room_ids))
+    room_ids = sorted(room_ids)
+
+    if job.total is None:
+        total = sum(
+            model.objects.filter(**{lookup: room_ids}).count() for model, lookup in DEPENDENTS
+        )
+        job.total = total + (job.kind == "house")
+        DeletionJob.objects.filter(pk=job.pk).update(total=job.total)
+
+    for model, lookup in DEPENDENTS:
+        queryset = model.objects.filter(**{lookup: room_ids})
+        while True:
+            with transaction.atomic():
+                if model is TenantDocument:
+                    rows = list(queryset.values_list("pk", "document")[:chunk_size])
+                    ids = [pk for pk, _ in rows]
+                else:
+                    rows = None
+                    ids = list(queryset.values_list("pk", flat=True)[:chunk_size])
+                if not ids:
+                    break
+                model.objects.filter(pk__in=ids)._raw_delete(model.objects.db)
+                # Released files are left to sweep_document_blobs, whose grace
+                # period covers an upload that is about to reuse one.
+                for _, name in rows or ():
+                    DocumentBlob.release(name)
+                _advance(job, len(ids))
+
+    if job.kind == "house":
+        House.objects.filter(pk=job.object_id)._raw_delete(House.objects.db)
+        _advance(job, 1)
+
+
+def _advance(job, count):
+    DeletionJob.objects.filter(pk=job.pk).update(
+        deleted=F("deleted") + count, updated_at=timezone.now()
+    )
+
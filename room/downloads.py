@@ -0,0 +1,57 @@
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core import signing
+from django.http import FileResponse, HttpResponse
+from django.urls import reverse
+
+SIGNING_SALT = "room.document-download"
+
+
+def document_response(document, as_attachment=False):
+    """
+    Build the response for an already authorised document download.
+
+    With `DOCUMENT_ACCEL_REDIRECT` enabled the body is left empty and nginx
+    streams the file from its internal location; otherwise Django serves it.
+    """
+    name = document.document.name
+    filename = document.name or os.path.basename(name)
+    if not os.path.splitext(filename)[1]:
+        filename += os.path.splitext(name)[1]
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+    if settings.DOCUMENT_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = settings.DOCUMENT_ACCEL_PREFIX + quote(name)
+        disposition = "attachment" if as_attachment else "inline"
+        response["Content-Disposition"] = f"{disposition}; filename*=UTF-8''{quote(filename)}"
+    else:
+        response = FileResponse(
+            document.document.open("rb"),
+            as_attachment=as_attachment,
+            filename=filename,
+            content_type=content_type,
+        )
+    response["Cache-Control"] = "private, no-store"
+    return response
+
+
+def signed_document_url(document):
+    token = signing.TimestampSigner(salt=SIGNING_SALT).sign(str(document.pk))
+    return reverse("room:signed_document", args=[token])
+
+
+def unsign_document_token(token):
+    """
+    Return the document id in `token`, or None if it is forged or expired.
+    """
+    try:
+        value = signing.TimestampSigner(salt=SIGNING_SALT).unsign(
+            token, max_age=settings.DOCUMENT_SIGNED_URL_MAX_AGE
+        )
+    except signing.BadSignature:
+        return None
+    return int(value)
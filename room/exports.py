@@ -0,0 +1,328 @@
+import csv
+import os
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.db import connections, router
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .archive import BillHistory, bill_history
+from .models import PaymentHistory, parse_move_in_date
+
+PAYMENT_HISTORY_COLUMNS = [
+    ("id", "ID"),
+    ("room__house__name", "House"),
+    ("room__room_number", "Room"),
+    ("billing_month", "Billing month"),
+    ("previous_units", "Previous units"),
+    ("current_units", "Current units"),
+    ("electricity", "Electricity"),
+    ("water", "Water"),
+    ("rent", "Rent"),
+    ("waste", "Waste"),
+    ("total", "Total"),
+    ("total_paid", "Total paid"),
+    ("status", "Status"),
+    ("payment_received_date", "Payment received"),
+    ("remarks", "Remarks"),
+    ("created_at", "Created at"),
+]
+
+FILE_CHUNK_SIZE = 64 * 1024
+ROW_CHUNK_SIZE = 2000
+# Rows are grouped into writes of roughly this many bytes.
+WRITE_BATCH_SIZE = 64 * 1024
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+XLSX_STATIC_PARTS = [
+    (
+        "[Content_Types].xml",
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        "</Types>",
+    ),
+    (
+        "_rels/.rels",
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        "</Relationships>",
+    ),
+    (
+        "xl/workbook.xml",
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Payments" sheetId="1" r:id="rId1"/></sheets>'
+        "</workbook>",
+    ),
+    (
+        "xl/_rels/workbook.xml.rels",
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        "</Relationships>",
+    ),
+]
+
+
+class Echo:
+    """
+    Pseudo-buffer for `csv.writer` that returns each line instead of storing it.
+    """
+
+    def write(self, value):
+        return value
+
+
+class ZipStreamBuffer:
+    """
+    Non-seekable sink for `zipfile.ZipFile` that is drained after every write.
+
+    `ZipFile` falls back to data descriptors when it cannot seek, so entries
+    can be written without knowing their size and nothing is kept once the
+    generator has yielded it.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries):
+    """
+    Yield a ZIP archive built from `(arcname, chunks, compress_type)` entries.
+
+    Each `chunks` is an iterable of bytes that is consumed lazily, so memory
+    use depends on the chunk size and not on the size of the archive.
+    """
+    buffer = ZipStreamBuffer()
+    date_time = timezone.localtime().timetuple()[:6]
+    with zipfile.ZipFile(buffer, mode="w") as archive:
+        for arcname, chunks, compress_type in entries:
+            info = zipfile.ZipInfo(arcname, date_time=date_time)
+            info.compress_type = compress_type
+            with archive.open(info, mode="w", force_zip64=True) as entry:
+                for chunk in chunks:
+                    entry.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def iter_file(field_file):
+    with field_file.open("rb") as handle:
+        while True:
+            chunk = handle.read(FILE_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def batched(lines, size=WRITE_BATCH_SIZE):
+    """
+    Join small byte strings into writes of about `size` bytes.
+    """
+    batch = []
+    length = 0
+    for line in lines:
+        batch.append(line)
+        length += len(line)
+        if length >= size:
+            yield b"".join(batch)
+            batch = []
+            length = 0
+    if batch:
+        yield b"".join(batch)
+
+
+def iter_payment_rows(queryset, columns=PAYMENT_HISTORY_COLUMNS):
+    # `queryset` may also be a `BillHistory` of live and archived bills.
+    fields = [field for field, _ in columns]
+    db = router.db_for_read(PaymentHistory)
+    if connections[db].settings_dict.get("DISABLE_SERVER_SIDE_CURSORS"):
+        return iter_keyset_rows(queryset, fields)
+    return queryset.values_list(*fields).iterator(chunk_size=ROW_CHUNK_SIZE)
+
+
+def _after(ordering, values):
+    # The rows that sort after `values`, as (a > x) OR (a = x AND b > y) ...
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def iter_keyset_rows(queryset, fields, chunk_size=ROW_CHUNK_SIZE):
+    """
+    Rows of `fields` from `queryset` in its order, one LIMIT query per chunk.
+
+    Behind a transaction-level pooler (DB_POOLER) there are no server-side
+    cursors, and `iterator()` would fetch the whole result at once. Each
+    chunk here starts after the last row of the one before, so memory stays
+    bounded; `id` is added to the ordering to make it unique.
+    """
+    if isinstance(queryset, BillHistory):
+        ordering = list(queryset.ordering)
+    else:
+        ordering = list(queryset.query.order_by)
+    if not ordering or ordering[-1].lstrip("-") != "id":
+        ordering.append("id")
+    queryset = queryset.order_by(*ordering)
+    selected = [*fields, *(field.lstrip("-") for field in ordering if field.lstrip("-") not in fields)]
+    positions = [selected.index(field.lstrip("-")) for field in ordering]
+
+    page = queryset
+    while True:
+        rows = list(page.values_list(*selected)[:chunk_size])
+        for row in rows:
+            yield row[: len(fields)]
+        if len(rows) < chunk_size:
+            return
+        page = queryset.filter(_after(ordering, [rows[-1][i] for i in positions]))
+
+
+def iter_payment_csv(queryset, columns=PAYMENT_HISTORY_COLUMNS):
+    """
+    Yield encoded CSV for `queryset`, reading rows in chunks.
+    """
+    writer = csv.writer(Echo())
+
+    def lines():
+        yield writer.writerow([label for _, label in columns]).encode("utf-8")
+        for row in iter_payment_rows(queryset, columns):
+            yield writer.writerow(row).encode("utf-8")
+
+    return batched(lines())
+
+
+def _xlsx_cell(value):
+    if value is None:
+        return "<c/>"
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return f"<c><v>{value}</v></c>"
+    if hasattr(value, "isoformat"):
+        value = value.isoformat()
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return ("<row>" + "".join(_xlsx_cell(value) for value in values) + "</row>").encode("utf-8")
+
+
+def iter_payment_xlsx(queryset, columns=PAYMENT_HISTORY_COLUMNS):
+    """
+    Yield an XLSX workbook for `queryset` without building it in memory.
+
+    The sheet uses inline strings, so rows can be written as they are read
+    instead of collecting a shared-strings table first.
+    """
+
+    def sheet():
+        yield (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            "<sheetData>"
+        ).encode("utf-8")
+        yield _xlsx_row([label for _, label in columns])
+        for row in iter_payment_rows(queryset, columns):
+            yield _xlsx_row(row)
+        yield b"</sheetData></worksheet>"
+
+    entries = [
+        (name, [content.encode("utf-8")], zipfile.ZIP_DEFLATED)
+        for name, content in XLSX_STATIC_PARTS
+    ]
+    entries.append(("xl/worksheets/sheet1.xml", batched(sheet()), zipfile.ZIP_DEFLATED))
+    return stream_zip(entries)
+
+
+def payment_export_response(queryset, file_type="csv"):
+    stamp = timezone.localtime().strftime("%Y%m%d-%H%M")
+    if file_type == "xlsx":
+        response = StreamingHttpResponse(iter_payment_xlsx(queryset), content_type=XLSX_CONTENT_TYPE)
+    else:
+        response = StreamingHttpResponse(
+            iter_payment_csv(queryset), content_type="text/csv; charset=utf-8"
+        )
+    response["Content-Disposition"] = f'attachment; filename="payments-{stamp}.{file_type}"'
+    return response
+
+
+def tenant_bills(tenant):
+    """
+    The bills of `tenant`'s stays: each room they lived in, from the month
+    they moved in to the month they moved out.
+
+    A first stay seeded without an ISO move-in date has no known start, so
+    it takes the room's earlier bills as well.
+    """
+    stays = list(tenant.occupancies.order_by("start"))
+    if not stays:
+        return bill_history(room_id=tenant.room_id)
+    known_start = parse_move_in_date(tenant.move_in_date) is not None
+    condition = Q()
+    for index, stay in enumerate(stays):
+        period = Q(room_id=stay.room_id)
+        if index or known_start:
+            period &= Q(billing_month__gte=f"{stay.start:%Y-%m}")
+        if stay.end:
+            period &= Q(billing_month__lte=f"{stay.end:%Y-%m}")
+        condition |= period
+    return bill_history().filter(condition)
+
+
+def tenant_archive_entries(tenant):
+    used_names = set()
+    for document in tenant.documents.all().iterator():
+        if not document.document:
+            continue
+        ext = os.path.splitext(document.document.name)[1]
+        base = slugify(document.name or "") or f"document-{document.pk}"
+        arcname = f"documents/{base}{ext}"
+        if arcname in used_names:
+            arcname = f"documents/{base}-{document.pk}{ext}"
+        used_names.add(arcname)
+        yield arcname, iter_file(document.document), zipfile.ZIP_STORED
+
+    payments = tenant_bills(tenant).order_by("billing_month", "id")
+    yield "payment_history.csv", iter_payment_csv(payments), zipfile.ZIP_DEFLATED
+
+
+def tenant_archive_response(tenant):
+    filename = f"{slugify(tenant.name) or 'tenant'}-{tenant.pk}-export.zip"
+    response = StreamingHttpResponse(
+        stream_zip(tenant_archive_entries(tenant)), content_type="application/zip"
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
@@ -1,9 +1,27 @@
+from decimal import Decimal
+
 from django import forms
 
-from .models import PaymentHistory, Tenant, TenantDocument, Room
+from .models import PaymentHistory, PaymentTransaction, Tenant, TenantDocument, Room
+
+
+class VersionedFormMixin:
+    """
+    Carries the instance's `version` through a hidden field, so saving the
+    form fails with `VersionConflict` if the row changed after the form was
+    rendered. Posts without the field are checked against the version read
+    when the form was bound.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["version"].required = False
 
+    def clean_version(self):
+        return self.cleaned_data.get("version") or self.instance.version
 
-class PaymentHistoryForm(forms.ModelForm):
+
+class PaymentHistoryForm(VersionedFormMixin, forms.ModelForm):
     class Meta:
         model = PaymentHistory
         fields = [
@@ -12,8 +30,10 @@ class PaymentHistoryForm(forms.ModelForm):
             "payment_received_date",
             "total_paid",
             "remarks",
+            "version",
         ]
         widgets = {
+            "version": forms.HiddenInput(),
             "billing_month": forms.TextInput(
                 attrs={
                     "class": "mt-1 w-full rounded-md border border-gray-300 px-3 py-2 text-sm"
@@ -44,7 +64,44 @@ class PaymentHistoryForm(forms.ModelForm):
         }
 
 
-class TenantForm(forms.ModelForm):
+class RecordPaymentForm(forms.Form):
+    amount = forms.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        min_value=Decimal("0.01"),
+        widget=forms.NumberInput(
+            attrs={
+                "class": "mt-1 w-full rounded-md border border-gray-300 px-3 py-2 text-sm",
+                "step": "0.01",
+            }
+        ),
+    )
+    paid_on = forms.DateField(
+        required=False,
+        widget=forms.DateInput(
+            attrs={
+                "class": "mt-1 w-full rounded-md border border-gray-300 px-3 py-2 text-sm",
+                "type": "date",
+            }
+        ),
+    )
+    method = forms.ChoiceField(
+        choices=PaymentTransaction.METHOD_CHOICES,
+        initial="cash",
+        widget=forms.Select(
+            attrs={"class": "mt-1 w-full rounded-md border border-gray-300 px-3 py-2 text-sm"}
+        ),
+    )
+    reference = forms.CharField(
+        max_length=500,
+        required=False,
+        widget=forms.TextInput(
+            attrs={"class": "mt-1 w-full rounded-md border border-gray-300 px-3 py-2 text-sm"}
+        ),
+    )
+
+
+class TenantForm(VersionedFormMixin, forms.ModelForm):
     class Meta:
         model = Tenant
         fields = [
@@ -57,8 +114,10 @@ class TenantForm(forms.ModelForm):
             "water_price",
             "waste_price",
             "initial_unit",
+            "version",
         ]
         widgets = {
+            "version": forms.HiddenInput(),
             "name": forms.TextInput(
                 attrs={"class": "mt-1 w-full rounded-md border border-gray-300 px-3 py-2 text-sm"}
             ),
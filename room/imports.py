@@ -0,0 +1,430 @@
+import csv
+from collections import defaultdict
+from decimal import Decimal
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .models import (
+    House,
+    Occupancy,
+    PaymentHistory,
+    PaymentTransaction,
+    Room,
+    RoomBalance,
+    Tenant,
+    parse_move_in_date,
+    parse_received_date,
+)
+from .cache import bump_version_on_commit
+from .reports import MONTH_RE
+
+IMPORT_BATCH_SIZE = 1000
+# Only the first errors are kept in the report; the rest are only counted.
+MAX_REPORTED_ERRORS = 500
+
+
+class ImportFileError(Exception):
+    """
+    The file as a whole cannot be imported (bad header, wrong encoding).
+    """
+
+
+class RowError(Exception):
+    pass
+
+
+class ImportReport:
+    def __init__(self, kind, dry_run=False):
+        self.kind = kind
+        self.dry_run = dry_run
+        self.rows = 0
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self):
+        return {
+            "kind": self.kind,
+            "dry_run": self.dry_run,
+            "rows": self.rows,
+            "created": self.created,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+def _clean_field(model, name, value):
+    """
+    Run a model field's own conversion and validators on a CSV cell.
+    Blank cells fall back to the field default when there is one.
+    """
+    field = model._meta.get_field(name)
+    value = (value or "").strip()
+    if value == "":
+        if field.has_default():
+            return field.get_default()
+        if field.null:
+            return None
+        raise RowError(f"{name} is required.")
+    try:
+        return field.clean(value, None)
+    except ValidationError as e:
+        raise RowError(f"{name}: {' '.join(e.messages)}")
+
+
+class BaseImporter:
+    """
+    Validate and insert CSV rows in batches.
+
+    Rows are read lazily from the file, so only one batch is in memory at a
+    time. For each batch the referenced houses and rooms are fetched with a
+    single `__in` query, the valid rows are inserted with `bulk_create`
+    inside their own transaction, and invalid rows are recorded in the
+    report with their line number. A dry run does everything except the
+    insert.
+    """
+
+    kind = None
+    model = None
+    # Owner versions to bump once rows have been inserted (see room.cache).
+    resources = ()
+    required_columns = ()
+    optional_columns = ()
+
+    def __init__(self, owner, dry_run=False, batch_size=IMPORT_BATCH_SIZE):
+        self.owner = owner
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.report = ImportReport(self.kind, dry_run=dry_run)
+
+    def run(self, stream):
+        try:
+            reader = csv.DictReader(stream)
+            header = [column.strip() for column in reader.fieldnames or []]
+            missing = [column for column in self.required_columns if column not in header]
+            if missing:
+                raise ImportFileError(f"Missing column(s): {', '.join(missing)}.")
+            reader.fieldnames = header
+
+            # Header is line 1; DictReader skips blank lines, so line numbers
+            # come from the reader instead of a counter.
+            rows = ((reader.line_num, row) for row in reader)
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                self.report.rows += len(batch)
+                self.process_batch(batch)
+        except UnicodeDecodeError:
+            raise ImportFileError("The file must be UTF-8 encoded CSV.")
+        except csv.Error as e:
+            raise ImportFileError(f"Malformed CSV: {e}")
+
+        if self.report.created and not self.dry_run:
+            for resource in self.resources:
+                bump_version_on_commit(self.owner.pk, resource)
+        return self.report
+
+    def process_batch(self, batch):
+        # Rows are checked and inserted in one transaction, so locks taken in
+        # `prefetch` hold until the batch is written.
+        with transaction.atomic():
+            context = self.prefetch([row for _, row in batch])
+            objects = []
+            for line, row in batch:
+                if None in row:
+                    self.report.add_error(line, "Row has more cells than the header.")
+                    continue
+                try:
+                    objects.append(self.build(row, context))
+                except RowError as e:
+                    self.report.add_error(line, str(e))
+
+            if objects and not self.dry_run:
+                self.model.objects.bulk_create(objects, batch_size=self.batch_size)
+                self.after_create(objects)
+        self.report.created += len(objects)
+
+    def prefetch(self, rows):
+        return {}
+
+    def build(self, row, context):
+        raise NotImplementedError
+
+    def after_create(self, objects):
+        pass
+
+    def houses_by_name(self, rows):
+        names = {(row.get("house") or "").strip() for row in rows}
+        houses = {}
+        for house_id, name in House.objects.filter(
+            owner=self.owner, name__in=names
+        ).values_list("id", "name"):
+            # House names are not unique, so a name used twice cannot be
+            # resolved from a spreadsheet.
+            houses[name] = None if name in houses else house_id
+        return houses
+
+    def house_id(self, row, houses):
+        name = (row.get("house") or "").strip()
+        if not name:
+            raise RowError("house is required.")
+        if name not in houses:
+            raise RowError(f"House '{name}' not found.")
+        if houses[name] is None:
+            raise RowError(f"More than one house is named '{name}'.")
+        return houses[name]
+
+
+class RoomImporter(BaseImporter):
+    kind = "rooms"
+    model = Room
+    resources = ("room",)
+    required_columns = ("house", "room_number")
+    optional_columns = ("room_name",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Rooms accepted earlier in this file, so duplicates are caught across
+        # batches and in dry runs.
+        self.seen = set()
+
+    def prefetch(self, rows):
+        houses = self.houses_by_name(rows)
+        numbers = {(row.get("room_number") or "").strip() for row in rows}
+        existing = set(
+            Room.objects.filter(
+                house_id__in=[pk for pk in houses.values() if pk], room_number__in=numbers
+            ).values_list("house_id", "room_number")
+        )
+        return {"houses": houses, "existing": existing}
+
+    def build(self, row, context):
+        house_id = self.house_id(row, context["houses"])
+        room_number = _clean_field(Room, "room_number", row.get("room_number"))
+        key = (house_id, room_number)
+        if key in context["existing"] or key in self.seen:
+            raise RowError(f"Room {room_number} already exists in this house.")
+        self.seen.add(key)
+        return Room(
+            house_id=house_id,
+            room_number=room_number,
+            room_name=_clean_field(Room, "room_name", row.get("room_name")),
+        )
+
+
+class RoomLookupMixin:
+    """
+    Resolve `house` + `room_number` columns to a room of the owner.
+    """
+
+    room_fields = ("id", "house_id", "room_number")
+
+    def rooms_by_number(self, rows, queryset=None):
+        houses = self.houses_by_name(rows)
+        numbers = {(row.get("room_number") or "").strip() for row in rows}
+        queryset = queryset if queryset is not None else Room.objects.all()
+        rooms = {}
+        for room in queryset.filter(
+            house_id__in=[pk for pk in houses.values() if pk], room_number__in=numbers
+        ).values(*self.room_fields):
+            key = (room["house_id"], room["room_number"])
+            rooms[key] = None if key in rooms else room
+        return houses, rooms
+
+    def room_for(self, row, houses, rooms):
+        house_id = self.house_id(row, houses)
+        room_number = (row.get("room_number") or "").strip()
+        key = (house_id, room_number)
+        if key not in rooms:
+            raise RowError(f"Room {room_number} not found in this house.")
+        if rooms[key] is None:
+            raise RowError(f"More than one room is numbered {room_number} in this house.")
+        return rooms[key]
+
+
+class TenantImporter(RoomLookupMixin, BaseImporter):
+    kind = "tenants"
+    model = Tenant
+    resources = ("tenant",)
+    required_columns = ("house", "room_number", "name", "contact", "move_in_date")
+    optional_columns = (
+        "email",
+        "electricity_price_per_unit",
+        "water_price",
+        "rent_price",
+        "waste_price",
+        "initial_unit",
+    )
+    room_fields = RoomLookupMixin.room_fields + ("tenant__id",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.seen = set()
+
+    def prefetch(self, rows):
+        houses, rooms = self.rooms_by_number(rows)
+        return {"houses": houses, "rooms": rooms}
+
+    def build(self, row, context):
+        room = self.room_for(row, context["houses"], context["rooms"])
+        if room["tenant__id"] or room["id"] in self.seen:
+            raise RowError(f"Room {room['room_number']} already has a tenant.")
+        values = {
+            column: _clean_field(Tenant, column, row.get(column))
+            for column in self.required_columns[2:] + self.optional_columns
+        }
+        self.seen.add(room["id"])
+        return Tenant(room_id=room["id"], **values)
+
+    def after_create(self, objects):
+        # bulk_create sends no signals, so do what the Tenant signals would.
+        Room.objects.filter(id__in=[tenant.room_id for tenant in objects]).update(
+            is_occupied=True
+        )
+        today = timezone.localdate()
+        Occupancy.objects.bulk_create(
+            [
+                Occupancy(
+                    room_id=tenant.room_id,
+                    tenant=tenant,
+                    start=min(parse_move_in_date(tenant.move_in_date) or today, today),
+                )
+                for tenant in objects
+            ]
+        )
+
+
+class ReadingImporter(RoomLookupMixin, BaseImporter):
+    """
+    Import monthly meter readings as bills.
+
+    `bulk_create` skips `PaymentHistory.save()`, so the previous reading and
+    the charges are worked out here the same way `save()` does: from the
+    room's latest bill, or the tenant's initial unit when there is none.
+    Readings for a room must be in increasing month order. The rooms of a
+    batch are locked while it is checked and inserted.
+    """
+
+    kind = "readings"
+    model = PaymentHistory
+    resources = ("payment",)
+    required_columns = ("house", "room_number", "billing_month", "current_units")
+    optional_columns = ("total_paid", "payment_received_date", "remarks")
+    room_fields = RoomLookupMixin.room_fields + (
+        "tenant__id",
+        "tenant__initial_unit",
+        "tenant__electricity_price_per_unit",
+        "tenant__water_price",
+        "tenant__rent_price",
+        "tenant__waste_price",
+        "last_month",
+        "last_units",
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # room id -> (billing month, current units) of the latest accepted row.
+        self.latest = {}
+
+    def prefetch(self, rows):
+        latest = PaymentHistory.objects.filter(room=OuterRef("pk")).order_by("-billing_month", "-id")
+        # Lock the rooms like `PaymentHistory.save()` does, so the latest
+        # readings stay current until the batch is inserted.
+        queryset = Room.objects.select_for_update().annotate(
+            last_month=Subquery(latest.values("billing_month")[:1]),
+            last_units=Subquery(latest.values("current_units")[:1]),
+        )
+        houses, rooms = self.rooms_by_number(rows, queryset)
+        return {"houses": houses, "rooms": rooms}
+
+    def build(self, row, context):
+        room = self.room_for(row, context["houses"], context["rooms"])
+        if not room["tenant__id"]:
+            raise RowError(f"Room {room['room_number']} has no tenant.")
+
+        billing_month = (row.get("billing_month") or "").strip()
+        if not MONTH_RE.match(billing_month):
+            raise RowError("billing_month must be YYYY-MM.")
+        current_units = _clean_field(PaymentHistory, "current_units", row.get("current_units"))
+
+        if room["id"] in self.latest:
+            last_month, previous_units = self.latest[room["id"]]
+        elif room["last_month"] is not None:
+            last_month, previous_units = room["last_month"], room["last_units"]
+        else:
+            last_month, previous_units = None, room["tenant__initial_unit"]
+        if last_month is not None and billing_month <= last_month:
+            raise RowError(f"Room {room['room_number']} already has a bill for {last_month} or later.")
+        if current_units <= previous_units:
+            raise RowError(f"current_units must be greater than the previous reading ({previous_units}).")
+
+        bill = PaymentHistory(
+            room_id=room["id"],
+            billing_month=billing_month,
+            previous_units=previous_units,
+            current_units=current_units,
+            electricity=(current_units - previous_units) * room["tenant__electricity_price_per_unit"],
+            water=room["tenant__water_price"],
+            rent=room["tenant__rent_price"],
+            waste=room["tenant__waste_price"],
+            total_paid=_clean_field(PaymentHistory, "total_paid", row.get("total_paid")),
+            payment_received_date=_clean_field(
+                PaymentHistory, "payment_received_date", row.get("payment_received_date")
+            ),
+            remarks=_clean_field(PaymentHistory, "remarks", row.get("remarks")),
+        )
+        bill.total = bill.electricity + bill.water + bill.rent + bill.waste
+        bill.status = bill._get_status(bill.total, bill.total_paid)
+        self.latest[room["id"]] = (billing_month, current_units)
+        return bill
+
+    def after_create(self, objects):
+        # bulk_create sends no signals, so move the room balances and log
+        # the payments here.
+        balances = defaultdict(Decimal)
+        paid = set()
+        transactions = []
+        today = timezone.localdate()
+        for bill in objects:
+            total_paid = Decimal(str(bill.total_paid))
+            balances[bill.room_id] += bill.total - total_paid
+            if total_paid:
+                paid.add(bill.room_id)
+                transactions.append(
+                    PaymentTransaction(
+                        bill_id=bill.pk,
+                        room_id=bill.room_id,
+                        amount=total_paid,
+                        paid_on=parse_received_date(bill.payment_received_date) or today,
+                        method="other",
+                        reference=bill.payment_received_date or "",
+                    )
+                )
+        PaymentTransaction.objects.bulk_create(transactions, batch_size=self.batch_size)
+        for room_id, amount in balances.items():
+            RoomBalance.apply(room_id, amount, paid_on=today if room_id in paid else None)
+
+
+IMPORTERS = {
+    importer.kind: importer for importer in (RoomImporter, TenantImporter, ReadingImporter)
+}
+
+
+def import_csv(kind, stream, owner, dry_run=False, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Import `stream` (a text file object) as `kind` for `owner`.
+    Raises `ImportFileError` when the file cannot be read at all.
+    """
+    if kind not in IMPORTERS:
+        raise ImportFileError(f"Unknown import type '{kind}'.")
+    return IMPORTERS[kind](owner, dry_run=dry_run, batch_size=batch_size).run(stream)
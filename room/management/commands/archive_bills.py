@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from room.archive import ARCHIVE_AFTER_MONTHS, ARCHIVE_BATCH_SIZE, archive_cutoff, archive_paid_bills
+
+
+class Command(BaseCommand):
+    help = "Move bills that are paid in full and older than a cutoff to the archive table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=ARCHIVE_AFTER_MONTHS,
+            help="Archive bills for billing months at least this many months ago.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=ARCHIVE_BATCH_SIZE,
+            help="Bills moved per transaction.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report how many bills would be archived without moving them.",
+        )
+
+    def handle(self, *args, **options):
+        count = archive_paid_bills(
+            months=options["months"],
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+        )
+        cutoff = archive_cutoff(options["months"])
+        if options["dry_run"]:
+            self.stdout.write(f"{count} bill(s) before {cutoff} would be archived.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Archived {count} bill(s) before {cutoff}."))
@@ -0,0 +1,112 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import Client, RequestFactory
+
+# Connection settings compared by the benchmark. The persistent modes and
+# "pooler" use the CONN_MAX_AGE that settings default to without and with
+# DB_POOLER=True, so they measure the shipped configuration.
+MODES = {
+    "per-request": {
+        "CONN_MAX_AGE": 0,
+        "CONN_HEALTH_CHECKS": False,
+        "DISABLE_SERVER_SIDE_CURSORS": False,
+    },
+    "persistent": {
+        "CONN_MAX_AGE": settings.DEFAULT_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": False,
+        "DISABLE_SERVER_SIDE_CURSORS": False,
+    },
+    "persistent+checks": {
+        "CONN_MAX_AGE": settings.DEFAULT_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
+        "DISABLE_SERVER_SIDE_CURSORS": False,
+    },
+    "pooler": {
+        "CONN_MAX_AGE": settings.POOLER_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
+        "DISABLE_SERVER_SIDE_CURSORS": True,
+    },
+}
+
+
+class Command(BaseCommand):
+    help = "Compare request latency with per-request, persistent and pooler-safe DB connections."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/api/houses/", help="URL to request.")
+        parser.add_argument("--owner", help="Email of the user to request the page as.")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per mode.")
+        parser.add_argument("--host", default="localhost", help="Host header; must be allowed.")
+        parser.add_argument(
+            "--mode",
+            action="append",
+            choices=sorted(MODES),
+            help="Mode to run; repeat for several. Defaults to all of them.",
+        )
+
+    def handle(self, *args, **options):
+        cookie = ""
+        if options["owner"]:
+            try:
+                owner = get_user_model().objects.get(email=options["owner"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user with email {options['owner']}.")
+            client = Client()
+            client.force_login(owner)
+            cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+        connection = connections["default"]
+        original = {key: connection.settings_dict.get(key) for key in MODES["per-request"]}
+        opened = []
+
+        def count_connection(sender, connection, **kwargs):
+            if connection.alias == "default":
+                opened.append(connection)
+
+        # Requests go through the real WSGI handler rather than the test
+        # client, which keeps connections open between requests.
+        handler = WSGIHandler()
+        factory = RequestFactory(HTTP_HOST=options["host"])
+        connection_created.connect(count_connection)
+        try:
+            for name in options["mode"] or list(MODES):
+                connection.close()
+                connection.settings_dict.update(MODES[name])
+                self.request(handler, factory, options["path"], cookie)  # warm-up
+                opened.clear()
+                timings = []
+                for _ in range(options["requests"]):
+                    started = time.perf_counter()
+                    self.request(handler, factory, options["path"], cookie)
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                self.stdout.write(
+                    f"{name:<18} mean {statistics.fmean(timings):7.2f} ms  "
+                    f"p50 {timings[len(timings) // 2]:7.2f} ms  "
+                    f"p95 {timings[int(len(timings) * 0.95) - 1]:7.2f} ms  "
+                    f"connections {len(opened)}"
+                )
+        finally:
+            connection_created.disconnect(count_connection)
+            connection.close()
+            connection.settings_dict.update(original)
+
+    def request(self, handler, factory, path, cookie):
+        environ = factory.get(path, HTTP_COOKIE=cookie).environ
+        status = []
+        response = handler(environ, lambda code, headers, *args: status.append(code))
+        try:
+            for _ in response:
+                pass
+        finally:
+            # Fires request_finished, which is where old connections close.
+            response.close()
+        if not status[0].startswith(("2", "3")):
+            raise CommandError(f"{path} answered {status[0]}.")
@@ -0,0 +1,79 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, F, Max, Q, Sum
+from django.utils import timezone
+
+from room.models import PaymentHistory, RoomBalance
+
+BALANCE = Sum(F("total") - F("total_paid"), output_field=DecimalField(max_digits=12, decimal_places=2))
+LAST_PAID = Max("updated_at", filter=Q(total_paid__gt=0))
+
+
+class Command(BaseCommand):
+    help = "Recompute room balances from bills and report (or fix) any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Overwrite drifted balances with the recomputed values.",
+        )
+
+    def handle(self, *args, **options):
+        expected = {
+            row["room_id"]: (row["balance"] or Decimal("0"), row["last_paid"])
+            for row in PaymentHistory.objects.values("room_id")
+            .annotate(balance=BALANCE, last_paid=LAST_PAID)
+            .order_by()
+            .iterator()
+        }
+
+        drifted = []
+        for room_id, balance in RoomBalance.objects.values_list("room_id", "balance").iterator():
+            correct, _ = expected.pop(room_id, (Decimal("0"), None))
+            if balance != correct:
+                drifted.append((room_id, balance, correct))
+        drifted.extend(
+            (room_id, None, balance)
+            for room_id, (balance, last_paid) in expected.items()
+            if balance or last_paid
+        )
+
+        if options["fix"]:
+            # The scan above is only a list of suspects: bills may have
+            # changed since, so each one is re-checked under its lock.
+            drifted = [row for row in map(self.fix_room, (row[0] for row in drifted)) if row]
+
+        for room_id, balance, correct in drifted:
+            self.stdout.write(f"Room {room_id}: recorded {balance}, expected {correct}")
+        verb = "Fixed" if options["fix"] else "Found"
+        style = self.style.SUCCESS if options["fix"] or not drifted else self.style.WARNING
+        self.stdout.write(style(f"{verb} {len(drifted)} drifted balance(s)."))
+
+    def fix_room(self, room_id):
+        """
+        Recompute one room's balance and store it if it has drifted; returns
+        `(room_id, recorded, correct)` for a fixed room, otherwise None.
+
+        The balance row is locked before the bills are summed, so a bill
+        written meanwhile either is in the sum or applies its change after
+        this one (its signal waits for the lock).
+        """
+        with transaction.atomic():
+            created = RoomBalance.objects.get_or_create(room_id=room_id)[1]
+            row = RoomBalance.objects.select_for_update().get(room_id=room_id)
+            totals = PaymentHistory.objects.filter(room_id=room_id).aggregate(
+                balance=BALANCE, last_paid=LAST_PAID
+            )
+            correct = totals["balance"] or Decimal("0")
+            if row.balance == correct and not created:
+                return None
+            changes = {"balance": correct, "updated_at": timezone.now()}
+            # Payment dates cannot be recovered exactly from bills; only
+            # fill them in when missing.
+            if row.last_payment_date is None and totals["last_paid"]:
+                changes["last_payment_date"] = totals["last_paid"].date()
+            RoomBalance.objects.filter(room_id=room_id).update(**changes)
+        return room_id, None if created else row.balance, correct
@@ -0,0 +1,57 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from room.imports import IMPORT_BATCH_SIZE, IMPORTERS, ImportFileError, import_csv
+
+
+class Command(BaseCommand):
+    help = "Import rooms, tenants or meter readings for an owner from a CSV file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(IMPORTERS))
+        parser.add_argument("path", help="CSV file with a header row.")
+        parser.add_argument("--owner", required=True, help="Email of the owning user.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help="Rows validated and inserted per transaction.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate the file and report errors without saving anything.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            owner = get_user_model().objects.get(email=options["owner"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {options['owner']}.")
+
+        try:
+            with open(options["path"], encoding="utf-8-sig", newline="") as stream:
+                report = import_csv(
+                    options["kind"],
+                    stream,
+                    owner,
+                    dry_run=options["dry_run"],
+                    batch_size=options["batch_size"],
+                )
+        except OSError as e:
+            raise CommandError(str(e))
+        except ImportFileError as e:
+            raise CommandError(str(e))
+
+        for error in report.errors:
+            self.stderr.write(f"Line {error['line']}: {error['error']}")
+        if report.error_count > len(report.errors):
+            self.stderr.write(f"... and {report.error_count - len(report.errors)} more error(s).")
+
+        verb = "Would import" if report.dry_run else "Imported"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {report.created} of {report.rows} {report.kind} row(s); "
+                f"{report.error_count} error(s)."
+            )
+        )
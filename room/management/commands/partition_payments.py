@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from room.partitioning import (
+    COPY_BATCH_SIZE,
+    YEARS_AHEAD,
+    PartitioningError,
+    convert,
+    detach_partition,
+    ensure_partitions,
+    is_partitioned,
+    partitions,
+)
+
+
+class Command(BaseCommand):
+    help = "Convert PaymentHistory to yearly partitions (PostgreSQL) and manage its partitions."
+
+    def add_arguments(self, parser):
+        subcommands = parser.add_subparsers(dest="action", required=True)
+        convert_parser = subcommands.add_parser(
+            "convert", help="Partition the existing table, copying rows in batches."
+        )
+        convert_parser.add_argument("--batch-size", type=int, default=COPY_BATCH_SIZE)
+        convert_parser.add_argument("--years-ahead", type=int, default=YEARS_AHEAD)
+        ensure_parser = subcommands.add_parser(
+            "ensure",
+            help=(
+                "Create partitions for the coming years; run it from cron. Bills for a "
+                "new partition's year that are already in the default partition (e.g. "
+                "a mistyped year) are moved into it."
+            ),
+        )
+        ensure_parser.add_argument("--years-ahead", type=int, default=YEARS_AHEAD)
+        detach_parser = subcommands.add_parser(
+            "detach", help="Detach a year's partition so it can be archived and dropped."
+        )
+        detach_parser.add_argument("year", type=int)
+        subcommands.add_parser("status", help="List partitions and their estimated sizes.")
+
+    def handle(self, *args, **options):
+        try:
+            if options["action"] != "convert" and not is_partitioned(connection):
+                raise PartitioningError(
+                    "PaymentHistory is not partitioned; run `partition_payments convert` first."
+                )
+            getattr(self, options["action"])(options)
+        except PartitioningError as e:
+            raise CommandError(str(e))
+
+    def convert(self, options):
+        converted = convert(
+            connection,
+            batch_size=options["batch_size"],
+            years_ahead=options["years_ahead"],
+            log=self.stdout.write,
+        )
+        if converted:
+            self.stdout.write(self.style.SUCCESS("PaymentHistory is now partitioned by year."))
+
+    def ensure(self, options):
+        years = ensure_partitions(
+            connection, years_ahead=options["years_ahead"], log=self.stdout.write
+        )
+        self.stdout.write(self.style.SUCCESS(f"Partitions exist for {years[0]}-{years[-1]}."))
+
+    def detach(self, options):
+        detach_partition(connection, options["year"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Detached {options['year']}; dump and drop the table when it is archived."
+            )
+        )
+
+    def status(self, options):
+        for name, bounds, rows in partitions(connection):
+            self.stdout.write(f"{name:<36} {bounds:<48} ~{max(int(rows), 0)} row(s)")
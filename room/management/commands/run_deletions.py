@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from room.deletion import DELETE_CHUNK_SIZE, claimable_jobs, run_deletion
+
+
+class Command(BaseCommand):
+    help = "Run house and room deletions that never started, stalled or failed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DELETE_CHUNK_SIZE,
+            help="Rows deleted per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        finished = failed = 0
+        for job_id in list(claimable_jobs().order_by("created_at").values_list("id", flat=True)):
+            try:
+                if run_deletion(job_id, chunk_size=options["chunk_size"]):
+                    finished += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Deletion job {job_id} failed: {e}")
+        self.stdout.write(self.style.SUCCESS(f"Finished {finished} deletion job(s), {failed} failed."))
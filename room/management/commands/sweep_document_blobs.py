@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from room.models import DocumentBlob, TenantDocument
+from room.storage import document_storage
+
+
+class Command(BaseCommand):
+    help = "Delete document blobs that are no longer referenced by any tenant document."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-minutes",
+            type=int,
+            default=60,
+            help="Only sweep blobs that have been unreferenced for at least this long.",
+        )
+        parser.add_argument(
+            "--recount",
+            action="store_true",
+            help="Rebuild reference counts from TenantDocument before sweeping.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be deleted without touching anything.",
+        )
+
+    def handle(self, *args, **options):
+        if options["recount"]:
+            self.recount(dry_run=options["dry_run"])
+
+        cutoff = timezone.now() - timedelta(minutes=options["grace_minutes"])
+        orphans = DocumentBlob.objects.filter(ref_count=0, updated_at__lt=cutoff)
+        storage = document_storage()
+        swept = 0
+
+        for pk, name in list(orphans.values_list("pk", "name")):
+            if options["dry_run"]:
+                self.stdout.write(f"Would delete {name}")
+                swept += 1
+                continue
+            with transaction.atomic():
+                # Re-check under the row lock: an upload that reuses the file
+                # touches or acquires the row first, and one that comes later
+                # waits for this transaction and finds the file gone (see
+                # ContentAddressedStorage.save).
+                blob = (
+                    DocumentBlob.objects.select_for_update()
+                    .filter(pk=pk, ref_count=0, updated_at__lt=cutoff)
+                    .first()
+                )
+                if blob is None:
+                    continue
+                storage.delete(blob.name)
+                blob.delete()
+            swept += 1
+
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {swept} orphaned blob(s)."))
+
+    def recount(self, dry_run=False):
+        counts = dict(
+            TenantDocument.objects.exclude(document="")
+            .values_list("document")
+            .annotate(refs=Count("id"))
+            .values_list("document", "refs")
+        )
+        drift = 0
+        for blob in DocumentBlob.objects.iterator():
+            refs = counts.pop(blob.name, 0)
+            if blob.ref_count != refs:
+                drift += 1
+                if not dry_run:
+                    DocumentBlob.objects.filter(pk=blob.pk).update(
+                        ref_count=refs, updated_at=timezone.now()
+                    )
+        drift += len(counts)
+        if not dry_run:
+            DocumentBlob.objects.bulk_create(
+                [DocumentBlob(name=name, ref_count=refs) for name, refs in counts.items()]
+            )
+        self.stdout.write(f"Reference counts corrected for {drift} blob(s).")
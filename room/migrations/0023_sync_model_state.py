@@ -0,0 +1,129 @@
+# Generated by Django 4.2.25 on 2026-10-19 15:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Stands in for the migrations that existing databases already applied
+    # but that are not in the repository, so Django treats it as applied
+    # there and only runs it on new databases.
+    replaces = [
+        ("room", "0023_remove_paymenthistory_electricity_paid_and_more"),
+        ("room", "0024_remove_paymenthistory_payment_received_date_and_more"),
+        ("room", "0025_room_room_name_alter_room_room_number"),
+        ("room", "0026_alter_tenant_move_in_date"),
+        ("room", "0027_alter_room_room_name"),
+        ("room", "0028_house_is_active"),
+        ("room", "0029_rename_payment_received_data_paymenthistory_payment_received_date"),
+        ("room", "0030_tenantdocument_name"),
+        ("room", "0031_alter_tenantdocument_name"),
+        ("room", "0032_tenant_email_and_verified"),
+    ]
+
+    dependencies = [
+        ("room", "0022_alter_paymentreceived_received_date_and_more"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="paymenthistory",
+            name="electricity_paid",
+        ),
+        migrations.RemoveField(
+            model_name="paymenthistory",
+            name="electricity_status",
+        ),
+        migrations.RemoveField(
+            model_name="paymenthistory",
+            name="electricity_updated_at",
+        ),
+        migrations.RemoveField(
+            model_name="paymenthistory",
+            name="rent_paid",
+        ),
+        migrations.RemoveField(
+            model_name="paymenthistory",
+            name="rent_status",
+        ),
+        migrations.RemoveField(
+            model_name="paymenthistory",
+            name="rent_updated_at",
+        ),
+        migrations.RemoveField(
+            model_name="paymenthistory",
+            name="waste_paid",
+        ),
+        migrations.RemoveField(
+            model_name="paymenthistory",
+            name="waste_status",
+        ),
+        migrations.RemoveField(
+            model_name="paymenthistory",
+            name="waste_updated_at",
+        ),
+        migrations.RemoveField(
+            model_name="paymenthistory",
+            name="water_paid",
+        ),
+        migrations.RemoveField(
+            model_name="paymenthistory",
+            name="water_status",
+        ),
+        migrations.RemoveField(
+            model_name="paymenthistory",
+            name="water_updated_at",
+        ),
+        migrations.AddField(
+            model_name="house",
+            name="is_active",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name="paymenthistory",
+            name="payment_received_date",
+            field=models.CharField(blank=True, max_length=500, null=True),
+        ),
+        migrations.AddField(
+            model_name="paymenthistory",
+            name="remarks",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="room",
+            name="room_name",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name="tenant",
+            name="email",
+            field=models.EmailField(blank=True, max_length=254, null=True),
+        ),
+        migrations.AddField(
+            model_name="tenant",
+            name="email_verified",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="tenantdocument",
+            name="name",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AlterField(
+            model_name="room",
+            name="room_number",
+            field=models.CharField(max_length=10),
+        ),
+        migrations.AlterField(
+            model_name="tenant",
+            name="move_in_date",
+            field=models.CharField(max_length=40),
+        ),
+        migrations.AlterField(
+            model_name="tenant",
+            name="water_price",
+            field=models.DecimalField(decimal_places=2, default=200.0, max_digits=10),
+        ),
+        migrations.DeleteModel(
+            name="PaymentReceived",
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.25 on 2026-10-19 15:26
+
+from django.db import migrations, models
+from django.db.models import Count
+import room.storage
+
+
+def seed_blob_counts(apps, schema_editor):
+    TenantDocument = apps.get_model("room", "TenantDocument")
+    DocumentBlob = apps.get_model("room", "DocumentBlob")
+    counts = (
+        TenantDocument.objects.exclude(document="")
+        .values_list("document")
+        .annotate(refs=Count("id"))
+        .values_list("document", "refs")
+    )
+    DocumentBlob.objects.bulk_create(
+        [DocumentBlob(name=name, ref_count=refs) for name, refs in counts]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("room", "0023_sync_model_state"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DocumentBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("ref_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="tenantdocument",
+            name="document",
+            field=models.FileField(
+                storage=room.storage.document_storage, upload_to="tenant_documents/"
+            ),
+        ),
+        migrations.RunPython(seed_blob_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.25 on 2026-10-19 15:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("room", "0024_documentblob"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="paymenthistory",
+            index=models.Index(
+                fields=["room", "billing_month"], name="room_bill_room_month_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.25 on 2026-10-19 15:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("room", "0025_paymenthistory_room_month_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="room",
+            index=models.Index(
+                fields=["house", "room_number"], name="room_room_house_number_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.25 on 2026-10-19 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("room", "0026_room_house_number_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="paymenthistory",
+            index=models.Index(
+                condition=models.Q(("status", "Paid"), _negated=True),
+                fields=["room", "billing_month"],
+                name="room_bill_unpaid_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.2.25 on 2026-10-19 15:46
+
+from datetime import date
+
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def seed_open_occupancies(apps, schema_editor):
+    """
+    Open an interval for every current tenant, starting at the move-in date
+    when it is an ISO date and today otherwise.
+    """
+    Tenant = apps.get_model("room", "Tenant")
+    Occupancy = apps.get_model("room", "Occupancy")
+    today = timezone.localdate()
+    rows = []
+    for tenant_id, room_id, move_in_date in Tenant.objects.values_list(
+        "id", "room_id", "move_in_date"
+    ).iterator():
+        try:
+            start = min(date.fromisoformat((move_in_date or "").strip()[:10]), today)
+        except ValueError:
+            start = today
+        rows.append(Occupancy(room_id=room_id, tenant_id=tenant_id, start=start))
+    Occupancy.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("room", "0027_paymenthistory_unpaid_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Occupancy",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("start", models.DateField()),
+                ("end", models.DateField(blank=True, null=True)),
+                (
+                    "room",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occupancies",
+                        to="room.room",
+                    ),
+                ),
+                (
+                    "tenant",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="occupancies",
+                        to="room.tenant",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["room", "start", "end"], name="room_occupancy_span_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(seed_open_occupancies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.25 on 2026-10-19 15:48
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, Max, Q, Sum
+import django.db.models.deletion
+
+
+def seed_room_balances(apps, schema_editor):
+    PaymentHistory = apps.get_model("room", "PaymentHistory")
+    RoomBalance = apps.get_model("room", "RoomBalance")
+    rows = (
+        PaymentHistory.objects.values("room_id")
+        .annotate(
+            balance=Sum(
+                F("total") - F("total_paid"),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            last_paid=Max("updated_at", filter=Q(total_paid__gt=0)),
+        )
+        .order_by()
+    )
+    RoomBalance.objects.bulk_create(
+        [
+            RoomBalance(
+                room_id=row["room_id"],
+                balance=row["balance"] or 0,
+                last_payment_date=row["last_paid"].date() if row["last_paid"] else None,
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("room", "0028_occupancy"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RoomBalance",
+            fields=[
+                (
+                    "room",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="balance",
+                        serialize=False,
+                        to="room.room",
+                    ),
+                ),
+                (
+                    "balance",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                ("last_payment_date", models.DateField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(seed_room_balances, migrations.RunPython.noop),
+    ]
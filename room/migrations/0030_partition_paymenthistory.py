@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def partition_payment_history(apps, schema_editor):
+    # Opt-in, PostgreSQL only; see room/partitioning.py. The conversion can
+    # also be run later with `manage.py partition_payments convert`.
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql" or not settings.PAYMENT_HISTORY_PARTITIONING:
+        return
+    from room.partitioning import convert
+
+    convert(connection, log=print)
+
+
+class Migration(migrations.Migration):
+    # The data is copied in batches, each committed on its own.
+    atomic = False
+
+    dependencies = [
+        ("room", "0029_roombalance"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_payment_history, migrations.RunPython.noop, elidable=True),
+    ]
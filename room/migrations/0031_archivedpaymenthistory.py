@@ -0,0 +1,64 @@
+# Generated by Django 4.2.25 on 2026-10-19 16:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("room", "0030_partition_paymenthistory"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedPaymentHistory",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("billing_month", models.CharField(max_length=50)),
+                ("previous_units", models.IntegerField()),
+                ("current_units", models.IntegerField()),
+                ("electricity", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("water", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("rent", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("waste", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("total", models.DecimalField(decimal_places=2, max_digits=10)),
+                (
+                    "payment_received_date",
+                    models.CharField(blank=True, max_length=500, null=True),
+                ),
+                ("total_paid", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("remarks", models.TextField(blank=True, null=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("Paid", "Paid"),
+                            ("Unpaid", "Unpaid"),
+                            ("Partially Paid", "Partially Paid"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("created_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField()),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "room",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_bills",
+                        to="room.room",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["room", "billing_month"],
+                        name="room_archive_room_month_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 4.2.25 on 2026-10-19 16:22
+
+import re
+from datetime import date
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def received_date(text):
+    for match in re.finditer(r"\d{4}-\d{2}-\d{2}", text or ""):
+        try:
+            return date.fromisoformat(match.group())
+        except ValueError:
+            continue
+    return None
+
+
+def transactions_from_totals(apps, schema_editor):
+    """
+    Give every bill (live or archived) transactions summing to its
+    `total_paid`. The missing amount becomes one transaction dated from the
+    free-text `payment_received_date` when it holds an ISO date, otherwise
+    from the bill's last change; the text itself becomes the reference.
+    """
+    PaymentTransaction = apps.get_model("room", "PaymentTransaction")
+    logged = dict(
+        PaymentTransaction.objects.values("bill_id")
+        .annotate(total=Sum("amount"))
+        .order_by()
+        .values_list("bill_id", "total")
+    )
+    for model_name in ("PaymentHistory", "ArchivedPaymentHistory"):
+        bills = apps.get_model("room", model_name).objects.exclude(total_paid=0)
+        batch = []
+        for bill in bills.values(
+            "id", "room_id", "total_paid", "payment_received_date", "updated_at"
+        ).iterator():
+            missing = bill["total_paid"] - logged.get(bill["id"], Decimal("0"))
+            if not missing:
+                continue
+            batch.append(
+                PaymentTransaction(
+                    bill_id=bill["id"],
+                    room_id=bill["room_id"],
+                    amount=missing,
+                    paid_on=received_date(bill["payment_received_date"])
+                    or bill["updated_at"].date(),
+                    method="other",
+                    reference=bill["payment_received_date"] or "",
+                )
+            )
+            if len(batch) >= 1000:
+                PaymentTransaction.objects.bulk_create(batch)
+                batch = []
+        PaymentTransaction.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("room", "0033_paymenttransaction"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="paymenttransaction",
+            name="method",
+            field=models.CharField(
+                choices=[
+                    ("cash", "Cash"),
+                    ("bank", "Bank transfer"),
+                    ("wallet", "Digital wallet"),
+                    ("cheque", "Cheque"),
+                    ("other", "Other"),
+                ],
+                default="cash",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="paymenttransaction",
+            name="reference",
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.AddIndex(
+            model_name="paymenttransaction",
+            index=models.Index(fields=["paid_on"], name="room_txn_paid_on_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="paymenttransaction",
+            index=models.Index(fields=["bill", "paid_on"], name="room_txn_bill_idx"),
+        ),
+        migrations.RunPython(transactions_from_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.25 on 2026-10-19 16:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("room", "0034_paymenttransaction_method_reference"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="paymenthistory",
+            name="version",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="tenant",
+            name="version",
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
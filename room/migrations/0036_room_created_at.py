@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("room", "0035_version"),
+    ]
+
+    operations = [
+        # Added without a default first, so existing rooms keep a null
+        # (unknown) creation time instead of the time of the migration.
+        migrations.AddField(
+            model_name="room",
+            name="created_at",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name="room",
+            name="created_at",
+            field=models.DateTimeField(auto_now_add=True, null=True),
+        ),
+    ]
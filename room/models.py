@@ -1,8 +1,13 @@
+import re
+from datetime import date
+
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.utils import timezone
-from django.db.models import Sum
+from django.db.models import F, Sum
+
+from .storage import document_storage
 
 
 class House(models.Model):
@@ -19,6 +24,13 @@ class Room(models.Model):
     room_name = models.CharField(max_length=100,blank=True, null=True)
     room_number = models.CharField(max_length=10)
     is_occupied = models.BooleanField(default=False)
+    # Null for rooms that predate the column.
+    created_at = models.DateTimeField(auto_now_add=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["house", "room_number"], name="room_room_house_number_idx"),
+        ]
 
     def __str__(self):
         if self.house:
@@ -26,7 +38,64 @@ class Room(models.Model):
         return self.room_number
 
 
-class Tenant(models.Model):
+class VersionConflict(Exception):
+    """
+    The row was saved by someone else since this instance was read.
+    """
+
+
+class VersionedModel(models.Model):
+    """
+    Optimistic concurrency control through a `version` column.
+
+    Saving an existing row is an `UPDATE ... WHERE version = n` that also
+    sets `version = n + 1`, where n is the version the instance was read
+    (or told, e.g. by a form) with. If someone else saved the row in
+    between, nothing matches and `VersionConflict` is raised instead of
+    overwriting their change. No lock is held while the user edits.
+
+    Queryset `update()`s bypass the check, so code that changes these rows
+    that way must bump `version` itself.
+    """
+
+    version = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "version"}
+        self._expected_version = self.version
+        self.version += 1
+        try:
+            # A savepoint, so a conflict leaves an enclosing transaction usable.
+            with transaction.atomic():
+                return super().save(*args, **kwargs)
+        except Exception:
+            self.version = self._expected_version
+            raise
+        finally:
+            del self._expected_version
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        expected = getattr(self, "_expected_version", None)
+        if expected is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        if super()._do_update(
+            base_qs.filter(version=expected), using, pk_val, values, update_fields, forced_update
+        ):
+            return True
+        if base_qs.filter(pk=pk_val).exists():
+            raise VersionConflict(
+                f"{self._meta.verbose_name.capitalize()} {pk_val} was changed by someone else."
+            )
+        return False
+
+
+class Tenant(VersionedModel):
     room = models.OneToOneField(Room, on_delete=models.CASCADE, related_name="tenant")
     name = models.CharField(max_length=100)
     contact = models.CharField(max_length=15)
@@ -45,16 +114,124 @@ class Tenant(models.Model):
         return self.name
 
 
+def parse_move_in_date(value):
+    """
+    `Tenant.move_in_date` is free text; use it when it is an ISO date.
+    """
+    try:
+        return date.fromisoformat((value or "").strip()[:10])
+    except ValueError:
+        return None
+
+
+def parse_received_date(value):
+    """
+    The first ISO date in a free-text `payment_received_date`, if any.
+    """
+    for match in re.finditer(r"\d{4}-\d{2}-\d{2}", value or ""):
+        try:
+            return date.fromisoformat(match.group())
+        except ValueError:
+            continue
+    return None
+
+
+class Occupancy(models.Model):
+    """
+    One stay of a tenant in a room, from `start` up to (not including) `end`.
+
+    `end` is null while the tenant is still there. Rows are opened and
+    closed by the Tenant signals, so `Room.is_occupied` remains the current
+    state and this table is its history.
+    """
+
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="occupancies")
+    tenant = models.ForeignKey(
+        Tenant, on_delete=models.SET_NULL, null=True, blank=True, related_name="occupancies"
+    )
+    start = models.DateField()
+    end = models.DateField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["room", "start", "end"], name="room_occupancy_span_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.room} {self.start} - {self.end or 'now'}"
+
+    @classmethod
+    def open(cls, tenant, start=None):
+        today = timezone.localdate()
+        start = min(start or parse_move_in_date(tenant.move_in_date) or today, today)
+        # A move-in dated before the previous tenant left starts the stay at
+        # that move-out, so the room's stays never overlap.
+        previous_end = cls.objects.filter(room_id=tenant.room_id).aggregate(
+            end=models.Max("end")
+        )["end"]
+        if previous_end and previous_end > start:
+            start = previous_end
+        return cls.objects.create(room_id=tenant.room_id, tenant=tenant, start=start)
+
+    @classmethod
+    def close(cls, room_id, end=None):
+        cls.objects.filter(room_id=room_id, end__isnull=True).update(
+            end=end or timezone.localdate()
+        )
+
+
 class TenantDocument(models.Model):
     tenant = models.ForeignKey(
         Tenant, on_delete=models.CASCADE, related_name="documents"
     )
-    document = models.FileField(upload_to="tenant_documents/")
+    document = models.FileField(upload_to="tenant_documents/", storage=document_storage)
     name = models.CharField(max_length=100, blank=True, null=True)
 
     def __str__(self):
         return f"Document for {self.tenant.name}"
 
+
+class DocumentBlob(models.Model):
+    """
+    Reference count for a stored document file.
+
+    Files under `tenant_documents/` are content-addressed, so several
+    `TenantDocument` rows can share one blob. The sweeper removes blobs
+    whose count has dropped to zero.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+    @classmethod
+    def acquire(cls, name):
+        if not name:
+            return
+        cls.objects.get_or_create(name=name)
+        cls.objects.filter(name=name).update(
+            ref_count=F("ref_count") + 1, updated_at=timezone.now()
+        )
+
+    @classmethod
+    def touch(cls, name):
+        """
+        Mark the blob as just used, so sweeps within the grace period keep it.
+        """
+        cls.objects.filter(name=name).update(updated_at=timezone.now())
+
+    @classmethod
+    def release(cls, name):
+        if not name:
+            return
+        cls.objects.filter(name=name, ref_count__gt=0).update(
+            ref_count=F("ref_count") - 1, updated_at=timezone.now()
+        )
+
 from django.utils import timezone
 
 def current_billing_month():
@@ -63,7 +240,7 @@ def current_billing_month():
 def current_date_str():
     return timezone.now().strftime("%Y-%m-%d")
 
-class PaymentHistory(models.Model):
+class PaymentHistory(VersionedModel):
     PAYMENT_STATUS_CHOICES = [
         ("Paid", "Paid"),
         ("Unpaid", "Unpaid"),
@@ -93,7 +270,8 @@ class PaymentHistory(models.Model):
     
 
     total = models.DecimalField(max_digits=10, decimal_places=2, editable=False)
-    # Records summary of payments received (e.g. JSON/string with amounts, dates)
+    # Free-text payment notes from before PaymentTransaction; still accepted
+    # and copied into the reference of the transaction logged for an edit.
     payment_received_date = models.CharField(max_length=500, null=True, blank=True)
     total_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     remarks = models.TextField(null=True, blank=True)
@@ -104,6 +282,16 @@ class PaymentHistory(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)  # updates automatically
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["room", "billing_month"], name="room_bill_room_month_idx"),
+            models.Index(
+                fields=["room", "billing_month"],
+                condition=~models.Q(status="Paid"),
+                name="room_bill_unpaid_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"Payment for {self.room} - {self.billing_month}"
 
@@ -111,32 +299,50 @@ class PaymentHistory(models.Model):
         if self.previous_units >= self.current_units:
             raise ValidationError("Previous unit must be less than current unit.")
 
+    @staticmethod
+    def lock_room(room_id):
+        """
+        Hold the room's row lock until the end of the current transaction.
+
+        New bills read the room's latest reading and insert after it, so
+        they are created one at a time per room; other rooms are not held
+        up. SQLite ignores FOR UPDATE, but its transactions already take
+        the write lock when they begin (see `core.sqlite3`).
+        """
+        list(Room.objects.select_for_update().filter(pk=room_id).values_list("pk", flat=True))
+
+    @classmethod
+    def latest_for_room(cls, room_id):
+        return cls.objects.filter(room_id=room_id).order_by("-billing_month", "-id").first()
+
     def save(self, *args, **kwargs):
-        if not self.pk:  # if the instance is new
-            tenant = self.room.tenant
-            last_payment = (
-                PaymentHistory.objects.filter(room=self.room).order_by("-billing_month").first()
-            )
-            if last_payment:
-                self.previous_units = last_payment.current_units
+        # The balance signals run inside this block, so the bill and the
+        # room's running balance are written together.
+        with transaction.atomic():
+            if not self.pk:  # if the instance is new
+                self.lock_room(self.room_id)
+                tenant = self.room.tenant
+                last_payment = PaymentHistory.latest_for_room(self.room_id)
+                if last_payment:
+                    self.previous_units = last_payment.current_units
+                else:
+                    self.previous_units = tenant.initial_unit
+                self.electricity = (
+                    self.current_units - self.previous_units
+                ) * tenant.electricity_price_per_unit
+                self.water = tenant.water_price
+                self.rent = tenant.rent_price
+                self.waste = tenant.waste_price
             else:
-                self.previous_units = tenant.initial_unit
-            self.electricity = (
-                self.current_units - self.previous_units
-            ) * tenant.electricity_price_per_unit
-            self.water = tenant.water_price
-            self.rent = tenant.rent_price
-            self.waste = tenant.waste_price
-        else:
-            # on update, don't attempt to track per-item paid fields (removed)
-            pass
-
-        # Auto calculate total
-        # Auto calculate total; `total_paid` is set from `payment_received_data` or provided directly
-        self.total = self.electricity + self.water + self.rent + self.waste
-        self.status = self._get_status(self.total, self.total_paid)
-
-        super().save(*args, **kwargs)
+                # on update, don't attempt to track per-item paid fields (removed)
+                pass
+
+            # Auto calculate total
+            # Auto calculate total; `total_paid` is set from `payment_received_data` or provided directly
+            self.total = self.electricity + self.water + self.rent + self.waste
+            self.status = self._get_status(self.total, self.total_paid)
+
+            super().save(*args, **kwargs)
 
     def _get_status(self, amount, paid):
         if paid == 0:
@@ -144,3 +350,177 @@ class PaymentHistory(models.Model):
         elif paid < amount:
             return "Partially Paid"
         return "Paid"
+
+
+class PaymentTransaction(models.Model):
+    """
+    One payment received against a bill.
+
+    `PaymentHistory.total_paid` (and `status`) is the running sum of a
+    bill's transactions: `room.payments.record_payment` appends a row and
+    adds to it in one go, and any other change to `total_paid` is logged
+    as a correcting row by the PaymentHistory signals.
+
+    The bill reference has no database constraint: archived bills keep
+    their id in ArchivedPaymentHistory, so their transactions stay valid
+    after the bill moves, and a partitioned PaymentHistory (whose primary
+    key includes `billing_month`) could not be referenced anyway. The room
+    is stored too, so transactions can be found without the bill.
+    """
+
+    bill = models.ForeignKey(
+        PaymentHistory,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name="transactions",
+    )
+    METHOD_CHOICES = [
+        ("cash", "Cash"),
+        ("bank", "Bank transfer"),
+        ("wallet", "Digital wallet"),
+        ("cheque", "Cheque"),
+        ("other", "Other"),
+    ]
+
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="payment_transactions")
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    paid_on = models.DateField(default=timezone.localdate)
+    method = models.CharField(max_length=10, choices=METHOD_CHOICES, default="cash")
+    # Receipt or transfer number; holds the old free-text payment notes for
+    # migrated rows.
+    reference = models.CharField(max_length=500, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["paid_on"], name="room_txn_paid_on_idx"),
+            models.Index(fields=["bill", "paid_on"], name="room_txn_bill_idx"),
+        ]
+
+    def __str__(self):
+        return f"Rs. {self.amount} for bill {self.bill_id} on {self.paid_on}"
+
+
+class ArchivedPaymentHistory(models.Model):
+    """
+    A settled bill moved out of PaymentHistory by `archive_bills`.
+
+    Rows keep their original id and every column, so `room.archive.bill_history()`
+    can read live and archived bills as one table. Only bills paid exactly
+    in full are archived, so they never count towards a room's balance.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="archived_bills")
+    billing_month = models.CharField(max_length=50)
+    previous_units = models.IntegerField()
+    current_units = models.IntegerField()
+    electricity = models.DecimalField(max_digits=10, decimal_places=2)
+    water = models.DecimalField(max_digits=10, decimal_places=2)
+    rent = models.DecimalField(max_digits=10, decimal_places=2)
+    waste = models.DecimalField(max_digits=10, decimal_places=2)
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_received_date = models.CharField(max_length=500, null=True, blank=True)
+    total_paid = models.DecimalField(max_digits=10, decimal_places=2)
+    remarks = models.TextField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=PaymentHistory.PAYMENT_STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["room", "billing_month"], name="room_archive_room_month_idx"),
+        ]
+
+    def __str__(self):
+        return f"Archived payment for {self.room} - {self.billing_month}"
+
+
+class RoomBalance(models.Model):
+    """
+    Running outstanding amount (`total - total_paid` over all bills) of a room.
+
+    Kept in step by the PaymentHistory signals inside the bill's own
+    transaction, so reading a balance is a single-row lookup. The room's
+    tenant owes the room's balance. `check_balances` recomputes it from the
+    bills and reports any drift.
+    """
+
+    room = models.OneToOneField(
+        Room, on_delete=models.CASCADE, primary_key=True, related_name="balance"
+    )
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    last_payment_date = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.room}: {self.balance}"
+
+    @classmethod
+    def apply(cls, room_id, amount, paid_on=None):
+        """
+        Add `amount` (negative to reduce) to the room's balance.
+        """
+        if not amount and not paid_on:
+            return
+        changes = {"balance": F("balance") + amount, "updated_at": timezone.now()}
+        if paid_on:
+            changes["last_payment_date"] = paid_on
+        cls.objects.get_or_create(room_id=room_id)
+        cls.objects.filter(room_id=room_id).update(**changes)
+
+    @classmethod
+    def for_room(cls, room_id):
+        return cls.objects.filter(room_id=room_id).first() or cls(room_id=room_id)
+
+
+class DeletionJob(models.Model):
+    """
+    Progress of a house or room being deleted in the background.
+
+    `object_id` and `room_ids` are plain values rather than foreign keys,
+    because the job outlives the rows it deletes. See `room.deletion`.
+    """
+
+    KIND_CHOICES = [
+        ("house", "House"),
+        ("room", "Room"),
+    ]
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="deletion_jobs"
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    label = models.CharField(max_length=200, blank=True)
+    room_ids = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="queued")
+    total = models.PositiveIntegerField(null=True, blank=True)
+    deleted = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "updated_at"], name="room_deletion_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"Delete {self.kind} {self.label or self.object_id} ({self.status})"
+
+    @property
+    def progress(self):
+        if self.status == "done":
+            return 100
+        if not self.total:
+            return 0
+        return min(99, self.deleted * 100 // self.total)
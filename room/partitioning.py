@@ -0,0 +1,311 @@
+"""
+Optional yearly range partitioning of the PaymentHistory table (PostgreSQL).
+
+The table is partitioned by RANGE on `billing_month` with one partition per
+calendar year (`room_paymenthistory_y2024` holds '2024-01' up to, but not
+including, '2025-01'), plus a default partition for months that are not in
+`YYYY-MM` form. Filters on `billing_month` (month ranges in reports, the
+API's start/end) are pruned to the matching partitions by the planner.
+
+Postgres requires the partition key in every unique constraint, so the
+primary key becomes `(id, billing_month)`; Django still treats `id` as the
+primary key. Partitions for coming years should exist before bills for them
+arrive (`partition_payments ensure`, run from cron). Bills that arrive
+earlier (e.g. a mistyped year) land in the default partition, and are moved
+into their year's partition when it is created.
+
+`convert()` turns the existing table into a partitioned one:
+
+1. an empty partitioned copy is created next to the live table;
+2. rows are copied in id batches, each in its own short transaction, while
+   the application keeps running;
+3. the copy's indexes are built;
+4. in one transaction that only blocks writes, rows changed or deleted
+   since the copy started are synced, and the two tables swap names.
+
+The old table is kept as `room_paymenthistory_unpartitioned` and can be
+dropped once the result has been checked.
+"""
+
+import re
+
+from django.db import transaction
+from django.utils import timezone
+
+TABLE = "room_paymenthistory"
+STAGING_TABLE = f"{TABLE}_partitioned"
+OLD_TABLE = f"{TABLE}_unpartitioned"
+DEFAULT_PARTITION = f"{TABLE}_default"
+COPY_BATCH_SIZE = 50_000
+YEARS_AHEAD = 2
+# How long DDL may wait for a lock before giving up, so a detach never
+# queues up application queries behind it.
+LOCK_TIMEOUT = "5s"
+
+MONTH_PATTERN = r"^[0-9]{4}-[0-9]{2}$"
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def partition_name(year):
+    return f"{TABLE}_y{year:04d}"
+
+
+def year_bounds(year):
+    return f"{year:04d}-01", f"{year + 1:04d}-01"
+
+
+def _require_postgres(connection):
+    if connection.vendor != "postgresql":
+        raise PartitioningError("PaymentHistory partitioning needs PostgreSQL.")
+
+
+def _quote(connection, name):
+    return connection.ops.quote_name(name)
+
+
+def is_partitioned(connection, table=TABLE):
+    _require_postgres(connection)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [table])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def partitions(connection):
+    """
+    `(name, bounds, estimated_rows)` for every partition of the table.
+    """
+    _require_postgres(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid), child.reltuples
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            ORDER BY child.relname
+            """,
+            [TABLE],
+        )
+        return cursor.fetchall()
+
+
+def create_year_partition(connection, year, parent=TABLE):
+    """
+    Create a year's partition unless it exists; returns how many bills were
+    moved into it from the default partition.
+
+    Postgres refuses to create a partition while the default partition holds
+    rows in its range, so those rows are taken out first and put back
+    through the parent, all in one transaction. The default partition is
+    locked against writes meanwhile, so no bill can slip in between.
+    """
+    qn = lambda name: _quote(connection, name)  # noqa: E731
+    name = partition_name(year)
+    start, end = year_bounds(year)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT to_regclass(%s) IS NOT NULL, to_regclass(%s) IS NOT NULL",
+            [name, DEFAULT_PARTITION],
+        )
+        exists, has_default = cursor.fetchone()
+        if exists:
+            return 0
+        moved = 0
+        if has_default and parent == TABLE:
+            cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+            cursor.execute(f"LOCK TABLE {qn(DEFAULT_PARTITION)} IN EXCLUSIVE MODE")
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE early_bills (LIKE {qn(TABLE)}) ON COMMIT DROP"
+            )
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {qn(DEFAULT_PARTITION)} "
+                f"WHERE billing_month >= %s AND billing_month < %s RETURNING *) "
+                f"INSERT INTO early_bills SELECT * FROM moved",
+                [start, end],
+            )
+            moved = cursor.rowcount
+        cursor.execute(
+            f"CREATE TABLE {qn(name)} PARTITION OF {qn(parent)} FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+        if moved:
+            cursor.execute(f"INSERT INTO {qn(parent)} SELECT * FROM early_bills")
+        if has_default and parent == TABLE:
+            # ON COMMIT only fires with the outermost transaction.
+            cursor.execute("DROP TABLE early_bills")
+    return moved
+
+
+def ensure_partitions(
+    connection, years_ahead=YEARS_AHEAD, first_year=None, parent=TABLE, log=None
+):
+    """
+    Create the partitions from `first_year` (default: this year) up to
+    `years_ahead` years from now. Existing partitions are left alone; bills
+    waiting in the default partition move into the new ones.
+    """
+    _require_postgres(connection)
+    log = log or (lambda message: None)
+    this_year = timezone.localdate().year
+    years = range(first_year or this_year, this_year + years_ahead + 1)
+    for year in years:
+        moved = create_year_partition(connection, year, parent=parent)
+        if moved:
+            log(f"Moved {moved} bill(s) for {year} out of the default partition.")
+    return list(years)
+
+
+def detach_partition(connection, year):
+    """
+    Detach a year's partition so it can be dumped and dropped.
+
+    Detaching only changes the catalog; `lock_timeout` keeps it from
+    waiting behind (and in front of) running queries for long. The table
+    stays in the database under its partition name.
+    """
+    _require_postgres(connection)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+        cursor.execute(
+            f"ALTER TABLE {_quote(connection, TABLE)} "
+            f"DETACH PARTITION {_quote(connection, partition_name(year))}"
+        )
+
+
+def _index_definitions(connection, table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT indexname, indexdef FROM pg_indexes
+            WHERE tablename = %s AND indexname NOT IN (
+                SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s)
+            )
+            """,
+            [table, table],
+        )
+        return cursor.fetchall()
+
+
+def convert(connection, batch_size=COPY_BATCH_SIZE, years_ahead=YEARS_AHEAD, log=None):
+    """
+    Partition the existing table (see the module docstring). Safe to re-run:
+    a table that is already partitioned is left alone.
+    """
+    _require_postgres(connection)
+    log = log or (lambda message: None)
+    if is_partitioned(connection):
+        log("PaymentHistory is already partitioned.")
+        return False
+    if connection.in_atomic_block:
+        raise PartitioningError("Run the conversion outside a transaction.")
+
+    qn = lambda name: _quote(connection, name)  # noqa: E731
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT conname FROM pg_constraint WHERE confrelid = to_regclass(%s)", [TABLE])
+        referencing = [row[0] for row in cursor.fetchall()]
+        if referencing:
+            raise PartitioningError(
+                "Foreign keys reference PaymentHistory (%s); Postgres cannot point "
+                "them at a table whose primary key includes billing_month." % ", ".join(referencing)
+            )
+
+        # Rows saved after this moment are re-synced at the swap. The margin
+        # covers app servers whose clocks run behind the database's.
+        cursor.execute("SELECT now() - interval '5 minutes'")
+        copy_started = cursor.fetchone()[0]
+        cursor.execute(
+            f"SELECT (SELECT min(billing_month) FROM {qn(TABLE)} WHERE billing_month ~ %s), "
+            f"(SELECT coalesce(max(id), 0) FROM {qn(TABLE)})",
+            [MONTH_PATTERN],
+        )
+        first_month, last_id = cursor.fetchone()
+
+        cursor.execute(f"DROP TABLE IF EXISTS {qn(STAGING_TABLE)} CASCADE")
+        cursor.execute(
+            f"CREATE TABLE {qn(STAGING_TABLE)} (LIKE {qn(TABLE)} "
+            f"INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (billing_month)"
+        )
+        cursor.execute(f"ALTER TABLE {qn(STAGING_TABLE)} ADD PRIMARY KEY (id, billing_month)")
+        cursor.execute(
+            f"ALTER TABLE {qn(STAGING_TABLE)} ADD CONSTRAINT {qn(TABLE + '_room_id_part_fk')} "
+            f"FOREIGN KEY (room_id) REFERENCES {qn('room_room')} (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+    first_year = int(first_month[:4]) if first_month else None
+    years = ensure_partitions(
+        connection, years_ahead=years_ahead, first_year=first_year, parent=STAGING_TABLE
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE {qn(DEFAULT_PARTITION)} PARTITION OF {qn(STAGING_TABLE)} DEFAULT"
+        )
+    log(f"Created partitions for {years[0]}-{years[-1]} and a default partition.")
+
+    copied = 0
+    for low in range(0, last_id, batch_size):
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {qn(STAGING_TABLE)} SELECT * FROM {qn(TABLE)} "
+                f"WHERE id > %s AND id <= %s",
+                [low, low + batch_size],
+            )
+            copied += cursor.rowcount
+        log(f"Copied {copied} row(s) (ids up to {min(low + batch_size, last_id)}).")
+
+    # Build the indexes under temporary names; they take over the real
+    # names at the swap.
+    indexes = _index_definitions(connection, TABLE)
+    with connection.cursor() as cursor:
+        for name, definition in indexes:
+            definition = re.sub(
+                rf"^CREATE (UNIQUE )?INDEX {re.escape(name)} ON (\S+\.)?{TABLE} ",
+                lambda m: f"CREATE {m.group(1) or ''}INDEX {qn(name + '_p')} ON {qn(STAGING_TABLE)} ",
+                definition,
+            )
+            cursor.execute(definition)
+    log(f"Built {len(indexes)} index(es).")
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        # Reads carry on; writes wait for the few statements below.
+        cursor.execute(f"LOCK TABLE {qn(TABLE)} IN SHARE ROW EXCLUSIVE MODE")
+        cursor.execute(
+            f"DELETE FROM {qn(STAGING_TABLE)} WHERE id IN "
+            f"(SELECT id FROM {qn(TABLE)} WHERE updated_at >= %s)",
+            [copy_started],
+        )
+        cursor.execute(
+            f"DELETE FROM {qn(STAGING_TABLE)} staged WHERE NOT EXISTS "
+            f"(SELECT 1 FROM {qn(TABLE)} live WHERE live.id = staged.id)"
+        )
+        cursor.execute(
+            f"INSERT INTO {qn(STAGING_TABLE)} SELECT * FROM {qn(TABLE)} live "
+            f"WHERE (live.updated_at >= %s OR live.id > %s) AND NOT EXISTS "
+            f"(SELECT 1 FROM {qn(STAGING_TABLE)} staged WHERE staged.id = live.id)",
+            [copy_started, last_id],
+        )
+        cursor.execute(
+            "SELECT pg_get_serial_sequence(%s, 'id'), pg_get_serial_sequence(%s, 'id')",
+            [TABLE, STAGING_TABLE],
+        )
+        live_sequence, staged_sequence = cursor.fetchone()
+        if staged_sequence:
+            # An identity column: the copy got its own sequence.
+            cursor.execute(
+                f"SELECT setval(%s, (SELECT coalesce(max(id), 1) FROM {qn(STAGING_TABLE)}))",
+                [staged_sequence],
+            )
+        elif live_sequence:
+            # A serial column: the copied default still uses the old table's
+            # sequence, which must outlive that table.
+            cursor.execute(f"ALTER SEQUENCE {live_sequence} OWNED BY {qn(STAGING_TABLE)}.id")
+        cursor.execute(f"ALTER TABLE {qn(TABLE)} RENAME TO {qn(OLD_TABLE)}")
+        cursor.execute(f"ALTER TABLE {qn(STAGING_TABLE)} RENAME TO {qn(TABLE)}")
+        for name, _ in indexes:
+            cursor.execute(f"ALTER INDEX {qn(name)} RENAME TO {qn(name + '_old')}")
+            cursor.execute(f"ALTER INDEX {qn(name + '_p')} RENAME TO {qn(name)}")
+    log(f"Swapped in the partitioned table; the old one is kept as {OLD_TABLE}.")
+    return True
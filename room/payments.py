@@ -0,0 +1,72 @@
+"""
+Recording payments against bills.
+
+`record_payment()` changes the bill with one UPDATE that adds to
+`total_paid` and recomputes `status` from the row's own values, so
+collectors recording cash for the same bill at the same time never
+overwrite each other, and the bill is never loaded or saved as a whole.
+Because the UPDATE bypasses the PaymentHistory signals, the
+room balance and the owner's payment version are maintained here.
+"""
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.lookups import Exact, LessThan
+from django.utils import timezone
+
+from .cache import bump_version_on_commit
+from .models import PaymentHistory, PaymentTransaction, RoomBalance
+
+
+def paid_status(total_paid):
+    """
+    `PaymentHistory._get_status()` as an expression over the bill's row.
+    """
+    return Case(
+        When(Exact(total_paid, 0), then=Value("Unpaid")),
+        When(LessThan(total_paid, F("total")), then=Value("Partially Paid")),
+        default=Value("Paid"),
+    )
+
+
+def record_payment(bill_id, amount, paid_on=None, method="cash", reference="", owner=None):
+    """
+    Add `amount` to a bill and append a PaymentTransaction for it.
+
+    Returns the transaction, with the bill's new `total_paid` and `status`
+    set on it, or None when the bill does not exist (or is not `owner`'s).
+    """
+    paid_on = paid_on or timezone.localdate()
+    bills = PaymentHistory.objects.filter(pk=bill_id)
+    if owner is not None:
+        bills = bills.filter(room__house__owner=owner)
+
+    total_paid = F("total_paid") + amount
+    with transaction.atomic():
+        # Every SET expression sees the row as it was before the UPDATE, so
+        # the status is worked out from the new total here as well.
+        updated = bills.update(
+            total_paid=total_paid,
+            status=paid_status(total_paid),
+            version=F("version") + 1,
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            return None
+        bill = PaymentHistory.objects.filter(pk=bill_id).values(
+            "room_id", "room__house__owner_id", "total_paid", "status"
+        ).get()
+        payment = PaymentTransaction.objects.create(
+            bill_id=bill_id,
+            room_id=bill["room_id"],
+            amount=amount,
+            paid_on=paid_on,
+            method=method,
+            reference=reference,
+        )
+        RoomBalance.apply(bill["room_id"], -amount, paid_on=paid_on)
+
+    bump_version_on_commit(bill["room__house__owner_id"], "payment")
+    payment.total_paid = bill["total_paid"]
+    payment.status = bill["status"]
+    return payment
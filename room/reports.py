@@ -0,0 +1,417 @@
+import re
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import (
+    Count,
+    DecimalField,
+    DurationField,
+    F,
+    Func,
+    Min,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    Window,
+)
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+
+from .cache import versioned_key
+from .models import (
+    ArchivedPaymentHistory,
+    House,
+    Occupancy,
+    PaymentHistory,
+    PaymentTransaction,
+    Room,
+)
+
+MONTH_RE = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+REPORT_CACHE_TIMEOUT = 15 * 60
+AGING_BUCKETS = ("current", "days_30", "days_60", "days_90")
+
+
+class WindowSum(Func):
+    """
+    `SUM(...)` usable over an aggregate inside `OVER (...)`.
+
+    Django's `Sum` refuses to wrap another aggregate, which is exactly what a
+    per-partition total of grouped rows needs.
+    """
+
+    function = "SUM"
+    window_compatible = True
+
+
+def shift_month(month, delta):
+    year, mon = (int(part) for part in month.split("-"))
+    index = year * 12 + (mon - 1) + delta
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def parse_month_range(params, default_months=12):
+    """
+    Read `start`/`end` (YYYY-MM) from a query dict, defaulting to the last year.
+    """
+    end = params.get("end") or timezone.now().strftime("%Y-%m")
+    start = params.get("start") or shift_month(end, -(default_months - 1))
+    for value in (start, end):
+        if not MONTH_RE.match(value):
+            raise ValueError(f"Invalid month '{value}'. Use YYYY-MM.")
+    if start > end:
+        raise ValueError("Start month must not be after end month.")
+    return start, end
+
+
+def parse_date_range(params, default_days=365):
+    """
+    Read `start`/`end` (YYYY-MM-DD, both inclusive) from a query dict,
+    defaulting to the last `default_days` days.
+    """
+    try:
+        end = date.fromisoformat(params["end"]) if params.get("end") else timezone.localdate()
+        start = (
+            date.fromisoformat(params["start"])
+            if params.get("start")
+            else end - timedelta(days=default_days - 1)
+        )
+    except ValueError:
+        raise ValueError("Dates must be YYYY-MM-DD.")
+    if start > end:
+        raise ValueError("Start date must not be after end date.")
+    return start, end
+
+
+def _report_key(owner_id, resources, name, *parts):
+    return versioned_key(owner_id, "reports", resources, name, *parts)
+
+
+def revenue_report(owner, start, end):
+    """
+    Billed, collected and outstanding totals per month and house.
+
+    Everything comes from one grouped query over `PaymentHistory` and one
+    over the archive; the month and house subtotals are folded from their
+    rows in Python.
+    """
+    key = _report_key(owner.pk, ("house", "room", "payment"), "revenue", start, end)
+    report = cache.get(key)
+    if report is not None:
+        return report
+
+    money = DecimalField(max_digits=14, decimal_places=2)
+    # Live and archived bills are grouped alike and merged per month/house.
+    grouped = {}
+    for bills in (PaymentHistory.objects, ArchivedPaymentHistory.objects):
+        rows = (
+            bills.filter(
+                room__house__owner=owner,
+                billing_month__gte=start,
+                billing_month__lte=end,
+            )
+            .values("billing_month", "room__house_id", "room__house__name")
+            .annotate(
+                bills=Count("id"),
+                billed=Sum("total", output_field=money),
+                collected=Sum("total_paid", output_field=money),
+                outstanding=Sum(F("total") - F("total_paid"), output_field=money),
+            )
+            .order_by()
+        )
+        for row in rows:
+            item = grouped.setdefault(
+                (row["billing_month"], row["room__house_id"]),
+                {
+                    "month": row["billing_month"],
+                    "house_id": row["room__house_id"],
+                    "house": row["room__house__name"],
+                    **_empty_totals(),
+                },
+            )
+            for field in ("bills", "billed", "collected", "outstanding"):
+                item[field] += row[field] or 0
+
+    report_rows = []
+    months = {}
+    houses = {}
+    totals = _empty_totals()
+    for item in sorted(grouped.values(), key=lambda item: (item["month"], item["house"])):
+        report_rows.append(item)
+        month = months.setdefault(item["month"], {"month": item["month"], **_empty_totals()})
+        house = houses.setdefault(
+            item["house_id"],
+            {"house_id": item["house_id"], "house": item["house"], **_empty_totals()},
+        )
+        for bucket in (month, house, totals):
+            for field in ("bills", "billed", "collected", "outstanding"):
+                bucket[field] += item[field]
+
+    report = {
+        "start": start,
+        "end": end,
+        "rows": report_rows,
+        "months": list(months.values()),
+        "houses": sorted(houses.values(), key=lambda house: house["house"]),
+        "totals": totals,
+    }
+    cache.set(key, report, REPORT_CACHE_TIMEOUT)
+    return report
+
+
+def _empty_totals():
+    return {
+        "bills": 0,
+        "billed": Decimal("0"),
+        "collected": Decimal("0"),
+        "outstanding": Decimal("0"),
+    }
+
+
+def aging_cutoffs(today=None):
+    """
+    Billing months at which a bill turns 30, 60 and 90 days old.
+
+    A bill falls due on the first day of its billing month, and that day is
+    on or before `today - n days` exactly when the month is on or before the
+    month containing that date, so the buckets are plain string comparisons
+    on `billing_month`.
+    """
+    today = today or timezone.localdate()
+    return tuple((today - timedelta(days=days)).strftime("%Y-%m") for days in (30, 60, 90))
+
+
+def arrears_aging(owner, today=None):
+    """
+    Outstanding `total - total_paid` per room/tenant bucketed by bill age.
+
+    One grouped query over unpaid bills: the buckets are conditional sums and
+    the house subtotals are window sums over the grouped rows, so each row
+    arrives with its house totals attached.
+
+    Index plan: the query is driven by the partial index
+    `room_bill_unpaid_idx` on `(room, billing_month) WHERE status <> 'Paid'`,
+    which only holds open bills and so stays small as paid history grows;
+    rooms are reached through `room_room(house_id)` and houses through
+    `room_house(owner_id)`.
+    """
+    today = today or timezone.localdate()
+    key = _report_key(
+        owner.pk, ("house", "room", "tenant", "payment"), "aging", today.isoformat()
+    )
+    report = cache.get(key)
+    if report is not None:
+        return report
+
+    d30, d60, d90 = aging_cutoffs(today)
+    money = DecimalField(max_digits=14, decimal_places=2)
+    outstanding = F("total") - F("total_paid")
+    bucket_filters = {
+        "current": Q(billing_month__gt=d30),
+        "days_30": Q(billing_month__gt=d60, billing_month__lte=d30),
+        "days_60": Q(billing_month__gt=d90, billing_month__lte=d60),
+        "days_90": Q(billing_month__lte=d90),
+    }
+    aggregates = {
+        name: Sum(outstanding, filter=condition, default=0, output_field=money)
+        for name, condition in bucket_filters.items()
+    }
+    aggregates["outstanding"] = Sum(outstanding, output_field=money)
+    house = [F("room__house_id")]
+    windows = {
+        f"house_{name}": Window(WindowSum(F(name), output_field=money), partition_by=house)
+        for name in (*AGING_BUCKETS, "outstanding")
+    }
+
+    rows = (
+        PaymentHistory.objects.filter(room__house__owner=owner, total__gt=F("total_paid"))
+        .exclude(status="Paid")
+        .values(
+            "room_id",
+            "room__room_number",
+            "room__tenant__id",
+            "room__tenant__name",
+            "room__house_id",
+            "room__house__name",
+        )
+        .annotate(bills=Count("id"), oldest_month=Min("billing_month"), **aggregates)
+        .annotate(**windows)
+        .order_by("room__house__name", "room__house_id", "-outstanding")
+    )
+
+    tenants = []
+    houses = {}
+    totals = {name: Decimal("0") for name in (*AGING_BUCKETS, "outstanding")}
+    for row in rows:
+        tenants.append(
+            {
+                "room_id": row["room_id"],
+                "room_number": row["room__room_number"],
+                "tenant_id": row["room__tenant__id"],
+                "tenant": row["room__tenant__name"],
+                "house_id": row["room__house_id"],
+                "house": row["room__house__name"],
+                "bills": row["bills"],
+                "oldest_month": row["oldest_month"],
+                **{name: row[name] for name in totals},
+            }
+        )
+        if row["room__house_id"] not in houses:
+            houses[row["room__house_id"]] = {
+                "house_id": row["room__house_id"],
+                "house": row["room__house__name"],
+                **{name: row[f"house_{name}"] for name in totals},
+            }
+            for name in totals:
+                totals[name] += row[f"house_{name}"]
+
+    report = {
+        "as_of": today.isoformat(),
+        "cutoffs": {"days_30": d30, "days_60": d60, "days_90": d90},
+        "tenants": tenants,
+        "houses": list(houses.values()),
+        "totals": totals,
+    }
+    cache.set(key, report, REPORT_CACHE_TIMEOUT)
+    return report
+
+
+def occupancy_report(owner, start, end):
+    """
+    Occupancy rate and vacancy days per house between `start` and `end`
+    (inclusive).
+
+    Each `Occupancy` interval is clipped to the period in SQL with
+    GREATEST/LEAST and the clipped lengths are summed per house in a
+    correlated subquery, so history is never replayed in Python.
+
+    Capacity counts each room from the day it was added (or its first stay,
+    if earlier; rooms that predate `Room.created_at` count from the start),
+    so rooms added since do not lower past rates. Deleted rooms are gone
+    along with their stays, so they count towards neither side.
+    """
+    key = _report_key(
+        owner.pk, ("house", "room", "tenant"), "occupancy", start.isoformat(), end.isoformat()
+    )
+    report = cache.get(key)
+    if report is not None:
+        return report
+
+    period_end = end + timedelta(days=1)
+    days = (period_end - start).days
+    occupied = (
+        Occupancy.objects.filter(room__house=OuterRef("pk"), start__lt=period_end)
+        .filter(Q(end__isnull=True) | Q(end__gt=start))
+        .annotate(
+            span=Least(Coalesce("end", Value(period_end)), Value(period_end))
+            - Greatest("start", Value(start))
+        )
+        .values("room__house")
+        .annotate(total=Sum("span"))
+        .values("total")
+    )
+    room_days = {}
+    rooms = (
+        Room.objects.filter(house__owner=owner)
+        .annotate(first_stay=Min("occupancies__start"))
+        .values_list("house_id", "created_at", "first_stay")
+    )
+    for house_id, created_at, first_stay in rooms:
+        since = timezone.localdate(created_at) if created_at else start
+        if first_stay:
+            since = min(since, first_stay)
+        existed = max((period_end - max(since, start)).days, 0)
+        room_days[house_id] = room_days.get(house_id, 0) + existed
+
+    rows = (
+        House.objects.filter(owner=owner)
+        .annotate(
+            rooms=Count("room"),
+            occupied=Subquery(occupied, output_field=DurationField()),
+        )
+        .order_by("name", "id")
+        .values("id", "name", "rooms", "occupied")
+    )
+
+    houses = []
+    for row in rows:
+        capacity = room_days.get(row["id"], 0)
+        occupied_days = row["occupied"].days if row["occupied"] else 0
+        houses.append(
+            {
+                "house_id": row["id"],
+                "house": row["name"],
+                "rooms": row["rooms"],
+                "room_days": capacity,
+                "occupied_days": occupied_days,
+                "vacancy_days": capacity - occupied_days,
+                "occupancy_rate": round(occupied_days / capacity, 4) if capacity else None,
+            }
+        )
+    room_days = sum(house["room_days"] for house in houses)
+    occupied_days = sum(house["occupied_days"] for house in houses)
+    report = {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "days": days,
+        "houses": houses,
+        "totals": {
+            "rooms": sum(house["rooms"] for house in houses),
+            "room_days": room_days,
+            "occupied_days": occupied_days,
+            "vacancy_days": room_days - occupied_days,
+            "occupancy_rate": round(occupied_days / room_days, 4) if room_days else None,
+        },
+    }
+    cache.set(key, report, REPORT_CACHE_TIMEOUT)
+    return report
+
+
+def daily_collections(owner, start, end):
+    """
+    Money received per day between `start` and `end` (inclusive), split by
+    payment method, across all of the owner's houses.
+
+    A range scan of `PaymentTransaction.paid_on` summed in one grouped
+    query; archived bills' payments are included.
+    """
+    key = _report_key(
+        owner.pk, ("house", "room", "payment"), "collections", start.isoformat(), end.isoformat()
+    )
+    report = cache.get(key)
+    if report is not None:
+        return report
+
+    rows = (
+        PaymentTransaction.objects.filter(room__house__owner=owner, paid_on__range=(start, end))
+        .values("paid_on", "method")
+        .annotate(amount=Sum("amount"), payments=Count("id"))
+        .order_by("paid_on", "method")
+    )
+    days = {}
+    methods = {}
+    for row in rows:
+        day = days.setdefault(
+            row["paid_on"],
+            {"date": row["paid_on"].isoformat(), "collected": Decimal("0"), "payments": 0, "methods": {}},
+        )
+        day["collected"] += row["amount"]
+        day["payments"] += row["payments"]
+        day["methods"][row["method"]] = row["amount"]
+        methods[row["method"]] = methods.get(row["method"], Decimal("0")) + row["amount"]
+
+    report = {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "days": list(days.values()),
+        "totals": {
+            "collected": sum((day["collected"] for day in days.values()), Decimal("0")),
+            "payments": sum(day["payments"] for day in days.values()),
+            "methods": methods,
+        },
+    }
+    cache.set(key, report, REPORT_CACHE_TIMEOUT)
+    return report
@@ -1,5 +1,8 @@
+from decimal import Decimal
+
+from django.urls import reverse
 from rest_framework import serializers
-from .models import House, Room, Tenant, PaymentHistory, TenantDocument
+from .models import DeletionJob, House, Room, Tenant, PaymentHistory, PaymentTransaction, TenantDocument
 
 
 class HouseSerializer(serializers.ModelSerializer):
@@ -17,10 +20,18 @@ class RoomSerializer(serializers.ModelSerializer):
 class TenantDocumentSerializer(serializers.ModelSerializer):
     tenant = serializers.PrimaryKeyRelatedField(queryset=Tenant.objects.all())
     initial_unit = serializers.IntegerField(write_only=True, required=False)
+    download_url = serializers.SerializerMethodField()
 
     class Meta:
         model = TenantDocument
-        fields = ["id", "tenant", "document", "initial_unit"]
+        fields = ["id", "tenant", "document", "download_url", "initial_unit"]
+        extra_kwargs = {"document": {"write_only": True}}
+
+    def get_download_url(self, obj):
+        url = reverse("room:download_document", args=[obj.pk])
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
     def validate_tenant(self, value):
         request = self.context.get("request")
         if not request or not hasattr(request, "user"):
@@ -77,8 +88,9 @@ class TenantSerializer(serializers.ModelSerializer):
             "waste_price",
             "initial_unit",
             "documents",
+            "version",
         ]
-        read_only_fields = ["email_verified"]
+        read_only_fields = ["email_verified", "version"]
 
 
 class PaymentHistorySerializer(serializers.ModelSerializer):
@@ -99,7 +111,7 @@ class PaymentHistorySerializer(serializers.ModelSerializer):
             "previous_units",
             "current_units",
             "electricity",
-            "payment_received_data",
+            "payment_received_date",
             "water",
             "remarks",
             "rent",
@@ -111,6 +123,7 @@ class PaymentHistorySerializer(serializers.ModelSerializer):
             "status",
             "created_at",
             "updated_at",
+            "version",
         ]
         read_only_fields = [
             "electricity",
@@ -121,8 +134,77 @@ class PaymentHistorySerializer(serializers.ModelSerializer):
             "status",
             "created_at",
             "updated_at",
+            "version",
         ]
 
 
+class BillHistorySerializer(serializers.Serializer):
+    """
+    A row of `BillHistory` (live or archived) in the shape of
+    PaymentHistorySerializer. Archived bills have no version.
+    """
+
+    id = serializers.IntegerField()
+    roomId = serializers.IntegerField(source="room_id")
+    roomName = serializers.CharField(source="room_name", allow_null=True)
+    billing_month = serializers.CharField()
+    previous_units = serializers.IntegerField()
+    current_units = serializers.IntegerField()
+    electricity = serializers.DecimalField(max_digits=10, decimal_places=2)
+    payment_received_date = serializers.CharField(allow_null=True)
+    water = serializers.DecimalField(max_digits=10, decimal_places=2)
+    remarks = serializers.CharField(allow_null=True)
+    rent = serializers.DecimalField(max_digits=10, decimal_places=2)
+    waste = serializers.DecimalField(max_digits=10, decimal_places=2)
+    total = serializers.DecimalField(max_digits=10, decimal_places=2)
+    total_paid = serializers.DecimalField(max_digits=10, decimal_places=2)
+    status = serializers.CharField()
+    created_at = serializers.DateTimeField()
+    updated_at = serializers.DateTimeField()
+    version = serializers.IntegerField(allow_null=True)
+    archived = serializers.BooleanField()
+
 
 # PaymentReceived model removed; related serializer omitted
+
+
+class PaymentTransactionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PaymentTransaction
+        fields = ["id", "bill", "room", "amount", "paid_on", "method", "reference", "created_at"]
+        read_only_fields = fields
+
+
+class RecordPaymentSerializer(serializers.Serializer):
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal("0.01"))
+    paid_on = serializers.DateField(required=False)
+    method = serializers.ChoiceField(choices=PaymentTransaction.METHOD_CHOICES, default="cash")
+    reference = serializers.CharField(max_length=500, required=False, allow_blank=True, default="")
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    progress = serializers.IntegerField(read_only=True)
+    status_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DeletionJob
+        fields = [
+            "id",
+            "kind",
+            "object_id",
+            "label",
+            "status",
+            "total",
+            "deleted",
+            "progress",
+            "error",
+            "created_at",
+            "finished_at",
+            "status_url",
+        ]
+        read_only_fields = fields
+
+    def get_status_url(self, obj):
+        url = reverse("deletion-detail", args=[obj.pk])
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
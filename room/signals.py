@@ -0,0 +1,179 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import (
+    DocumentBlob,
+    House,
+    Occupancy,
+    PaymentHistory,
+    PaymentTransaction,
+    Room,
+    RoomBalance,
+    Tenant,
+    TenantDocument,
+    parse_received_date,
+)
+from .cache import bump_version_on_commit
+
+
+@receiver(pre_save, sender=TenantDocument)
+def remember_previous_document(sender, instance, **kwargs):
+    previous = None
+    if instance.pk:
+        previous = (
+            TenantDocument.objects.filter(pk=instance.pk)
+            .values_list("document", flat=True)
+            .first()
+        )
+    instance._previous_document = previous
+
+
+@receiver(post_save, sender=TenantDocument)
+def count_document_reference(sender, instance, created, **kwargs):
+    current = instance.document.name if instance.document else None
+    previous = getattr(instance, "_previous_document", None)
+    if not created and previous == current:
+        return
+    with transaction.atomic():
+        DocumentBlob.acquire(current)
+        if not created:
+            DocumentBlob.release(previous)
+
+
+@receiver(post_delete, sender=TenantDocument)
+def release_document_reference(sender, instance, **kwargs):
+    DocumentBlob.release(instance.document.name if instance.document else None)
+
+
+@receiver(pre_save, sender=PaymentHistory)
+def remember_previous_bill(sender, instance, **kwargs):
+    previous = None
+    if instance.pk:
+        previous = (
+            PaymentHistory.objects.filter(pk=instance.pk)
+            .values("room_id", "total", "total_paid")
+            .first()
+        )
+    instance._previous_bill = previous
+
+
+def _decimal(value):
+    # Freshly created instances can still hold the float/int defaults.
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+@receiver(post_save, sender=PaymentHistory)
+def update_balance_for_bill(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_bill", None)
+    total_paid = _decimal(instance.total_paid)
+    outstanding = _decimal(instance.total) - total_paid
+    paid_before = Decimal("0")
+    if previous:
+        paid_before = previous["total_paid"]
+        previous_outstanding = previous["total"] - previous["total_paid"]
+        if previous["room_id"] != instance.room_id:
+            RoomBalance.apply(previous["room_id"], -previous_outstanding)
+        else:
+            outstanding -= previous_outstanding
+    paid_on = timezone.localdate() if total_paid > paid_before else None
+    RoomBalance.apply(instance.room_id, outstanding, paid_on=paid_on)
+
+
+@receiver(post_save, sender=PaymentHistory)
+def log_payment_change(sender, instance, created, **kwargs):
+    """
+    Log a transaction when `total_paid` is set directly (bill forms, the
+    API, the admin) instead of through `record_payment`, so the bill's
+    transactions keep adding up to it.
+    """
+    previous = getattr(instance, "_previous_bill", None)
+    if previous and previous["room_id"] != instance.room_id:
+        PaymentTransaction.objects.filter(bill=instance).update(room_id=instance.room_id)
+    change = _decimal(instance.total_paid) - (previous["total_paid"] if previous else Decimal("0"))
+    if not change:
+        return
+    PaymentTransaction.objects.create(
+        bill=instance,
+        room_id=instance.room_id,
+        amount=change,
+        paid_on=parse_received_date(instance.payment_received_date) or timezone.localdate(),
+        method="other",
+        reference=instance.payment_received_date or "",
+    )
+
+
+@receiver(post_delete, sender=PaymentHistory)
+def update_balance_for_deleted_bill(sender, instance, origin=None, **kwargs):
+    # When a room or house is deleted its balance row goes with it; adjusting
+    # it here would recreate the row for a room that is about to disappear.
+    if not isinstance(origin, PaymentHistory) and getattr(origin, "model", None) is not PaymentHistory:
+        return
+    RoomBalance.apply(
+        instance.room_id, -(_decimal(instance.total) - _decimal(instance.total_paid))
+    )
+
+
+@receiver(pre_save, sender=Tenant)
+def remember_previous_room(sender, instance, **kwargs):
+    previous = None
+    if instance.pk:
+        previous = Tenant.objects.filter(pk=instance.pk).values_list("room_id", flat=True).first()
+    instance._previous_room_id = previous
+
+
+@receiver(post_save, sender=Tenant)
+def record_occupancy(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_room_id", None)
+    if not created and previous == instance.room_id:
+        return
+    with transaction.atomic():
+        if previous is not None and previous != instance.room_id:
+            Occupancy.close(previous)
+            Room.objects.filter(pk=previous).update(is_occupied=False)
+        Occupancy.close(instance.room_id)
+        Occupancy.open(instance, start=None if created else timezone.localdate())
+        Room.objects.filter(pk=instance.room_id).update(is_occupied=True)
+
+
+@receiver(post_delete, sender=Tenant)
+def end_occupancy(sender, instance, **kwargs):
+    Occupancy.close(instance.room_id)
+    Room.objects.filter(pk=instance.room_id).update(is_occupied=False)
+
+
+# Which owner version each model bumps. `Room.is_occupied` and the occupancy
+# history change with the tenant, so readers of those depend on "tenant".
+VERSIONED_MODELS = {
+    House: "house",
+    Room: "room",
+    Tenant: "tenant",
+    TenantDocument: "document",
+    PaymentHistory: "payment",
+}
+
+
+def _owner_of(instance):
+    if isinstance(instance, House):
+        return instance.owner_id
+    if isinstance(instance, Room):
+        houses = House.objects.filter(pk=instance.house_id)
+    elif isinstance(instance, TenantDocument):
+        houses = House.objects.filter(room__tenant__id=instance.tenant_id)
+    else:
+        houses = House.objects.filter(room__id=instance.room_id)
+    return houses.values_list("owner_id", flat=True).first()
+
+
+def bump_owner_version(sender, instance, using=None, **kwargs):
+    owner_id = _owner_of(instance)
+    if owner_id is not None:
+        bump_version_on_commit(owner_id, VERSIONED_MODELS[sender], using=using)
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_owner_version, sender=model, dispatch_uid=f"bump_version_{model.__name__}")
+    post_delete.connect(bump_owner_version, sender=model, dispatch_uid=f"bump_version_{model.__name__}")
@@ -1,3 +1,1383 @@
-from django.test import TestCase
+import gzip
+import io
+import itertools
+import os
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+import shutil
+import tempfile
+import threading
+from unittest import mock
+import zipfile
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.db_router import PIN_COOKIE
+from core.storage import CompressedManifestStaticFilesStorage
+
+from .analytics import analyze_readings, load_readings, parse_months
+from .archive import archive_paid_bills, bill_history
+from .cache import VERSIONED_RESOURCES, bump_version, owner_key, owner_versions
+from .deletion import STALE_AFTER, run_deletion
+from .exports import iter_keyset_rows, tenant_bills
+from .payments import record_payment
+from .downloads import signed_document_url
+from .imports import import_csv
+from .partitioning import partition_name, year_bounds
+from .reports import arrears_aging, occupancy_report, revenue_report
+from .management.commands.check_balances import Command as CheckBalancesCommand
+from .models import (
+    ArchivedPaymentHistory,
+    DeletionJob,
+    DocumentBlob,
+    House,
+    Occupancy,
+    PaymentHistory,
+    PaymentTransaction,
+    Room,
+    RoomBalance,
+    Tenant,
+    TenantDocument,
+)
+from .storage import document_storage
+
+User = get_user_model()
+
+
+class RoomTestMixin:
+    def create_room(self, owner=None, room_number="101"):
+        owner = owner or self.owner
+        house, _ = House.objects.get_or_create(name="Main house", owner=owner)
+        return Room.objects.create(house=house, room_number=room_number)
+
+    def create_tenant(self, room, **kwargs):
+        kwargs.setdefault("name", "Tenant")
+        kwargs.setdefault("contact", "9800000000")
+        kwargs.setdefault("move_in_date", "2024-01-01")
+        kwargs.setdefault("rent_price", 5000)
+        return Tenant.objects.create(room=room, **kwargs)
+
+    def create_bill(self, room, current_units, billing_month, **kwargs):
+        return PaymentHistory.objects.create(
+            room=room,
+            billing_month=billing_month,
+            previous_units=0,
+            current_units=current_units,
+            electricity=0,
+            water=0,
+            rent=0,
+            **kwargs,
+        )
+
+
+class MediaRootMixin:
+    def use_temp_media_root(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+class DocumentStorageTests(MediaRootMixin, RoomTestMixin, TestCase):
+    def setUp(self):
+        self.use_temp_media_root()
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        self.tenant = self.create_tenant(self.create_room())
+        self.other_tenant = self.create_tenant(self.create_room(room_number="102"))
+
+    def upload(self, tenant, content=b"lease template", filename="lease.pdf"):
+        return TenantDocument.objects.create(
+            tenant=tenant, document=SimpleUploadedFile(filename, content)
+        )
+
+    def test_identical_uploads_share_one_blob(self):
+        """
+        Ensure identical content is stored once and reference counted.
+        """
+        first = self.upload(self.tenant)
+        second = self.upload(self.other_tenant, filename="copy.PDF")
+
+        self.assertEqual(first.document.name, second.document.name)
+        self.assertTrue(first.document.name.startswith("tenant_documents/"))
+        self.assertEqual(DocumentBlob.objects.get().ref_count, 2)
+
+    def test_delete_releases_and_sweeper_reclaims(self):
+        """
+        Ensure deleting the last reference lets the sweeper remove the file.
+        """
+        first = self.upload(self.tenant)
+        second = self.upload(self.other_tenant)
+        name = first.document.name
+
+        first.delete()
+        self.assertEqual(DocumentBlob.objects.get(name=name).ref_count, 1)
+        second.delete()
+        self.assertEqual(DocumentBlob.objects.get(name=name).ref_count, 0)
+
+        call_command("sweep_document_blobs", grace_minutes=-1, stdout=tempfile.TemporaryFile("w"))
+        self.assertFalse(DocumentBlob.objects.filter(name=name).exists())
+        self.assertFalse(document_storage().exists(name))
+
+    def test_sweeper_keeps_a_blob_an_upload_is_reusing(self):
+        """
+        Ensure a long-orphaned file found by a new upload outlives the sweep.
+        """
+        document = self.upload(self.tenant)
+        name = document.document.name
+        document.delete()
+        DocumentBlob.objects.filter(name=name).update(
+            updated_at=timezone.now() - timedelta(days=1)
+        )
+
+        # The upload has found the file but not yet taken its reference.
+        document_storage().save("tenant_documents/lease.pdf", ContentFile(b"lease template"))
+        call_command("sweep_document_blobs", stdout=tempfile.TemporaryFile("w"))
+        self.assertTrue(document_storage().exists(name))
+        self.assertTrue(DocumentBlob.objects.filter(name=name).exists())
+
+    def test_upload_rewrites_a_file_swept_while_it_waited(self):
+        """
+        Ensure an upload whose touch waited on a sweep writes the file again.
+        """
+        document = self.upload(self.tenant)
+        name = document.document.name
+        document.delete()
+        DocumentBlob.objects.filter(name=name).update(
+            updated_at=timezone.now() - timedelta(days=1)
+        )
+
+        touch = DocumentBlob.touch
+
+        def touch_after_sweep(blob_name):
+            # The sweep held the blob's lock when the upload found the file.
+            call_command("sweep_document_blobs", stdout=tempfile.TemporaryFile("w"))
+            return touch(blob_name)
+
+        with mock.patch.object(DocumentBlob, "touch", side_effect=touch_after_sweep):
+            again = self.upload(self.other_tenant)
+        self.assertEqual(again.document.name, name)
+        self.assertTrue(document_storage().exists(name))
+        self.assertEqual(DocumentBlob.objects.get(name=name).ref_count, 1)
+
+
+@override_settings(DOCUMENT_ACCEL_REDIRECT=True, DOCUMENT_ACCEL_PREFIX="/protected-media/")
+class DocumentDownloadTests(MediaRootMixin, RoomTestMixin, TestCase):
+    def setUp(self):
+        self.use_temp_media_root()
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        self.stranger = User.objects.create_user(email="other@example.com", password="pw")
+        tenant = self.create_tenant(self.create_room())
+        self.document = TenantDocument.objects.create(
+            tenant=tenant, name="Lease", document=SimpleUploadedFile("lease.pdf", b"lease")
+        )
+        self.url = reverse("room:download_document", args=[self.document.pk])
+
+    def test_owner_gets_accel_redirect(self):
+        """
+        Ensure the owner's download is handed to nginx without a body.
+        """
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["X-Accel-Redirect"], "/protected-media/" + self.document.document.name
+        )
+        self.assertEqual(response.content, b"")
+
+    def test_other_owner_is_refused(self):
+        """
+        Ensure a document cannot be fetched by someone else's account.
+        """
+        self.client.force_login(self.stranger)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_signed_url_works_anonymously_until_tampered(self):
+        """
+        Ensure signed links bypass login but reject a modified token.
+        """
+        url = signed_document_url(self.document)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url[:-2] + "x/").status_code, 404)
+
+
+class TenantExportTests(MediaRootMixin, RoomTestMixin, TestCase):
+    def setUp(self):
+        self.use_temp_media_root()
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        self.room = self.create_room()
+        self.tenant = self.create_tenant(self.room, name="Sita")
+        TenantDocument.objects.create(
+            tenant=self.tenant, name="Lease", document=SimpleUploadedFile("lease.pdf", b"lease")
+        )
+        self.create_bill(self.room, 100, "2024-01")
+        self.create_bill(self.room, 150, "2024-02")
+
+    def test_export_streams_documents_and_bills(self):
+        """
+        Ensure the export is streamed and contains the documents and a bill CSV.
+        """
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse("room:export_tenant", args=[self.room.pk]))
+        self.assertTrue(response.streaming)
+
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ["documents/lease.pdf", "payment_history.csv"])
+        self.assertEqual(archive.read("documents/lease.pdf"), b"lease")
+        rows = archive.read("payment_history.csv").decode().splitlines()
+        self.assertEqual(len(rows), 3)
+        self.assertIn("2024-02", rows[2])
+
+    def test_export_has_only_the_bills_of_the_tenants_stay(self):
+        """
+        Ensure bills from before the move-in or after the move-out are left out.
+        """
+        self.create_bill(self.room, 50, "2023-11")
+        other = self.create_room(room_number="102")
+        self.create_tenant(other, name="Ram")
+        self.create_bill(other, 10, "2023-12")
+        self.create_bill(other, 10, "2024-02")
+        Occupancy.objects.filter(tenant=self.tenant).update(end=date(2024, 1, 20))
+        Occupancy.objects.create(room=other, tenant=self.tenant, start=date(2024, 1, 20))
+
+        months = [
+            (room_id, month)
+            for room_id, month, _ in tenant_bills(self.tenant)
+            .order_by("billing_month", "id")
+            .values_list("room_id", "billing_month", "id")
+        ]
+        self.assertEqual(months, [(self.room.pk, "2024-01"), (other.pk, "2024-02")])
+
+
+class RevenueReportTests(RoomTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        self.room = self.create_room()
+        self.create_tenant(self.room, rent_price=1000, water_price=0)
+        self.create_bill(self.room, 10, "2024-01", total_paid=1000)
+        self.bill = self.create_bill(self.room, 20, "2024-02")
+
+    def test_report_groups_by_month_and_house(self):
+        """
+        Ensure the API returns per-month totals for the requested range.
+        """
+        self.client.force_login(self.owner)
+        response = self.client.get("/api/reports/revenue/", {"start": "2024-01", "end": "2024-02"})
+        self.assertEqual(response.status_code, 200)
+        months = {row["month"]: row for row in response.json()["months"]}
+        self.assertEqual(set(months), {"2024-01", "2024-02"})
+        self.assertEqual(float(months["2024-01"]["outstanding"]), 150.0)
+        self.assertEqual(float(months["2024-02"]["collected"]), 0.0)
+
+        page = self.client.get(reverse("room:revenue_report"), {"start": "2024-01", "end": "2024-02"})
+        self.assertContains(page, "2024-02")
+
+    def test_cached_report_is_invalidated_by_bill_changes(self):
+        """
+        Ensure a cached report is served without queries until a bill changes.
+        """
+        first = revenue_report(self.owner, "2024-01", "2024-12")
+        with self.assertNumQueries(0):
+            revenue_report(self.owner, "2024-01", "2024-12")
+
+        self.bill.refresh_from_db()
+        self.bill.total_paid = self.bill.total
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bill.save()
+        second = revenue_report(self.owner, "2024-01", "2024-12")
+        self.assertEqual(second["totals"]["collected"], first["totals"]["collected"] + self.bill.total)
+
+    def test_invalid_range_is_rejected(self):
+        """
+        Ensure malformed months are reported as a bad request.
+        """
+        self.client.force_login(self.owner)
+        response = self.client.get("/api/reports/revenue/", {"start": "2024-13"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ConsumptionAnalyticsTests(RoomTestMixin, TestCase):
+    def test_spike_and_rollback_are_flagged(self):
+        """
+        Ensure a sudden spike and a negative reading are reported per room.
+        """
+        months = np.arange(24 * 12, 24 * 12 + 24)
+        usage = np.full(24, 100)
+        usage[10] = 900
+        usage[20] = -5
+        room_ids = np.concatenate([np.full(24, 2), np.full(24, 1)])
+        result = analyze_readings(
+            room_ids, np.concatenate([months, months]), np.concatenate([usage, np.full(24, 50)])
+        )
+
+        by_room = {room["room_id"]: room for room in result}
+        self.assertEqual(by_room[1]["anomalies"], [])
+        self.assertEqual(by_room[1]["trend_per_month"], 0.0)
+        kinds = {item["billing_month"]: item["kind"] for item in by_room[2]["anomalies"]}
+        self.assertEqual(kinds, {"0024-11": "spike", "0025-09": "rollback"})
+
+    def test_parse_months_skips_free_text(self):
+        """
+        Ensure billing months that are not YYYY-MM are marked invalid.
+        """
+        index, valid = parse_months(np.array(["2024-03", "March", "2024-13"], dtype="U7"))
+        self.assertEqual(index[0], 2024 * 12 + 2)
+        self.assertEqual(valid.tolist(), [True, False, False])
+
+    def test_parse_months_rejects_longer_values(self):
+        """
+        Ensure a full date is marked invalid rather than cut to its month.
+        """
+        index, valid = parse_months(np.array(["2024-01-15", "2024-01", "2024-1"]))
+        self.assertEqual(index[1], 2024 * 12)
+        self.assertEqual(valid.tolist(), [False, True, False])
+        with self.assertRaises(ValueError):
+            parse_months(np.array([202401]))
+
+    def test_api_returns_owner_rooms(self):
+        """
+        Ensure the consumption endpoint analyses the owner's stored readings.
+        """
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        room = self.create_room()
+        self.create_tenant(room)
+        for month, units in enumerate([100, 200, 300], start=1):
+            self.create_bill(room, units, f"2024-{month:02d}")
+
+        self.client.force_login(self.owner)
+        response = self.client.get("/api/reports/consumption/", {"room_id": room.pk})
+        self.assertEqual(response.status_code, 200)
+        rooms = response.json()["rooms"]
+        self.assertEqual(rooms[0]["readings"], 3)
+        self.assertEqual(rooms[0]["mean_consumption"], 100.0)
+        self.assertContains(self.client.get(reverse("room:room_detail", args=[room.pk])), "Electricity consumption")
+
+
+class PaymentExportTests(RoomTestMixin, TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        self.room = self.create_room()
+        self.create_tenant(self.room)
+        self.create_bill(self.room, 100, "2024-01", total_paid=100000)
+        self.create_bill(self.room, 200, "2024-02")
+        self.create_bill(self.room, 300, "2024-03")
+        self.client.force_login(self.owner)
+
+    def test_csv_export_applies_filters(self):
+        """
+        Ensure the CSV export streams only the bills matching the filters.
+        """
+        response = self.client.get(
+            "/api/payment-histories/export/csv/",
+            {"status": "Unpaid", "start": "2024-01", "end": "2024-02"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("2024-02", lines[1])
+
+    def test_xlsx_export_is_a_workbook(self):
+        """
+        Ensure the XLSX export is a zip with one row per bill plus a header.
+        """
+        response = self.client.get("/api/payment-histories/export/xlsx/")
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertIn("xl/workbook.xml", archive.namelist())
+        sheet = archive.read("xl/worksheets/sheet1.xml").decode()
+        self.assertEqual(sheet.count("<row>"), 4)
+
+    def test_export_pages_by_key_without_server_side_cursors(self):
+        """
+        Ensure exports behind a pooler read in keyset chunks, in order.
+        """
+        second = self.create_bill(self.room, 250, "2024-02")
+        bills = bill_history(room_id=self.room.pk).order_by("billing_month", "id")
+        rows = list(iter_keyset_rows(bills, ["billing_month", "id"], chunk_size=2))
+        self.assertEqual([month for month, _ in rows], ["2024-01", "2024-02", "2024-02", "2024-03"])
+        self.assertEqual(rows[2][1], second.pk)
+
+        with mock.patch.dict(connection.settings_dict, {"DISABLE_SERVER_SIDE_CURSORS": True}):
+            response = self.client.get("/api/payment-histories/export/csv/")
+            lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+
+    def test_invalid_month_is_rejected(self):
+        """
+        Ensure a malformed month filter is reported as a bad request.
+        """
+        response = self.client.get("/api/payment-histories/export/csv/", {"start": "Jan"})
+        self.assertEqual(response.status_code, 400)
+
+
+class CsvImportTests(RoomTestMixin, TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        self.room = self.create_room()
+        self.house = self.room.house
+
+    def test_rooms_import_reports_row_errors(self):
+        """
+        Ensure valid rooms are created and bad rows are reported by line.
+        """
+        csv_file = io.StringIO(
+            "house,room_number,room_name\n"
+            "Main house,102,Corner\n"
+            "Main house,101,\n"
+            "Other house,103,\n"
+            "Main house,102,\n"
+        )
+        report = import_csv("rooms", csv_file, self.owner, batch_size=2)
+        self.assertEqual(report.created, 1)
+        self.assertEqual([error["line"] for error in report.errors], [3, 4, 5])
+        self.assertTrue(Room.objects.filter(house=self.house, room_number="102").exists())
+
+    def test_dry_run_saves_nothing(self):
+        """
+        Ensure a dry run validates every row without writing.
+        """
+        csv_file = io.StringIO("house,room_number\nMain house,102\nMain house,103\n")
+        report = import_csv("rooms", csv_file, self.owner, dry_run=True)
+        self.assertEqual(report.created, 2)
+        self.assertEqual(Room.objects.count(), 1)
+
+    def test_tenants_and_readings_import(self):
+        """
+        Ensure readings chain previous units and charges like `PaymentHistory.save()`.
+        """
+        import_csv(
+            "tenants",
+            io.StringIO(
+                "house,room_number,name,contact,move_in_date,rent_price,initial_unit\n"
+                "Main house,101,Asha,9800000000,2024-01-01,5000,10\n"
+            ),
+            self.owner,
+        )
+        self.room.refresh_from_db()
+        self.assertTrue(self.room.is_occupied)
+
+        report = import_csv(
+            "readings",
+            io.StringIO(
+                "house,room_number,billing_month,current_units,total_paid\n"
+                "Main house,101,2024-01,30,\n"
+                "Main house,101,2024-02,55,1000\n"
+                "Main house,101,2024-02,60,\n"
+            ),
+            self.owner,
+            batch_size=1,
+        )
+        self.assertEqual(report.created, 2)
+        self.assertEqual(report.errors[0]["line"], 4)
+        bills = list(PaymentHistory.objects.order_by("billing_month"))
+        self.assertEqual([bill.previous_units for bill in bills], [10, 30])
+        self.assertEqual(bills[1].electricity, 25 * 15)
+        self.assertEqual(bills[1].total, 25 * 15 + 200 + 5000)
+        self.assertEqual(bills[1].status, "Partially Paid")
+        self.assertEqual(
+            RoomBalance.for_room(self.room.id).balance, bills[0].total + bills[1].total - 1000
+        )
+
+    def test_api_upload_and_missing_columns(self):
+        """
+        Ensure the upload endpoint imports the file and rejects a bad header.
+        """
+        self.client.force_login(self.owner)
+        response = self.client.post(
+            "/api/imports/rooms/",
+            {"file": SimpleUploadedFile("rooms.csv", b"house,room_number\nMain house,102\n")},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["created"], 1)
+
+        response = self.client.post(
+            "/api/imports/rooms/",
+            {"file": SimpleUploadedFile("rooms.csv", b"room_number\n102\n")},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_management_command(self):
+        """
+        Ensure the command imports from a file path.
+        """
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as handle:
+            handle.write("house,room_number\nMain house,102\n")
+        self.addCleanup(os.unlink, handle.name)
+        out = io.StringIO()
+        call_command("import_csv", "rooms", handle.name, owner=self.owner.email, stdout=out)
+        self.assertIn("Imported 1 of 1", out.getvalue())
+
+
+class ArrearsAgingTests(RoomTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        self.room = self.create_room()
+        self.create_tenant(self.room, name="Asha")
+        other = self.create_room(room_number="102")
+        self.create_tenant(other, name="Bikash")
+        # Totals come from the tenant prices: rent 5000 + water 200 + units * 15.
+        self.create_bill(self.room, 10, "2024-01")
+        self.create_bill(self.room, 20, "2024-03")
+        self.create_bill(self.room, 30, "2024-04", total_paid=1000)
+        self.create_bill(self.room, 40, "2024-05", total_paid=100000)
+        self.create_bill(other, 10, "2024-05")
+
+    def test_buckets_and_house_totals(self):
+        """
+        Ensure bills are bucketed by age and house totals sum the tenants.
+        """
+        report = arrears_aging(self.owner, today=date(2024, 5, 20))
+        self.assertEqual(report["cutoffs"], {"days_30": "2024-04", "days_60": "2024-03", "days_90": "2024-02"})
+        asha = next(row for row in report["tenants"] if row["tenant"] == "Asha")
+        self.assertEqual(asha["bills"], 3)
+        self.assertEqual(asha["oldest_month"], "2024-01")
+        self.assertEqual(asha["days_90"], 5350)
+        self.assertEqual(asha["days_60"], 5350)
+        self.assertEqual(asha["days_30"], 4350)
+        self.assertEqual(asha["current"], 0)
+        self.assertEqual(report["houses"][0]["outstanding"], 5350 * 2 + 4350 + 5350)
+        self.assertEqual(report["totals"]["current"], 5350)
+
+    def test_api_and_dashboard(self):
+        """
+        Ensure the report is served by the API and shown on the dashboard.
+        """
+        self.client.force_login(self.owner)
+        response = self.client.get("/api/reports/aging/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["tenants"]), 2)
+        response = self.client.get(reverse("room:dashboard"))
+        self.assertContains(response, "Arrears by age")
+
+
+class OccupancyTests(RoomTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        self.room = self.create_room()
+        self.other = self.create_room(room_number="102")
+        Room.objects.update(created_at=datetime(2023, 1, 1, tzinfo=dt_timezone.utc))
+
+    def test_tenant_signals_maintain_intervals(self):
+        """
+        Ensure assigning and removing a tenant opens and closes an interval.
+        """
+        tenant = self.create_tenant(self.room, move_in_date="2024-01-10")
+        stay = Occupancy.objects.get(room=self.room)
+        self.assertEqual((stay.start, stay.end), (date(2024, 1, 10), None))
+        self.room.refresh_from_db()
+        self.assertTrue(self.room.is_occupied)
+
+        tenant.room = self.other
+        tenant.save()
+        self.assertIsNotNone(Occupancy.objects.get(room=self.room).end)
+        self.assertIsNone(Occupancy.objects.get(room=self.other).end)
+
+        tenant.delete()
+        self.assertFalse(Occupancy.objects.filter(end__isnull=True).exists())
+        self.other.refresh_from_db()
+        self.assertFalse(self.other.is_occupied)
+
+    def test_backdated_move_in_starts_at_previous_move_out(self):
+        """
+        Ensure a move-in dated before the last move-out does not overlap it.
+        """
+        previous = self.create_tenant(self.room, move_in_date="2024-01-10")
+        Occupancy.objects.filter(room=self.room).update(end=date(2024, 3, 1))
+        previous.delete()
+
+        self.create_tenant(self.room, move_in_date="2024-02-15")
+        stays = Occupancy.objects.filter(room=self.room).order_by("start")
+        self.assertEqual(
+            [(stay.start, stay.end) for stay in stays],
+            [(date(2024, 1, 10), date(2024, 3, 1)), (date(2024, 3, 1), None)],
+        )
+
+    def test_rate_and_vacancy_days(self):
+        """
+        Ensure intervals are clipped to the period before being summed.
+        """
+        Occupancy.objects.create(room=self.room, start=date(2023, 12, 1), end=date(2024, 1, 11))
+        Occupancy.objects.create(room=self.room, start=date(2024, 1, 21))
+        Occupancy.objects.create(room=self.other, start=date(2024, 2, 1), end=date(2024, 3, 1))
+        report = occupancy_report(self.owner, date(2024, 1, 1), date(2024, 1, 31))
+        house = report["houses"][0]
+        self.assertEqual(house["room_days"], 62)
+        self.assertEqual(house["occupied_days"], 10 + 11)
+        self.assertEqual(house["vacancy_days"], 62 - 21)
+        self.assertEqual(report["totals"]["occupancy_rate"], round(21 / 62, 4))
+
+    def test_rooms_count_from_when_they_were_added(self):
+        """
+        Ensure a room added later adds no capacity to earlier periods.
+        """
+        added = self.create_room(room_number="103")
+        Room.objects.filter(pk=added.pk).update(created_at=datetime(2024, 1, 22, tzinfo=dt_timezone.utc))
+        Occupancy.objects.create(room=self.room, start=date(2024, 1, 1))
+        report = occupancy_report(self.owner, date(2024, 1, 1), date(2024, 1, 31))
+        self.assertEqual(report["totals"]["room_days"], 31 * 2 + 10)
+        report = occupancy_report(self.owner, date(2023, 12, 1), date(2023, 12, 31))
+        self.assertEqual(report["totals"]["room_days"], 31 * 2)
+        self.assertEqual(report["totals"]["rooms"], 3)
+
+    def test_api(self):
+        """
+        Ensure the API validates dates and returns the report.
+        """
+        self.client.force_login(self.owner)
+        response = self.client.get("/api/reports/occupancy/", {"start": "2024-01-01", "end": "2024-12-31"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["days"], 366)
+        response = self.client.get("/api/reports/occupancy/", {"start": "soon"})
+        self.assertEqual(response.status_code, 400)
+
+
+class RoomBalanceTests(RoomTestMixin, TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        self.room = self.create_room()
+        self.create_tenant(self.room)
+
+    def balance(self):
+        return RoomBalance.for_room(self.room.id).balance
+
+    def test_balance_follows_bill_changes(self):
+        """
+        Ensure creating, paying and deleting bills moves the running balance.
+        """
+        first = self.create_bill(self.room, 10, "2024-01")
+        second = self.create_bill(self.room, 20, "2024-02")
+        self.assertEqual(self.balance(), 5350 * 2)
+
+        first.total_paid = 5350
+        first.save()
+        self.assertEqual(self.balance(), 5350)
+        self.assertIsNotNone(RoomBalance.for_room(self.room.id).last_payment_date)
+
+        second.delete()
+        self.assertEqual(self.balance(), 0)
+
+    def test_room_delete_does_not_recreate_balance(self):
+        """
+        Ensure cascading bill deletes do not write to the room's balance.
+        """
+        self.create_bill(self.room, 10, "2024-01")
+        self.room.delete()
+        self.assertFalse(RoomBalance.objects.exists())
+
+    def test_check_balances_reports_and_fixes_drift(self):
+        """
+        Ensure the checker finds drift and `--fix` repairs it.
+        """
+        self.create_bill(self.room, 10, "2024-01")
+        RoomBalance.objects.update(balance=1)
+        out = io.StringIO()
+        call_command("check_balances", stdout=out)
+        self.assertIn("Found 1 drifted", out.getvalue())
+        out = io.StringIO()
+        call_command("check_balances", "--fix", stdout=out)
+        self.assertIn("Fixed 1 drifted", out.getvalue())
+        self.assertEqual(self.balance(), 5350)
+
+    def test_fix_rechecks_each_room_under_its_lock(self):
+        """
+        Ensure a room that was flagged but has since come right is left alone.
+        """
+        self.create_bill(self.room, 10, "2024-01")
+        # As if the scan had flagged the room before a concurrent correction.
+        self.assertIsNone(CheckBalancesCommand().fix_room(self.room.pk))
+        self.assertEqual(self.balance(), 5350)
+
+        RoomBalance.objects.all().delete()
+        self.assertEqual(CheckBalancesCommand().fix_room(self.room.pk), (self.room.pk, None, 5350))
+        self.assertEqual(self.balance(), 5350)
+
+
+class CacheNamespaceTests(TestCase):
+    def test_owner_key_namespace(self):
+        """
+        Ensure owner keys are scoped by owner and feature.
+        """
+        self.assertEqual(owner_key(7, "reports", "revenue", 2024), "owner:7:reports:revenue:2024")
+        self.assertNotEqual(owner_key(7, "reports"), owner_key(8, "reports"))
+
+    def test_sessions_survive_via_cache(self):
+        """
+        Ensure a logged-in session is served by the cached_db backend.
+        """
+        owner = User.objects.create_user(email="owner@example.com", password="pw")
+        self.client.force_login(owner)
+        self.assertEqual(self.client.session.__module__, "django.contrib.sessions.backends.cached_db")
+        self.assertEqual(self.client.get(reverse("room:dashboard")).status_code, 200)
+
+
+class OwnerVersionTests(RoomTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        self.room = self.create_room()
+
+    def test_saves_and_deletes_bump_versions(self):
+        """
+        Ensure each model bumps its own owner version and no other.
+        """
+        before = owner_versions(self.owner.pk, ("room", "tenant", "payment"))
+        with self.captureOnCommitCallbacks() as callbacks:
+            tenant = self.create_tenant(self.room)
+            # Nothing moves until the write is committed.
+            self.assertEqual(owner_versions(self.owner.pk, ("room", "tenant", "payment")), before)
+        for callback in callbacks:
+            callback()
+        after = owner_versions(self.owner.pk, ("room", "tenant", "payment"))
+        self.assertEqual(after[0], before[0])
+        self.assertNotEqual(after[1], before[1])
+        self.assertEqual(after[2], before[2])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tenant.delete()
+        self.assertNotEqual(owner_versions(self.owner.pk, ("tenant",))[0], after[1])
+
+    def test_cached_api_list_sees_writes(self):
+        """
+        Ensure a cached list is replaced as soon as the resource changes.
+        """
+        self.client.force_login(self.owner)
+        self.assertEqual(len(self.client.get("/api/rooms/").json()), 1)
+        # Only the user lookup; the session and the list come from the cache.
+        with self.assertNumQueries(1):
+            self.client.get("/api/rooms/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_room(room_number="102")
+        self.assertEqual(len(self.client.get("/api/rooms/").json()), 2)
+
+    def test_dashboard_is_recomputed_after_writes(self):
+        """
+        Ensure the cached dashboard reflects a newly added room.
+        """
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(reverse("room:dashboard")).context["total_rooms"], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_room(room_number="102")
+        self.assertEqual(self.client.get(reverse("room:dashboard")).context["total_rooms"], 2)
+
+
+class ListFragmentCacheTests(RoomTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        self.room = self.create_room()
+        self.client.force_login(self.owner)
+
+    def test_cached_house_list_skips_the_query(self):
+        """
+        Ensure a repeated house list is served from the fragment cache.
+        """
+        self.client.get(reverse("room:houses"))
+        # Only the user lookup; the session and the list come from the cache.
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("room:houses"))
+        self.assertContains(response, "Main house")
+
+    def test_room_lists_are_rerendered_after_writes(self):
+        """
+        Ensure new rooms show up in fragments cached before the write.
+        """
+        house = self.room.house
+        urls = [reverse("room:house_rooms", args=[house.id]), reverse("room:available_rooms")]
+        for url in urls:
+            self.assertNotContains(self.client.get(url), "Room number: 102")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_room(room_number="102")
+        for url in urls:
+            self.assertContains(self.client.get(url), "Room number: 102")
+
+    def test_room_lists_show_occupancy_changes(self):
+        """
+        Ensure lists cached before a tenant moved in show the room as occupied.
+        """
+        rooms_url = reverse("room:house_rooms", args=[self.room.house_id])
+        available_url = reverse("room:available_rooms")
+        self.assertContains(self.client.get(rooms_url), "Status: Available")
+        self.assertContains(self.client.get(available_url), ">Available<")
+        # Not through `add_tenant`: only the tenant signals run.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_tenant(self.room)
+        self.assertContains(self.client.get(rooms_url), "Status: Occupied")
+        self.assertContains(self.client.get(available_url), ">Occupied<")
+
+    def test_fragments_are_per_owner(self):
+        """
+        Ensure another owner never sees a fragment cached for this one.
+        """
+        self.client.get(reverse("room:houses"))
+        other = User.objects.create_user(email="other@example.com", password="pw")
+        self.client.force_login(other)
+        self.assertContains(self.client.get(reverse("room:houses")), "No houses found")
+
+
+class ConditionalPageTests(RoomTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        self.room = self.create_room()
+        self.client.force_login(self.owner)
+        # The first page sets the CSRF cookie, which is part of every ETag.
+        self.client.get(reverse("room:dashboard"))
+
+    def revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        return first, self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+    def test_unchanged_pages_answer_304(self):
+        """
+        Ensure each page can be revalidated and is marked private.
+        """
+        self.create_tenant(self.room)
+        bill = self.create_bill(self.room, 10, "2024-01")
+        for url in [
+            reverse("room:dashboard"),
+            reverse("room:houses"),
+            reverse("room:house_rooms", args=[self.room.house_id]),
+            reverse("room:room_detail", args=[self.room.id]),
+            reverse("room:view_payment", args=[bill.id]),
+        ]:
+            first, second = self.revalidate(url)
+            self.assertEqual(second.status_code, 304, url)
+            self.assertIn("private", second["Cache-Control"])
+            self.assertIn("Cookie", second["Vary"])
+
+    def test_writes_change_the_etag(self):
+        """
+        Ensure a write to the owner's data turns a revalidation into a 200.
+        """
+        url = reverse("room:room_detail", args=[self.room.id])
+        first = self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_tenant(self.room)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], first["ETag"])
+
+    def test_tenant_changes_revalidate_the_room_list(self):
+        """
+        Ensure a tenant moving in invalidates the cached room list's ETag.
+        """
+        url = reverse("room:house_rooms", args=[self.room.house_id])
+        first = self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_tenant(self.room)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Status: Occupied")
+
+    def test_payment_sends_last_modified(self):
+        """
+        Ensure the payment page carries the bill's change time.
+        """
+        self.create_tenant(self.room)
+        bill = self.create_bill(self.room, 10, "2024-01")
+        response = self.client.get(reverse("room:view_payment", args=[bill.id]))
+        self.assertIn("Last-Modified", response)
+
+    def test_etags_differ_between_owners(self):
+        """
+        Ensure two owners never share a validator for the same URL.
+        """
+        url = reverse("room:houses")
+        first = self.client.get(url)
+        self.client.force_login(User.objects.create_user(email="other@example.com", password="pw"))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200)
+
+
+class StaticStorageTests(TestCase):
+    def test_collectstatic_writes_hashed_and_gzipped_files(self):
+        """
+        Ensure post-processing fingerprints files and adds .gz siblings.
+        """
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        storage = CompressedManifestStaticFilesStorage(location=location, base_url="/static/")
+        css = "body { background: url('missing.png'); }\n" + ".row { color: red; }\n" * 50
+        storage.save("css/site.css", ContentFile(css.encode()))
+        list(storage.post_process({"css/site.css": (storage, "css/site.css")}))
+
+        hashed = storage.stored_name("css/site.css")
+        self.assertNotEqual(hashed, "css/site.css")
+        with gzip.open(os.path.join(location, hashed + ".gz")) as handle:
+            self.assertIn(b"missing.png", handle.read())
+
+
+@override_settings(DATABASE_READ_REPLICA="replica")
+class ReplicaRoutingTests(TestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        # Stand in for replication: the replica has the user, but its own houses.
+        User.objects.using("replica").create(
+            pk=self.owner.pk, email=self.owner.email, password=self.owner.password
+        )
+        House.objects.create(name="Primary house", owner=self.owner)
+        House.objects.using("replica").create(name="Replica house", owner_id=self.owner.pk)
+        self.client.force_login(self.owner)
+
+    def house_names(self):
+        return sorted(house["name"] for house in self.client.get("/api/houses/").json())
+
+    def test_list_reads_use_the_replica(self):
+        """
+        Ensure a plain GET reads from the replica.
+        """
+        self.assertEqual(self.house_names(), ["Replica house"])
+
+    def test_client_reads_its_writes_after_a_post(self):
+        """
+        Ensure the requests following a write stick to the primary.
+        """
+        response = self.client.post(reverse("room:add_house"), {"name": "New house"})
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(self.house_names(), ["New house", "Primary house"])
+
+        # Once the window has passed (and the cached list is stale), reads
+        # return to the replica.
+        del self.client.cookies[PIN_COOKIE]
+        bump_version(self.owner.pk, "house")
+        cache.delete(owner_key(self.owner.pk, "bumped", "house"))
+        self.assertEqual(self.house_names(), ["Replica house"])
+
+    def test_reads_right_after_a_bump_skip_the_replica(self):
+        """
+        Ensure a lagging replica is not cached under a freshly bumped version.
+        """
+        self.assertEqual(self.house_names(), ["Replica house"])
+        bump_version(self.owner.pk, "house")
+        response = self.client.get("/api/houses/")
+        self.assertEqual([house["name"] for house in response.json()], ["Primary house"])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        # After the lag window, the replica is read (and cached) again.
+        cache.delete(owner_key(self.owner.pk, "bumped", "house"))
+        self.assertEqual(self.house_names(), ["Replica house"])
+
+    def test_replica_results_are_not_cached_for_pinned_clients(self):
+        """
+        Ensure a list cached from the replica is not served from the primary's key.
+        """
+        self.assertEqual(self.house_names(), ["Replica house"])
+        self.client.cookies[PIN_COOKIE] = "1"
+        self.assertEqual(self.house_names(), ["Primary house"])
+
+    def test_reads_outside_requests_use_the_primary(self):
+        """
+        Ensure code that is not serving a request never reads from the replica.
+        """
+        self.assertEqual(list(House.objects.values_list("name", flat=True)), ["Primary house"])
+
+
+class ConcurrentWriteTests(RoomTestMixin, TransactionTestCase):
+    def run_in_threads(self, target, args_list):
+        errors = []
+
+        def run(*args):
+            try:
+                target(*args)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=args) for args in args_list]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_parallel_bill_creation(self):
+        """
+        Ensure workers billing different rooms at once all succeed.
+        """
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        rooms = [self.create_room(room_number=str(100 + i)) for i in range(8)]
+        for room in rooms:
+            self.create_tenant(room)
+
+        def bill(room):
+            for month in range(1, 13):
+                with transaction.atomic():
+                    self.create_bill(room, month * 10, f"2024-{month:02d}")
+
+        self.assertEqual(self.run_in_threads(bill, [(room,) for room in rooms]), [])
+        self.assertEqual(PaymentHistory.objects.count(), 8 * 12)
+        self.assertEqual(RoomBalance.objects.count(), 8)
+
+    def test_bills_for_one_room_form_a_chain(self):
+        """
+        Ensure clients billing the same room at once never start from the
+        same reading: each bill continues from the one before it.
+        """
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        room = self.create_room()
+        self.create_tenant(room, initial_unit=50)
+        readings = itertools.count(100, 10)
+
+        def bill():
+            for _ in range(10):
+                self.create_bill(room, next(readings), "2024-01")
+
+        self.assertEqual(self.run_in_threads(bill, [()] * 8), [])
+        bills = list(
+            PaymentHistory.objects.filter(room=room)
+            .order_by("id")
+            .values_list("previous_units", "current_units")
+        )
+        self.assertEqual(len(bills), 80)
+        self.assertEqual(bills[0][0], 50)
+        for (_, current), (previous, _) in zip(bills, bills[1:]):
+            self.assertEqual(previous, current)
+
+    def test_concurrent_payments_all_count(self):
+        """
+        Ensure collectors recording payments for one bill at once never
+        overwrite each other.
+        """
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        room = self.create_room()
+        self.create_tenant(room)
+        bill = self.create_bill(room, 100, "2024-01")
+
+        def pay():
+            for _ in range(5):
+                record_payment(bill.pk, 10)
+
+        self.assertEqual(self.run_in_threads(pay, [()] * 8), [])
+        bill.refresh_from_db()
+        self.assertEqual(bill.total_paid, 400)
+        self.assertEqual(bill.status, "Partially Paid")
+        self.assertEqual(PaymentTransaction.objects.filter(bill=bill).count(), 40)
+        self.assertEqual(RoomBalance.for_room(room.pk).balance, bill.total - 400)
+
+
+class RecordPaymentTests(RoomTestMixin, TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        self.room = self.create_room()
+        self.create_tenant(self.room)
+        self.bill = self.create_bill(self.room, 100, "2024-01")
+        self.client.force_login(self.owner)
+
+    def test_api_adds_to_the_bill_and_logs_a_transaction(self):
+        """
+        Ensure a recorded payment updates the totals, status and balance.
+        """
+        url = f"/api/payment-histories/{self.bill.pk}/record-payment/"
+        response = self.client.post(url, {"amount": "1000.00", "paid_on": "2024-02-03"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["status"], "Partially Paid")
+
+        response = self.client.post(url, {"amount": str(self.bill.total - 1000)})
+        self.assertEqual(response.json()["status"], "Paid")
+        self.bill.refresh_from_db()
+        self.assertEqual(self.bill.total_paid, self.bill.total)
+        self.assertEqual(self.bill.transactions.count(), 2)
+        self.assertEqual(RoomBalance.for_room(self.room.pk).balance, 0)
+
+        self.assertEqual(self.client.post(url, {"amount": "0"}).status_code, 400)
+        stranger = User.objects.create_user(email="other@example.com", password="pw")
+        self.client.force_login(stranger)
+        self.assertEqual(self.client.post(url, {"amount": "10"}).status_code, 404)
+
+    def test_form_records_a_payment(self):
+        """
+        Ensure the payment page records a payment and lists it.
+        """
+        response = self.client.post(
+            reverse("room:record_payment", args=[self.bill.pk]),
+            {"amount": "250", "method": "bank", "reference": "TXN-42"},
+            follow=True,
+        )
+        self.assertContains(response, "Payment recorded.")
+        self.assertContains(response, "Rs. 250.00")
+        self.assertContains(response, "TXN-42")
+
+
+class PaymentTransactionTests(RoomTestMixin, TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        self.room = self.create_room()
+        self.create_tenant(self.room)
+        self.bill = self.create_bill(
+            self.room, 100, "2024-01", total_paid=1000, payment_received_date="cash 2024-02-05"
+        )
+
+    def test_direct_edits_are_logged_as_transactions(self):
+        """
+        Ensure transactions keep adding up to `total_paid` when it is edited.
+        """
+        first = self.bill.transactions.get()
+        self.assertEqual(first.paid_on, date(2024, 2, 5))
+        self.assertEqual(first.reference, "cash 2024-02-05")
+
+        self.bill.total_paid = 600
+        self.bill.save()
+        record_payment(self.bill.pk, 150, paid_on=date(2024, 2, 6))
+        self.bill.refresh_from_db()
+        self.assertEqual(
+            sum(t.amount for t in self.bill.transactions.all()), self.bill.total_paid
+        )
+
+    def test_daily_collections_sum_by_day_and_method(self):
+        """
+        Ensure the collections report totals payments per day and method.
+        """
+        record_payment(self.bill.pk, 200, paid_on=date(2024, 2, 5), method="bank")
+        record_payment(self.bill.pk, 50, paid_on=date(2024, 2, 7))
+
+        self.client.force_login(self.owner)
+        response = self.client.get(
+            "/api/reports/collections/", {"start": "2024-02-01", "end": "2024-02-06"}
+        )
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual([day["date"] for day in report["days"]], ["2024-02-05"])
+        self.assertEqual(float(report["days"][0]["collected"]), 1200.0)
+        self.assertEqual(float(report["totals"]["methods"]["bank"]), 200.0)
+        self.assertEqual(report["totals"]["payments"], 2)
+
+
+class PartitioningTests(TestCase):
+    def test_year_partitions_cover_whole_years(self):
+        """
+        Ensure a year's bounds hold every month of it and nothing else.
+        """
+        start, end = year_bounds(2024)
+        self.assertEqual(partition_name(2024), "room_paymenthistory_y2024")
+        self.assertTrue(start <= "2024-01" < end)
+        self.assertTrue(start <= "2024-12" < end)
+        self.assertFalse("2025-01" < end)
+
+    def test_command_needs_postgres(self):
+        """
+        Ensure the command refuses to run on other databases.
+        """
+        if connection.vendor == "postgresql":
+            self.skipTest("runs on PostgreSQL")
+        with self.assertRaises(CommandError):
+            call_command("partition_payments", "convert")
+
+
+class ArchiveTests(RoomTestMixin, TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        self.room = self.create_room()
+        self.create_tenant(self.room)
+        self.bills = [
+            self.create_bill(self.room, units, month)
+            for units, month in [(100, "2020-01"), (200, "2020-02"), (300, "2020-03"), (400, "2020-04")]
+        ]
+        for bill in (self.bills[0], self.bills[2], self.bills[3]):
+            bill.total_paid = bill.total
+            bill.save()
+
+    def test_only_settled_bills_are_archived(self):
+        """
+        Ensure old bills paid in full move to the archive with their ids,
+        while unpaid bills and the room's latest bill stay live.
+        """
+        balance = RoomBalance.for_room(self.room.pk).balance
+        self.assertEqual(archive_paid_bills(dry_run=True), 2)
+        self.assertEqual(archive_paid_bills(batch_size=1), 2)
+
+        archived = {self.bills[0].pk, self.bills[2].pk}
+        self.assertEqual(set(ArchivedPaymentHistory.objects.values_list("id", flat=True)), archived)
+        self.assertFalse(PaymentHistory.objects.filter(pk__in=archived).exists())
+        self.assertEqual(RoomBalance.for_room(self.room.pk).balance, balance)
+        self.assertEqual(self.create_bill(self.room, 500, "2020-05").previous_units, 400)
+
+    def test_history_reads_include_archived_bills(self):
+        """
+        Ensure the room history, exports, reports and analytics still see
+        archived bills.
+        """
+        report = revenue_report(self.owner, "2020-01", "2020-12")
+        archive_paid_bills()
+        self.assertEqual(revenue_report(self.owner, "2020-01", "2020-12")["totals"], report["totals"])
+        self.assertEqual(len(load_readings(self.owner)[0]), 4)
+
+        self.client.force_login(self.owner)
+        page = self.client.get(reverse("room:room_detail", args=[self.room.pk]))
+        self.assertContains(page, "2020-01")
+        self.assertContains(page, "Archived")
+        self.assertNotContains(page, reverse("room:edit_payment", args=[self.bills[0].pk]))
+
+        page = self.client.get(
+            "/api/payment-histories/", {"room_id": self.room.pk, "end": "2020-03"}
+        ).json()
+        self.assertEqual(page["count"], 3)
+        self.assertEqual(
+            sorted((bill["billing_month"], bill["archived"], bill["version"]) for bill in page["results"]),
+            [("2020-01", True, None), ("2020-02", False, 1), ("2020-03", True, None)],
+        )
+        page = self.client.get("/api/payment-histories/", {"page_size": 2, "page": 2}).json()
+        self.assertEqual(page["count"], 4)
+        self.assertEqual(len(page["results"]), 2)
+        self.assertIsNone(page["next"])
+
+        response = self.client.get("/api/payment-histories/export/csv/", {"end": "2020-03"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([line.split(",")[3] for line in lines[1:]], ["2020-01", "2020-02", "2020-03"])
+
+
+class BulkDeletionTests(MediaRootMixin, RoomTestMixin, TestCase):
+    def setUp(self):
+        self.use_temp_media_root()
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        self.room = self.create_room()
+        self.house = self.room.house
+        self.other_room = self.create_room(room_number="102")
+        kept_house = House.objects.create(name="Kept house", owner=self.owner)
+        self.kept_room = Room.objects.create(house=kept_house, room_number="201")
+        for room in (self.room, self.other_room, self.kept_room):
+            tenant = self.create_tenant(room)
+            for month, units in enumerate([100, 200, 300], start=1):
+                self.create_bill(room, units, f"2024-{month:02d}")
+            TenantDocument.objects.create(tenant=tenant, document=SimpleUploadedFile("id.pdf", b"shared"))
+        self.own_document = TenantDocument.objects.create(
+            tenant=self.room.tenant, document=SimpleUploadedFile("lease.pdf", b"only this house")
+        )
+        self.client.force_login(self.owner)
+
+    def test_house_is_hidden_at_once_and_deleted_in_chunks(self):
+        """
+        Ensure deleting a house hides it with its rooms straight away and the
+        job then removes every dependent row and unshared document file.
+        """
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.delete(f"/api/houses/{self.house.pk}/")
+        self.assertEqual(response.status_code, 202)
+        # The job's start, then the owner's version bumps; the job is run below.
+        self.assertEqual(len(callbacks), 1 + len(VERSIONED_RESOURCES))
+        for callback in callbacks[1:]:
+            callback()
+        job_id = response.json()["job"]["id"]
+        self.assertEqual(response.json()["job"]["status"], "queued")
+        self.assertEqual([house["name"] for house in self.client.get("/api/houses/").json()], ["Kept house"])
+        self.assertEqual([room["id"] for room in self.client.get("/api/rooms/").json()], [self.kept_room.pk])
+        self.assertFalse(House.objects.get(pk=self.house.pk).is_active)
+
+        self.assertTrue(run_deletion(job_id, chunk_size=2))
+        self.assertFalse(run_deletion(job_id))
+        self.assertFalse(House.objects.filter(pk=self.house.pk).exists())
+        self.assertEqual(list(Room.objects.values_list("pk", flat=True)), [self.kept_room.pk])
+        self.assertEqual(PaymentHistory.objects.count(), 3)
+        self.assertEqual(Tenant.objects.count(), 1)
+        # The released file waits for the sweeper's grace period.
+        own = self.own_document.document.name
+        self.assertEqual(DocumentBlob.objects.get(name=own).ref_count, 0)
+        self.assertTrue(document_storage().exists(own))
+        call_command("sweep_document_blobs", grace_minutes=-1, stdout=tempfile.TemporaryFile("w"))
+        self.assertFalse(document_storage().exists(own))
+        shared = self.kept_room.tenant.documents.get().document.name
+        self.assertEqual(DocumentBlob.objects.get(name=shared).ref_count, 1)
+        self.assertTrue(document_storage().exists(shared))
+
+        job = self.client.get(f"/api/deletions/{job_id}/").json()
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["progress"], 100)
+        self.assertEqual(job["deleted"], job["total"])
+
+    def test_stalled_room_deletion_is_resumed(self):
+        """
+        Ensure a room deletion whose worker died is finished by run_deletions.
+        """
+        with self.captureOnCommitCallbacks():
+            response = self.client.delete(f"/api/rooms/{self.room.pk}/")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.client.get(f"/api/rooms/{self.room.pk}/").status_code, 404)
+
+        job = DeletionJob.objects.get()
+        DeletionJob.objects.filter(pk=job.pk).update(
+            status="running", updated_at=job.updated_at - STALE_AFTER * 2
+        )
+        call_command("run_deletions", stdout=tempfile.TemporaryFile("w"))
+
+        self.assertEqual(DeletionJob.objects.get().status, "done")
+        self.assertFalse(Room.objects.filter(pk=self.room.pk).exists())
+        self.assertEqual(self.other_room.payment_history.count(), 3)
+        self.assertTrue(House.objects.filter(pk=self.house.pk).exists())
+
+
+class OptimisticConcurrencyTests(RoomTestMixin, TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw")
+        self.room = self.create_room()
+        self.tenant = self.create_tenant(self.room)
+        self.bill = self.create_bill(self.room, 100, "2024-01")
+        self.client.force_login(self.owner)
+
+    def test_api_rejects_updates_based_on_an_old_version(self):
+        """
+        Ensure a stale If-Match or body version gets 409 and changes nothing.
+        """
+        url = f"/api/payment-histories/{self.bill.pk}/"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(etag, '"1"')
+
+        response = self.client.patch(
+            url, {"remarks": "first"}, content_type="application/json", HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], '"2"')
+
+        response = self.client.patch(
+            url, {"remarks": "second"}, content_type="application/json", HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["version"], 2)
+        self.bill.refresh_from_db()
+        self.assertEqual(self.bill.remarks, "first")
+
+        url = f"/api/tenants/{self.tenant.pk}/"
+        response = self.client.patch(
+            url, {"name": "Old", "version": 5}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 409)
+        response = self.client.patch(url, {"name": "New"}, content_type="application/json")
+        self.assertEqual(response.json()["version"], 2)
+
+    def test_stale_forms_show_a_conflict(self):
+        """
+        Ensure a form rendered before someone else's change is not saved.
+        """
+        record_payment(self.bill.pk, 500)
+        response = self.client.post(
+            reverse("room:edit_payment", args=[self.bill.pk]),
+            {"billing_month": "2024-01", "current_units": 100, "total_paid": 0, "version": 1},
+        )
+        self.assertContains(response, "was changed by someone else")
+        self.bill.refresh_from_db()
+        self.assertEqual(self.bill.total_paid, 500)
+
+        Tenant.objects.filter(pk=self.tenant.pk).update(version=2)
+        response = self.client.post(
+            reverse("room:update_tenant", args=[self.room.pk]),
+            {"name": "Changed", "contact": "9800000000", "move_in_date": "2024-01-01",
+             "rent_price": 5000, "electricity_price_per_unit": 0, "water_price": 0,
+             "waste_price": 0, "initial_unit": 0, "version": 1},
+            follow=True,
+        )
+        self.assertContains(response, "was changed by someone else")
+        self.tenant.refresh_from_db()
+        self.assertEqual(self.tenant.name, "Tenant")
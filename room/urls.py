@@ -2,6 +2,7 @@ from django.urls import path
 from .views import (
 	landing_view,
 	dashboard_view,
+	revenue_report_view,
 	house_view,
 	room_view,
 	available_rooms_view,
@@ -12,12 +13,16 @@ from .views import (
 	edit_payment,
 	delete_payment,
 	view_payment,
+	record_payment_view,
 	add_payment,
 	send_bill_email,
 	send_pending_bills_email,
 	add_tenant,
 	update_tenant,
 	upload_document,
+	download_document,
+	signed_document,
+	export_tenant,
 )
 
 app_name = "room"
@@ -25,6 +30,7 @@ app_name = "room"
 urlpatterns = [
 	path("", landing_view, name="landing"),
 	path("dashboard/", dashboard_view, name="dashboard"),
+	path("reports/revenue/", revenue_report_view, name="revenue_report"),
 	path("rooms/available/", available_rooms_view, name="available_rooms"),
 	path("houses/", house_view, name="houses"),
 	path("houses/add/", add_house, name="add_house"),
@@ -35,10 +41,14 @@ urlpatterns = [
 	path("rooms/<int:room_id>/tenant/add/", add_tenant, name="add_tenant"),
 	path("rooms/<int:room_id>/tenant/update/", update_tenant, name="update_tenant"),
 	path("rooms/<int:room_id>/documents/add/", upload_document, name="upload_document"),
+	path("rooms/<int:room_id>/export/", export_tenant, name="export_tenant"),
+	path("documents/<int:document_id>/", download_document, name="download_document"),
+	path("documents/signed/<str:token>/", signed_document, name="signed_document"),
 	path("rooms/<int:room_id>/payments/add/", add_payment, name="add_payment"),
 	path("rooms/<int:room_id>/payments/pending/email/", send_pending_bills_email, name="send_pending_bills_email"),
 	path("payments/<int:payment_id>/", view_payment, name="view_payment"),
 	path("payments/<int:payment_id>/edit/", edit_payment, name="edit_payment"),
+	path("payments/<int:payment_id>/record/", record_payment_view, name="record_payment"),
 	path("payments/<int:payment_id>/send/", send_bill_email, name="send_bill_email"),
 	path("payments/<int:payment_id>/delete/", delete_payment, name="delete_payment"),
 ]
@@ -1,14 +1,38 @@
 from django.core.paginator import Paginator
 from django.db.models import Count, Q, Sum, F, DecimalField
-from django.db import models
+from django.db import models, transaction
 from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
 from django.core.mail import send_mail
-
-from .models import House, Room, PaymentHistory, Tenant
-from .forms import PaymentHistoryForm, TenantForm, TenantDocumentForm, RoomForm
+from django.utils import timezone
+
+from .models import (
+    House,
+    PaymentHistory,
+    Room,
+    RoomBalance,
+    Tenant,
+    TenantDocument,
+    VersionConflict,
+)
+from .forms import PaymentHistoryForm, RecordPaymentForm, TenantForm, TenantDocumentForm, RoomForm
+from .downloads import document_response, unsign_document_token
+from .exports import tenant_archive_response
+from .reports import arrears_aging, parse_month_range, revenue_report
+from .analytics import consumption_analytics
+from .archive import BILL_FIELDS, BillHistory
+from .cache import VERSIONED_RESOURCES, owner_key, version_token
+from .conditional import owner_etag, private_page
+from .payments import record_payment
+
+CONFLICT_MESSAGE = (
+    "This {} was changed by someone else while you were editing it. "
+    "Your changes were not saved; review the current details and try again."
+)
 
 
 def landing_view(request):
@@ -73,14 +97,16 @@ def _send_bill_email(request, payment, custom_message=None):
         return False
 
 
-def _build_pending_bills_message(tenant, room, unpaid_payments):
+def _build_pending_bills_message(tenant, room, unpaid_payments, balance=None):
     lines = [
         f"Hi {tenant.name},",
         "",
         "Here is your pending billing summary:",
         f"Room: {room}",
-        "",
     ]
+    if balance is not None:
+        lines.append(f"Total outstanding: Rs. {balance.balance}")
+    lines.append("")
 
     for payment in unpaid_payments:
         lines.extend(
@@ -125,7 +151,9 @@ def send_pending_bills_email(request, room_id):
     if request.method == "POST":
         custom_message = request.POST.get("custom_message", "").strip()
         subject = f"Pending bills for {room}"
-        body = custom_message or _build_pending_bills_message(tenant, room, unpaid_payments)
+        body = custom_message or _build_pending_bills_message(
+            tenant, room, unpaid_payments, RoomBalance.for_room(room.id)
+        )
         if not tenant.email or not tenant.email_verified:
             messages.info(request, "Tenant email is missing or unverified; no email sent.")
             return redirect("room:room_detail", room_id=room.id)
@@ -136,7 +164,9 @@ def send_pending_bills_email(request, room_id):
             messages.error(request, "Sending pending bills email failed.")
         return redirect("room:room_detail", room_id=room.id)
 
-    message = _build_pending_bills_message(tenant, room, unpaid_payments)
+    message = _build_pending_bills_message(
+        tenant, room, unpaid_payments, RoomBalance.for_room(room.id)
+    )
     return render(
         request,
         "room/pending_bills_email.html",
@@ -148,52 +178,121 @@ def send_pending_bills_email(request, room_id):
     )
 
 
-def dashboard_view(request):
+DASHBOARD_RESOURCES = ("house", "room", "tenant", "payment")
+DASHBOARD_CACHE_TIMEOUT = 10 * 60
+# Owner data shown by the cached `{% cache %}` list fragments. Occupancy
+# changes with the tenant (see signals.py), so the lists depend on "tenant".
+HOUSE_LIST_RESOURCES = ("house", "room", "tenant")
+ROOM_LIST_RESOURCES = ("room", "tenant")
+PAYMENT_DETAIL_RESOURCES = ("house", "room", "tenant", "payment")
+
+
+def _dashboard_etag(request):
+    # Arrears move between age buckets as days pass, even without writes.
+    return owner_etag(request, DASHBOARD_RESOURCES, timezone.localdate())
+
+
+def _house_list_etag(request):
+    return owner_etag(request, HOUSE_LIST_RESOURCES)
+
+
+def _room_list_etag(request, house_id):
+    return owner_etag(request, ROOM_LIST_RESOURCES)
+
+
+def _room_detail_etag(request, room_id):
+    return owner_etag(request, VERSIONED_RESOURCES)
+
+
+def _payment_etag(request, payment_id):
+    return owner_etag(request, PAYMENT_DETAIL_RESOURCES)
+
+
+def _payment_last_modified(request, payment_id):
+    if not request.user.is_authenticated:
+        return None
+    return (
+        PaymentHistory.objects.filter(id=payment_id, room__house__owner=request.user)
+        .values_list("updated_at", flat=True)
+        .first()
+    )
+
+
+def _dashboard_context(owner):
     from django.db.models import Sum, F
     
-    houses = House.objects.filter(owner=request.user).annotate(
+    houses = House.objects.filter(owner=owner).annotate(
         rooms_count=Count("room", distinct=True),
         occupied_count=Count("room", filter=Q(room__is_occupied=True), distinct=True),
         vacant_count=Count("room", filter=Q(room__is_occupied=False), distinct=True),
     ).order_by("name")
     
-    total_rooms = Room.objects.filter(house__owner=request.user).count()
-    occupied_rooms = Room.objects.filter(house__owner=request.user, is_occupied=True).count()
+    total_rooms = Room.objects.filter(house__owner=owner).count()
+    occupied_rooms = Room.objects.filter(house__owner=owner, is_occupied=True).count()
     vacant_rooms = total_rooms - occupied_rooms
     
     # Calculate monthly estimated income
     monthly_income = Tenant.objects.filter(
-        room__house__owner=request.user
+        room__house__owner=owner
     ).aggregate(total=Sum('rent_price'))['total'] or 0
     
     # Calculate annual estimated income
     annual_income = monthly_income * 12
     
-    # Calculate remaining amount (unpaid payments)
-    remaining_amount = PaymentHistory.objects.filter(
-        room__house__owner=request.user,
-        status='pending'
-    ).aggregate(
-        total=Sum(F('total') - F('total_paid'), output_field=models.DecimalField())
-    )['total'] or 0
+    # Calculate remaining amount (unpaid payments) from the running balances
+    remaining_amount = RoomBalance.objects.filter(
+        room__house__owner=owner
+    ).aggregate(total=Sum('balance'))['total'] or 0
     
     recent_payments = PaymentHistory.objects.filter(
-        room__house__owner=request.user
+        room__house__owner=owner
     ).select_related("room__house").order_by("-created_at")[:10]
     
-    context = {
-        "houses": houses,
+    return {
+        "houses": list(houses),
         "total_rooms": total_rooms,
         "occupied_rooms": occupied_rooms,
         "vacant_rooms": vacant_rooms,
         "monthly_income": monthly_income,
         "annual_income": annual_income,
         "remaining_amount": remaining_amount,
-        "recent_payments": recent_payments,
+        "recent_payments": list(recent_payments),
+    }
+
+
+@private_page(etag_func=_dashboard_etag)
+def dashboard_view(request):
+    # Keyed on the owner's data versions, so any write from any worker
+    # moves the next request to a freshly computed entry.
+    version = version_token(request.user.pk, DASHBOARD_RESOURCES)
+    context = cache.get_or_set(
+        owner_key(request.user.pk, "dashboard", version),
+        lambda: _dashboard_context(request.user),
+        DASHBOARD_CACHE_TIMEOUT,
+    )
+    aging = arrears_aging(request.user)
+    context = {
+        **context,
+        "cache_version": version,
+        "aging": aging,
+        "aging_tenants": sorted(
+            aging["tenants"], key=lambda row: row["outstanding"], reverse=True
+        )[:5],
     }
     return render(request, "room/dashboard.html", context)
 
 
+def revenue_report_view(request):
+    try:
+        start, end = parse_month_range(request.GET)
+    except ValueError as e:
+        messages.error(request, str(e))
+        start, end = parse_month_range({})
+    report = revenue_report(request.user, start, end)
+    return render(request, "room/revenue_report.html", {"report": report})
+
+
+@private_page(etag_func=_house_list_etag)
 def house_view(request):
     houses = (
         House.objects.filter(owner=request.user)
@@ -204,9 +303,19 @@ def house_view(request):
         )
         .order_by("name")
     )
-    return render(request, "room/house.html", {"houses": houses})
+    # The queryset stays lazy, so it only runs when the cached fragment in
+    # the template has to be re-rendered.
+    return render(
+        request,
+        "room/house.html",
+        {
+            "houses": houses,
+            "cache_version": version_token(request.user.pk, HOUSE_LIST_RESOURCES),
+        },
+    )
 
 
+@private_page(etag_func=_room_list_etag)
 def room_view(request, house_id):
     house = get_object_or_404(House, id=house_id, owner=request.user)
     rooms = (
@@ -214,7 +323,15 @@ def room_view(request, house_id):
         .select_related("house")
         .order_by("room_number")
     )
-    return render(request, "room/room.html", {"house": house, "rooms": rooms})
+    return render(
+        request,
+        "room/room.html",
+        {
+            "house": house,
+            "rooms": rooms,
+            "cache_version": version_token(request.user.pk, ROOM_LIST_RESOURCES),
+        },
+    )
 
 
 def available_rooms_view(request):
@@ -223,9 +340,17 @@ def available_rooms_view(request):
         .select_related("house")
         .order_by("house__name", "room_number")
     )
-    return render(request, "room/available_rooms.html", {"rooms": rooms})
+    return render(
+        request,
+        "room/available_rooms.html",
+        {
+            "rooms": rooms,
+            "cache_version": version_token(request.user.pk, HOUSE_LIST_RESOURCES),
+        },
+    )
 
 
+@private_page(etag_func=_room_detail_etag)
 def room_detail_view(request, room_id):
     room = get_object_or_404(
         Room.objects.select_related("house"),
@@ -234,15 +359,22 @@ def room_detail_view(request, room_id):
     )
     tenant = getattr(room, "tenant", None)
     documents = tenant.documents.all() if tenant else []
-    payments = room.payment_history.order_by("-created_at", "-billing_month")
+    payments = (
+        BillHistory()
+        .filter(room=room)
+        .order_by("-created_at", "-billing_month")
+        .values(*BILL_FIELDS, with_flag=True)
+    )
     unpaid_payments = PaymentHistory.objects.filter(
         room=room,
         status__in=["Unpaid", "Partially Paid"],
     ).order_by("-created_at", "-billing_month")
-    latest_payment = payments.first()
+    latest_payment = room.payment_history.order_by("-created_at", "-billing_month").first()
     paginator = Paginator(payments, 5)
     page_obj = paginator.get_page(request.GET.get("page"))
     tenant_form = TenantForm(instance=tenant) if tenant else None
+    consumption = next(iter(consumption_analytics(request.user, room_id=room.id)), None)
+    balance = RoomBalance.for_room(room.id)
 
     context = {
         "room": room,
@@ -252,6 +384,8 @@ def room_detail_view(request, room_id):
         "tenant_form": tenant_form,
         "latest_payment": latest_payment,
         "unpaid_payments": unpaid_payments,
+        "consumption": consumption,
+        "balance": balance,
     }
     return render(request, "room/roomDetail.html", context)
 
@@ -309,7 +443,11 @@ def update_tenant(request, room_id):
         form = TenantForm(request.POST, instance=tenant)
         if form.is_valid():
             email_changed = "email" in form.changed_data
-            tenant = form.save()
+            try:
+                tenant = form.save()
+            except VersionConflict:
+                messages.error(request, CONFLICT_MESSAGE.format("tenant"))
+                return redirect("room:room_detail", room_id=room.id)
             if email_changed:
                 tenant.email_verified = False
                 tenant.save(update_fields=["email_verified"])
@@ -354,6 +492,42 @@ def upload_document(request, room_id):
     )
 
 
+@login_required
+def download_document(request, document_id):
+    document = get_object_or_404(
+        TenantDocument,
+        id=document_id,
+        tenant__room__house__owner=request.user,
+    )
+    return document_response(document, as_attachment="download" in request.GET)
+
+
+def signed_document(request, token):
+    document_id = unsign_document_token(token)
+    if document_id is None:
+        raise Http404("Link is invalid or has expired.")
+    document = get_object_or_404(TenantDocument, id=document_id)
+    return document_response(document, as_attachment="download" in request.GET)
+
+
+def export_tenant(request, room_id):
+    room = get_object_or_404(
+        Room.objects.select_related("house", "tenant"),
+        id=room_id,
+        house__owner=request.user,
+    )
+    tenant = getattr(room, "tenant", None)
+    if not tenant:
+        messages.error(request, "This room has no tenant to export.")
+        return redirect("room:room_detail", room_id=room.id)
+    return tenant_archive_response(tenant)
+
+
+def _latest_units(room):
+    last_payment = PaymentHistory.latest_for_room(room.id)
+    return last_payment.current_units if last_payment else 0
+
+
 def add_payment(request, room_id):
     room = get_object_or_404(
         Room.objects.select_related("house", "tenant"),
@@ -365,24 +539,25 @@ def add_payment(request, room_id):
         messages.error(request, "Add a tenant before creating a bill.")
         return redirect("room:room_detail", room_id=room.id)
 
-    last_payment = (
-        PaymentHistory.objects.filter(room=room)
-        .order_by("-billing_month", "-created_at")
-        .first()
-    )
-    previous_units = last_payment.current_units if last_payment else 0
-
     if request.method == "POST":
-        form = PaymentHistoryForm(request.POST)
-        form.instance.previous_units = previous_units
-        if form.is_valid():
-            payment = form.save(commit=False)
-            payment.room = room
-            payment.save()
+        # Validate against the latest reading under the room lock, so a bill
+        # another client added meanwhile is taken into account.
+        with transaction.atomic():
+            PaymentHistory.lock_room(room.id)
+            previous_units = _latest_units(room)
+            form = PaymentHistoryForm(request.POST)
+            form.instance.previous_units = previous_units
+            payment = None
+            if form.is_valid():
+                payment = form.save(commit=False)
+                payment.room = room
+                payment.save()
+        if payment:
             messages.success(request, "Bill added successfully.")
             _send_bill_email(request, payment)
             return redirect("room:room_detail", room_id=room.id)
     else:
+        previous_units = _latest_units(room)
         form = PaymentHistoryForm()
 
     return render(
@@ -434,9 +609,17 @@ def edit_payment(request, payment_id):
                     payment.water = tenant.water_price
                     payment.rent = tenant.rent_price
                     payment.waste = tenant.waste_price
-            payment.save()
-            messages.success(request, "Payment updated successfully.")
-            return redirect("room:room_detail", room_id=payment.room.id)
+            try:
+                payment.save()
+            except VersionConflict:
+                messages.error(request, CONFLICT_MESSAGE.format("payment"))
+                payment = PaymentHistory.objects.select_related("room__house", "room__tenant").get(
+                    pk=payment.pk
+                )
+                form = PaymentHistoryForm(instance=payment)
+            else:
+                messages.success(request, "Payment updated successfully.")
+                return redirect("room:room_detail", room_id=payment.room.id)
     else:
         form = PaymentHistoryForm(instance=payment)
 
@@ -470,6 +653,7 @@ def delete_payment(request, payment_id):
     return redirect("room:room_detail", room_id=room_id)
 
 
+@private_page(etag_func=_payment_etag, last_modified_func=_payment_last_modified)
 def view_payment(request, payment_id):
     payment = get_object_or_404(
         PaymentHistory.objects.select_related("room__house", "room__tenant"),
@@ -480,10 +664,29 @@ def view_payment(request, payment_id):
     return render(
         request,
         "room/payment_detail.html",
-        {"payment": payment, "room": payment.room},
+        {
+            "payment": payment,
+            "room": payment.room,
+            "transactions": payment.transactions.order_by("-paid_on", "-id"),
+            "record_form": RecordPaymentForm(),
+        },
     )
 
 
+def record_payment_view(request, payment_id):
+    if request.method != "POST":
+        return redirect("room:view_payment", payment_id=payment_id)
+
+    form = RecordPaymentForm(request.POST)
+    if not form.is_valid():
+        messages.error(request, "Enter an amount greater than zero.")
+    elif record_payment(payment_id, owner=request.user, **form.cleaned_data) is None:
+        raise Http404("Payment not found.")
+    else:
+        messages.success(request, "Payment recorded.")
+    return redirect("room:view_payment", payment_id=payment_id)
+
+
 def add_room(request, house_id):
     house = get_object_or_404(House, id=house_id, owner=request.user)
     